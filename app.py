@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, session, send_file, send_from_directory # Added send_file and send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, session, send_file, send_from_directory, Response, stream_with_context, make_response # Added send_file and send_from_directory
 from dotenv import load_dotenv # Import dotenv
 import yaml
 import json
@@ -9,8 +9,14 @@ from database import (
     add_data_point, update_pending_submission_status,
     update_data_point, # <<< Import the new update function
     DB_PATH, # <<< Import DB_PATH
-    delete_data_point # <<< Import if implementing delete
+    delete_data_point, # <<< Import if implementing delete
+    close_db, search_data_points, get_snapshot, get_data_points_page,
+    get_pending_submissions_by_ids, moderate_pending_submissions, get_facet_counts,
+    get_catalog_state, encode_cursor, decode_cursor,
+    get_catalog_changes, get_subtree_data_point_ids, get_year_overlap_ids, get_year_coverage,
+    FACETS, HIERARCHY_FACETS, FACET_PATH_SEPARATOR, YEAR_COVERAGE_MAX_YEARS, SNIPPET_MATCH_START, SNIPPET_MATCH_END
 )
+from markupsafe import escape
 import random # Import random for color generation
 import os # Import os for secret key
 import datetime # Needed for last_updated
@@ -24,6 +30,16 @@ from bs4 import BeautifulSoup
 import fitz # PyMuPDF
 import re
 import base64 # <<< Import base64 for encoding file content
+import hashlib
+import bisect
+import query_stats
+from resource_cache import resource_cache, PROJECTABLE_FIELDS
+from facet_index import FacetIndex
+from trigram_index import TrigramIndex
+from network_graph import (
+    build_hierarchy_graph, NetworkGraphCache, network_graph_changes, compact_graph,
+    GraphFilter, GRAPH_FORMATS, LOD_GROUPINGS, NEIGHBORHOOD_MAX_HOPS
+)
 
 load_dotenv() # Load environment variables from .env file
 
@@ -34,6 +50,18 @@ ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD') # Load admin password from env
 # <<< NEW: GEMINI API KEY >>>
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
 
+# Hand the pooled DB connection back at the end of every request
+app.teardown_appcontext(close_db)
+
+# Attribute SQL statements (query_stats) to the endpoint that ran them
+@app.before_request
+def tag_query_endpoint():
+    query_stats.set_endpoint(request.endpoint)
+
+@app.teardown_request
+def clear_query_endpoint(exception=None):
+    query_stats.set_endpoint(None)
+
 # Initialize database at startup
 init_db()
 # load_initial_data() # <<< REMOVE THIS CALL
@@ -57,6 +85,22 @@ def load_vocabularies():
 # Cache vocabularies at startup
 VOCABULARIES = load_vocabularies()
 
+# Hierarchy part of the network graph, built once from the vocabulary;
+# the full payload is cached per catalog version
+HIERARCHY_GRAPH = build_hierarchy_graph(VOCABULARIES['resource_type_hierarchy'])
+network_graph_cache = NetworkGraphCache(resource_cache, HIERARCHY_GRAPH)
+facet_index = FacetIndex(resource_cache)
+trigram_index = TrigramIndex(resource_cache) # Typo-tolerant autocomplete, follows the resource cache
+
+# Rows per page on the admin manage screen
+ADMIN_PAGE_SIZE = 50
+
+# Conditional GET for the read APIs: catalog responses must be revalidated (cheap 304s),
+# vocabulary responses only change when structure_tree.yaml changes and the app restarts
+VOCABULARIES_HASH = hashlib.sha1(json.dumps(VOCABULARIES, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+CATALOG_CACHE_CONTROL = 'public, no-cache'
+VOCABULARY_CACHE_CONTROL = 'public, max-age=3600'
+
 # --- Authentication Decorator ---
 def admin_required(f):
     @wraps(f)
@@ -67,6 +111,53 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# --- Conditional GET Decorator ---
+def catalog_validators():
+    """(etag, last_modified) for responses derived from the catalog and the vocabulary"""
+    version, updated_at = get_catalog_state()
+    last_modified = datetime.datetime.fromtimestamp(updated_at, datetime.timezone.utc) if updated_at else None
+    return f"catalog-{version}-{VOCABULARIES_HASH}", last_modified
+
+def vocabulary_validators():
+    """(etag, last_modified) for responses built only from structure_tree.yaml"""
+    return f"vocab-{VOCABULARIES_HASH}", None
+
+def conditional_get(validators=catalog_validators, cache_control=CATALOG_CACHE_CONTROL, vary_on_body=False):
+    """
+    Answer If-None-Match / If-Modified-Since with 304 before the view runs (and
+    before it touches the database), and tag 200 responses with a strong ETag,
+    Last-Modified and Cache-Control. vary_on_body folds the request body into
+    the ETag for POST endpoints whose result depends on it; those only get the
+    validators, never a 304 (which is for GET/HEAD).
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            etag, last_modified = validators()
+            if vary_on_body:
+                etag += '-' + hashlib.sha1(request.get_data()).hexdigest()[:16]
+
+            if request.method not in ('GET', 'HEAD'):
+                not_modified = False # 304 only answers safe requests; conditionals on POST are ignored
+            elif request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                not_modified = bool(last_modified and request.if_modified_since
+                                    and last_modified.replace(microsecond=0) <= request.if_modified_since)
+            if not_modified:
+                response = app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = cache_control
+            return response
+        return decorated_function
+    return decorator
+
 # --- Helper function to generate distinct colors ---
 def generate_color(seed_string):
     """Generates a somewhat consistent color based on a string."""
@@ -76,23 +167,6 @@ def generate_color(seed_string):
     b = random.randint(50, 200)
     return f'rgb({r},{g},{b})'
 
-# --- Define shapes for domains ---
-DOMAIN_SHAPES = {
-    'Human': 'dot',
-    'Animal': 'square',
-    'Environment': 'triangle',
-    'default': 'ellipse'
-}
-
-# --- Define Country Flags and Colors (Pastel Palette) ---
-COUNTRY_INFO = {
-    "Denmark": {"flag": "🇩🇰", "color": "#FFB6B6"}, # Pastel Red
-    "Norway": {"flag": "🇳🇴", "color": "#AEC6CF"}, # Pastel Blue
-    "Sweden": {"flag": "🇸🇪", "color": "#FDFD96"}, # Pastel Yellow
-    "Finland": {"flag": "🇫🇮", "color": "#B3E2CD"}, # Pastel Green
-    "default": {"flag": "🏳️", "color": "#E0E0E0"}  # Light Grey for others
-}
-
 @app.route('/')
 def index():
     # data_points = get_all_data_points() # No longer needed directly here if fetched by JS
@@ -864,6 +938,7 @@ def add_data():
 # --- API Endpoints (Remain largely the same) ---
 
 @app.route('/api/resource-hierarchy')
+@conditional_get(vocabulary_validators, VOCABULARY_CACHE_CONTROL)
 def get_resource_hierarchy():
     """API endpoint to get the resource type hierarchy"""
     # Ensure hierarchy is loaded
@@ -872,398 +947,468 @@ def get_resource_hierarchy():
     return jsonify(VOCABULARIES['resource_type_hierarchy'])
 
 @app.route('/api/main-categories')
+@conditional_get(vocabulary_validators, VOCABULARY_CACHE_CONTROL)
 def get_categories():
     """API endpoint to get the main categories"""
     return jsonify(VOCABULARIES['main_categories'])
 
+@app.route('/api/facets')
+@conditional_get()
+def get_facets():
+    """
+    Faceted filtering from the per-worker bitmap index. Query arguments are
+    facet names with values, repeated for several values (e.g.
+    ?country=Sweden&country=Norway&category=Data/omics_data); values within a
+    facet are OR-ed, facets are AND-ed. Returns the number of matching
+    resources and, for every facet value, how many resources it would match
+    together with the other facets' selections. ?ids=1 adds the matching ids.
+    """
+    args = request.args.to_dict(flat=False)
+    try:
+        selections = {facet: parse_filter_values(args, facet) for facet in FACETS if facet in args}
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    result = facet_index.query(selections, with_ids=request.args.get('ids') == '1')
+    result['selected'] = selections
+    return jsonify(result)
+
+@app.route('/api/year-coverage')
+@conditional_get()
+def get_year_coverage_api():
+    """
+    Per-year resource counts for the timeline, from the year interval index.
+    ?yearFrom=&yearTo= pick the window (default: the earliest to the latest year
+    in the catalog, at most YEAR_COVERAGE_MAX_YEARS years). counts[i] is the
+    number of resources covering year_from + i, open-ended ones included, i.e.
+    what filtering on that single year returns.
+    """
+    try:
+        year_from, year_to = parse_year(request.args, 'yearFrom'), parse_year(request.args, 'yearTo')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if year_from is not None and year_to is not None:
+        if year_from > year_to:
+            return jsonify({"error": "yearFrom must not be after yearTo."}), 400
+        if year_to - year_from + 1 > YEAR_COVERAGE_MAX_YEARS:
+            return jsonify({"error": f"At most {YEAR_COVERAGE_MAX_YEARS} years at once."}), 400
+    return jsonify(get_year_coverage(year_from, year_to))
+
+@app.route('/api/facet-counts')
+@conditional_get()
+def get_facet_counts_api():
+    """
+    Resource counts for the explorer badges, read from the trigger-maintained
+    facet_counts table. ?facet=country&facet=domain limits the facets returned.
+    Hierarchy facets (resource_type .. level5) are keyed by path, e.g. 'Data/omics_data'.
+    """
+    return jsonify(get_facet_counts(request.args.getlist('facet') or None))
+
+# --- Explorer trees ---
+TREE_HIERARCHY_LEVELS = ['resource_type', 'category', 'subcategory', 'data_type', 'level5']
+# Facets whose nested counts give each tree's badges (hierarchy facets below resource_type are paths)
+TREE_COUNT_CHAINS = {
+    'country': ('country', 'domain', 'resource_type'),
+    'domain': ('domain', 'resource_type', 'category'),
+    'hierarchy': HIERARCHY_FACETS,
+}
+_tree_cache = {'version': None, 'trees': None}
+
+def _tree_node(name, level=None):
+    node = {'name': name, 'count': 0, 'children': [], 'resources': []}
+    if level is not None:
+        node['level'] = level
+    return node
+
+def _tree_child(parent, index, name, level=None):
+    """Child of a tree node by name, created (and indexed) on first use"""
+    key = (id(parent), name)
+    child = index.get(key)
+    if child is None:
+        child = index[key] = _tree_node(name, level)
+        parent['children'].append(child)
+    return child
+
+def _hierarchy_child_names(details):
+    """Names directly below a vocabulary node: sub_categories keys, then items"""
+    names = []
+    if isinstance(details, dict):
+        if isinstance(details.get('sub_categories'), dict):
+            names.extend(details['sub_categories'].keys())
+        for item in details.get('items') or []:
+            names.append(item.get('name') if isinstance(item, dict) else item)
+    return names
+
+def build_resource_trees(records, counts):
+    """
+    Group resource cache records into the three explorer trees:
+    country -> domain -> resource type, domain -> resource type -> category,
+    and the full vocabulary hierarchy (levels 1-5). Node counts are read from
+    counts ({tree: FacetIndex.nested_counts(TREE_COUNT_CHAINS[tree])}), so the
+    badges agree with /api/facets; leaf groups carry {id, data_source_id, title} stubs.
+    """
+    main_categories = VOCABULARIES['main_categories'] or {}
+    index = {}
+
+    country_root = _tree_node('countries')
+    for country in main_categories.get('Country', []):
+        _tree_child(country_root, index, country)
+    domain_root = _tree_node('domains')
+    for domain in main_categories.get('Domain', []):
+        _tree_child(domain_root, index, domain)
+
+    # The hierarchy tree shows every vocabulary node, even those without resources
+    hierarchy_root = _tree_node('hierarchy', 0)
+    def add_vocabulary(parent, name, details, level):
+        node = _tree_child(parent, index, name, level)
+        if level < len(TREE_HIERARCHY_LEVELS):
+            sub_categories = details.get('sub_categories') if isinstance(details, dict) else None
+            for child_name in _hierarchy_child_names(details):
+                child_details = sub_categories.get(child_name) if isinstance(sub_categories, dict) else None
+                add_vocabulary(node, child_name, child_details, level + 1)
+    for resource_type, details in (VOCABULARIES['resource_type_hierarchy'] or {}).items():
+        add_vocabulary(hierarchy_root, resource_type, details, 1)
+
+    for record in sorted(records, key=lambda record: (record.title.lower(), record.id)):
+        stub = {'id': record.id, 'data_source_id': record.data_source_id, 'title': record.title}
+        resource_type = record.resource_type
+        category = record.category or 'uncategorized'
+
+        for country in record.countries_list:
+            country_node = _tree_child(country_root, index, country)
+            for domain in record.domains_list:
+                domain_node = _tree_child(country_node, index, domain)
+                if resource_type:
+                    domain_node = _tree_child(domain_node, index, resource_type)
+                domain_node['resources'].append(stub)
+
+        for domain in record.domains_list:
+            node = _tree_child(domain_root, index, domain)
+            if resource_type:
+                node = _tree_child(node, index, resource_type)
+                node = _tree_child(node, index, category)
+            node['resources'].append(stub)
+
+        node = hierarchy_root
+        for level, column in enumerate(TREE_HIERARCHY_LEVELS, start=1):
+            if not record[column]:
+                break
+            node = _tree_child(node, index, record[column], level)
+        node['resources'].append(stub) # Stubs sit on the deepest level the resource names
+
+    def apply_counts(tree, node, facets, key):
+        for child in node['children']:
+            value = child['name']
+            if facets[len(key)] in HIERARCHY_FACETS[1:]:
+                value = key[-1] + FACET_PATH_SEPARATOR + value # Below resource_type the facet index keys by path
+            child_key = key + (value,)
+            # Only 'uncategorized' (resources without a category) has no facet value of its own
+            child['count'] = counts[tree].get(child_key, len(child['resources']))
+            if len(child_key) < len(facets):
+                apply_counts(tree, child, facets, child_key)
+
+    roots = {'country': country_root, 'domain': domain_root, 'hierarchy': hierarchy_root}
+    for tree, root in roots.items():
+        apply_counts(tree, root, TREE_COUNT_CHAINS[tree], ())
+    hierarchy_root['count'] = len(records)
+    return {tree: root['children'] for tree, root in roots.items()}
+
+@app.route('/api/tree')
+@conditional_get()
+def get_resource_trees():
+    """
+    All explorer trees in one response, grouped from the resource cache with
+    counts from the facet index, and cached per catalog version.
+    ?tree=country|domain|hierarchy returns just one of them.
+    """
+    state = resource_cache.snapshot()
+    if _tree_cache['version'] == state.version:
+        trees = _tree_cache['trees']
+    else:
+        counts = {}
+        versions = set()
+        for tree, facets in TREE_COUNT_CHAINS.items():
+            version, counts[tree] = facet_index.nested_counts(facets)
+            versions.add(version)
+        trees = build_resource_trees(state.records, counts)
+        if versions == {state.version}: # The catalog did not move while counting
+            _tree_cache['trees'] = trees
+            _tree_cache['version'] = state.version
+
+    tree_name = request.args.get('tree')
+    if tree_name:
+        if tree_name not in trees:
+            return jsonify({"error": f"Unknown tree '{tree_name}'."}), 400
+        return jsonify({tree_name: trees[tree_name]})
+    return jsonify(trees)
+# --- END Explorer trees ---
+
 # Deprecated? This endpoint fetches by internal DB ID, might not be needed if using data_source_id
 @app.route('/api/data-point/<int:data_id>')
+@conditional_get()
 def get_data_point(data_id):
     """API endpoint to get a single data point by internal ID"""
-    data_point = get_data_point_by_id(data_id)
-    if data_point:
-        result = dict(data_point)
-        if result.get('metadata'):
-            try:
-                result['metadata'] = json.loads(result['metadata'])
-            except json.JSONDecodeError:
-                 result['metadata'] = {} # Handle case where metadata in DB is invalid
+    record = resource_cache.get(data_id)
+    if record:
+        result = record.to_dict()
+        result['metadata'] = record.metadata_obj
         return jsonify(result)
     return jsonify({"error": "Data point not found"}), 404
 
+FILTER_PAGE_MAX = 1000       # Largest page a client may ask /api/filter-resources for
+FILTER_STREAM_BATCH = 200    # Items encoded per chunk of a streamed response
+
+def _stream_json_items(records, fields, next_cursor):
+    """Yield {"items": [...], "next_cursor": ...} in chunks, encoding FILTER_STREAM_BATCH items at a time"""
+    yield '{"items":['
+    for start in range(0, len(records), FILTER_STREAM_BATCH):
+        batch = records[start:start + FILTER_STREAM_BATCH]
+        encoded = ','.join(json.dumps(record.project(fields), separators=(',', ':')) for record in batch)
+        yield (',' if start else '') + encoded
+    yield '],"next_cursor":' + json.dumps(next_cursor) + '}'
+
 @app.route('/api/filter-resources', methods=['POST'])
+@conditional_get(vary_on_body=True)
 def filter_resources():
-    filters = request.json
-
-    # Build the SQL query based on filters
-    query = """
-        SELECT * FROM data_points WHERE 1=1
     """
-    params = []
-
-    # --- UPDATED Filtering for JSON columns ---
-    # Use LIKE for simple JSON array matching (assumes simple values like ["Sweden", "Norway"])
-    # This is not the most efficient way for large datasets but works for SQLite without JSON extensions
-    if filters.get('countries'):
-        country_conditions = []
-        for country in filters['countries']:
-            # Create a LIKE pattern for the country within the JSON array string
-            # e.g., %"Sweden"% - checks if the exact string exists
-            like_pattern = f'%"{country}"%'
-            country_conditions.append("countries LIKE ?")
-            params.append(like_pattern)
-        if country_conditions:
-            query += " AND (" + " OR ".join(country_conditions) + ")" # Use OR if any selected country should match
-
-    if filters.get('domains'):
-        domain_conditions = []
-        for domain in filters['domains']:
-            like_pattern = f'%"{domain}"%'
-            domain_conditions.append("domains LIKE ?")
-            params.append(like_pattern)
-        if domain_conditions:
-            query += " AND (" + " OR ".join(domain_conditions) + ")" # Use OR if any selected domain should match
-    # --- END UPDATED Filtering ---
-
-    if filters.get('resourceTypes'):
-        query += " AND resource_type IN (" + ",".join(["?"] * len(filters['resourceTypes'])) + ")"
-        params.extend(filters['resourceTypes'])
-
-    # Execute query
-    conn = get_db()
-    cur = conn.execute(query, params)
-    results = cur.fetchall()
-    conn.close() # Close connection
-
-    # Convert results to list of dictionaries
-    # Parse countries and domains JSON for the response
-    processed_results = []
-    for row in results:
-        row_dict = dict(row)
-        try:
-            row_dict['countries_list'] = json.loads(row_dict.get('countries', '[]'))
-        except json.JSONDecodeError:
-            row_dict['countries_list'] = ['Error']
+    Resources matching countries / domains / resourceTypes (any selected value matches)
+    and, if given, subtree: a hierarchy path at any level 1-5 (e.g. 'Data/omics_data'
+    or 'Data/omics_data/genomic'), matching every resource at or below that node,
+    and yearFrom / yearTo: resources whose years overlap that range (a missing
+    year_start or year_end is open-ended; either bound may be left out).
+    Without paging keys the full rows are returned as a list, as before.
+    With any of 'fields' (list of columns or title, countries_list, domains_list,
+    description_preview), 'limit' (page size) or 'cursor' (a previous next_cursor),
+    the response is a streamed {"items": [...only those fields...], "next_cursor": token|null}.
+    """
+    filters = request.get_json(silent=True) or {}
+    if not isinstance(filters, dict):
+        return jsonify({"error": "Request body must be a JSON object."}), 400
+    paged = any(key in filters for key in ('fields', 'limit', 'cursor'))
+
+    fields = filters.get('fields') or list(PROJECTABLE_FIELDS)
+    if not isinstance(fields, list) or any(field not in PROJECTABLE_FIELDS for field in fields):
+        return jsonify({"error": "Unknown field requested.", "allowed_fields": list(PROJECTABLE_FIELDS)}), 400
+    limit = filters.get('limit')
+    if limit is not None:
         try:
-            row_dict['domains_list'] = json.loads(row_dict.get('domains', '[]'))
-        except json.JSONDecodeError:
-            row_dict['domains_list'] = ['Error']
-        processed_results.append(row_dict)
-
-    return jsonify(processed_results)
+            limit = max(1, min(int(limit), FILTER_PAGE_MAX))
+        except (TypeError, ValueError):
+            return jsonify({"error": "limit must be an integer."}), 400
+    after_id = None
+    if filters.get('cursor'):
+        cursor_values = decode_cursor(filters['cursor'], length=1)
+        if not cursor_values or not isinstance(cursor_values[0], int):
+            return jsonify({"error": "Invalid cursor."}), 400
+        after_id = cursor_values[0]
+    subtree_ids = None
+    if filters.get('subtree'):
+        subtree_ids = get_subtree_data_point_ids(str(filters['subtree']))
+        if subtree_ids is None:
+            return jsonify({"error": "Unknown hierarchy node in subtree."}), 400
+    try:
+        year_from, year_to = parse_year(filters, 'yearFrom'), parse_year(filters, 'yearTo')
+        selections = {
+            'country': parse_filter_values(filters, 'countries'),
+            'domain': parse_filter_values(filters, 'domains'),
+            'resource_type': parse_filter_values(filters, 'resourceTypes')
+        }
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    year_ids = None
+    if year_from is not None or year_to is not None:
+        year_ids = get_year_overlap_ids(year_from, year_to)
+
+    # Matching ids (ascending) from the facet bitmaps; any selected value within a filter matches
+    result_ids = facet_index.matching_ids(selections)
+    for restriction in (subtree_ids, year_ids):
+        if restriction is not None:
+            restriction = set(restriction)
+            result_ids = [data_id for data_id in result_ids if data_id in restriction]
+
+    if paged:
+        # Keyset pagination on the primary key; keep one extra id to know if there is a next page
+        if after_id is not None:
+            result_ids = result_ids[bisect.bisect_right(result_ids, after_id):]
+        if limit is not None:
+            result_ids = result_ids[:limit + 1]
+
+    if not paged:
+        processed_results = [record.to_api_dict() for record in resource_cache.many(result_ids)]
+        return jsonify(processed_results)
+
+    next_cursor = None
+    if limit is not None and len(result_ids) > limit:
+        result_ids = result_ids[:limit]
+        next_cursor = encode_cursor([result_ids[-1]])
+    records = resource_cache.many(result_ids)
+    return Response(stream_with_context(_stream_json_items(records, fields, next_cursor)),
+                    mimetype='application/json')
 
 # Use data_source_id for fetching specific resources via API
 @app.route('/api/resource/<resource_id>')
+@conditional_get()
 def get_resource(resource_id):
-    conn = get_db() # Get connection
     # Fetch using data_source_id which is the public identifier
-    cur = conn.execute('SELECT * FROM data_points WHERE data_source_id = ?', [resource_id])
-    result = cur.fetchone()
-    conn.close() # Close connection
-
-    if result is None:
+    record = resource_cache.get_by_source_id(resource_id)
+    if record is None:
         return jsonify({'error': 'Resource not found'}), 404
 
-    # Convert row to dict and parse metadata, countries, domains
-    resource_dict = dict(result)
-    if resource_dict.get('metadata'):
-        try:
-            resource_dict['metadata'] = json.loads(resource_dict['metadata'])
-        except json.JSONDecodeError:
-            resource_dict['metadata'] = {} # Handle invalid JSON
-    try:
-        resource_dict['countries_list'] = json.loads(resource_dict.get('countries', '[]'))
-    except json.JSONDecodeError:
-        resource_dict['countries_list'] = []
-    try:
-        resource_dict['domains_list'] = json.loads(resource_dict.get('domains', '[]'))
-    except json.JSONDecodeError:
-        resource_dict['domains_list'] = []
-
+    resource_dict = record.to_api_dict()
+    resource_dict['metadata'] = record.metadata_obj
 
     return jsonify(resource_dict)
 
 
-# --- Function to generate consistent node IDs for hierarchy ---
-def get_hierarchy_node_id(level, name):
-    """Generates a consistent node ID for hierarchy levels."""
-    # Replace spaces and special chars for cleaner IDs
-    clean_name = ''.join(e for e in name if e.isalnum() or e == '_').lower()
-    return f"L{level}_{clean_name}"
+def parse_year(values, name):
+    """
+    Year under name in query arguments or a JSON body, None if absent. Only an
+    integer (not a bool) or a string of digits is a year; anything else
+    (2000.7, true, "20x0") raises ValueError.
+    """
+    value = values.get(name)
+    if value is None or value == '':
+        return None
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value.strip())
+    raise ValueError(f"{name} must be a year.")
+
+def parse_filter_values(values, name):
+    """
+    Selected values of a list filter under name (countries, domains,
+    resourceTypes, or a facet name) in a JSON body or query arguments as
+    to_dict(flat=False), None if absent. Anything but a list of strings
+    ("Sweden", [1], [["Sweden"]]) raises ValueError.
+    """
+    value = values.get(name)
+    if value is None:
+        return None
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ValueError(f"{name} must be a list of strings.")
+    return value
+
+def network_graph_filter(args):
+    """
+    GraphFilter from /api/network-data query arguments, None if none are given.
+    countries, domains and resourceTypes may be repeated or comma-separated;
+    yearFrom/yearTo bound the year range; subtree is a hierarchy path, as for
+    /api/filter-resources (checked when the graph is built). Raises ValueError on invalid values.
+    """
+    def values(name):
+        return frozenset(v.strip() for arg in args.getlist(name) for v in arg.split(',') if v.strip())
+
+    graph_filter = GraphFilter(
+        countries=values('countries'), domains=values('domains'), resource_types=values('resourceTypes'),
+        year_from=parse_year(args, 'yearFrom'), year_to=parse_year(args, 'yearTo'), subtree=args.get('subtree') or None
+    )
+    if graph_filter == GraphFilter(frozenset(), frozenset(), frozenset(), None, None, None):
+        return None
+    return graph_filter
 
 # --- Updated route for Network Data (Physics-based) ---
 @app.route('/api/network-data')
+@conditional_get()
 def get_network_data():
-    nodes = []
-    edges = []
-    added_nodes = set() # Keep track of added node IDs
-    base_font_size = 16 # Increased base font size
-
-    # 1. Load Hierarchy Definition
-    hierarchy_definition = VOCABULARIES.get('resource_type_hierarchy', {})
-    if not hierarchy_definition:
+    """
+    The whole graph. ?format=compact sends nodes and edges as parallel arrays
+    with a shared style table (decoded by decodeCompactGraph in main.js).
+    ?lod=leaf (or leaf_country) draws large groups of data points as cluster
+    nodes, opened with /api/network-data/expand.
+    The filters of /api/filter-resources (countries, domains, resourceTypes)
+    plus yearFrom/yearTo and subtree (hierarchy path) narrow the graph to
+    the matching data points and the hierarchy/country/domain nodes they reach.
+    """
+    if not HIERARCHY_GRAPH['nodes']:
         return jsonify({"error": "Resource hierarchy not found in vocabularies"}), 500
+    graph_format = request.args.get('format', 'full')
+    if graph_format not in GRAPH_FORMATS:
+        return jsonify({"error": f"format must be one of: {', '.join(GRAPH_FORMATS)}."}), 400
+    lod = request.args.get('lod') or None
+    if lod is not None and lod not in LOD_GROUPINGS:
+        return jsonify({"error": f"lod must be one of: {', '.join(LOD_GROUPINGS)}."}), 400
+    try:
+        graph_filter = network_graph_filter(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    # --- Helper Function to Recursively Build Hierarchy Nodes/Edges ---
-    def process_hierarchy_level(level_data, parent_node_id, current_level):
-        if current_level > 5: # Limit recursion depth
-            return
-
-        for key, details in level_data.items():
-            # Skip metadata keys like 'level', 'title' if they are siblings to actual categories
-            if key in ['level', 'title']:
-                continue
-            if not isinstance(details, dict): # Ensure details is a dictionary
-                 print(f"Skipping invalid hierarchy entry: {key} (details not a dict)")
-                 continue
-
-            node_name = key # The key is the name (e.g., 'omics_data')
-            node_id = get_hierarchy_node_id(current_level, node_name)
-            node_label = details.get('title', node_name.replace('_', ' ').title())
-            node_color = '#CCCCCC' # Default grey
-            node_shape = 'ellipse'
-            # Adjust size based on level (make less drastic change)
-            node_size = 22 - (current_level * 2)
-            node_mass = 5 - current_level # Mass influences physics layout
-
-            # Assign colors/shapes based on level (customize as needed)
-            if current_level == 1: # Resource Type
-                node_color = '#87CEEB' # Sky Blue
-                node_shape = 'database'
-                node_size = 24
-                node_mass = 10
-            elif current_level == 2: # Category
-                node_color = '#90EE90' # Light Green
-                node_size = 20
-                node_mass = 8
-            elif current_level == 3: # Subcategory
-                node_color = '#FFB6C1' # Light Pink
-                node_size = 16
-                node_mass = 6
-            elif current_level == 4: # Data Type
-                node_color = '#FFD700' # Gold
-                node_size = 14
-                node_mass = 4
-            elif current_level == 5: # Item/Leaf
-                node_color = '#FFA07A' # Light Salmon
-                node_size = 12
-                node_mass = 2
-
-            # Add the hierarchy node if not already added
-            if node_id not in added_nodes:
-                nodes.append({
-                    'id': node_id,
-                    'label': node_label,
-                    'title': f"Level {current_level}: {node_label}", # Tooltip indicates level
-                    'group': f"level_{current_level}",
-                    'color': node_color,
-                    'shape': node_shape,
-                    'size': node_size,
-                    'mass': node_mass,
-                    'font': {'size': base_font_size} # Apply base font size
-                })
-                added_nodes.add(node_id)
-
-            # Add edge from parent to this node
-            if parent_node_id:
-                edges.append({
-                    'from': parent_node_id,
-                    'to': node_id,
-                    # 'arrows': 'to', # << REMOVED ARROWS
-                    'length': 100 + (current_level * 10), # Length influences physics layout
-                    'color': {'color': '#e0e0e0', 'highlight': '#d0d0d0', 'hover': '#d0d0d0'}
-                })
-
-            # Recurse for sub_categories
-            if 'sub_categories' in details and isinstance(details['sub_categories'], dict):
-                process_hierarchy_level(details['sub_categories'], node_id, current_level + 1)
-
-            # Process items as Level 5 leaves
-            if 'items' in details and isinstance(details['items'], list):
-                 item_level = current_level + 1
-                 if item_level <= 5:
-                    for item in details['items']:
-                        item_name = None
-                        item_details = {} # Store potential extra info from item object
-                        if isinstance(item, str):
-                            item_name = item
-                        elif isinstance(item, dict) and 'name' in item:
-                            item_name = item['name']
-                            item_details = item # Keep the whole dict
-
-                        if item_name:
-                            item_id = get_hierarchy_node_id(item_level, item_name)
-                            # Use title from item details if available, otherwise format name
-                            item_label = item_details.get('title', item_name.replace('_', ' ').title())
-                            item_color = '#FFA07A' # Light Salmon for L5
-                            item_shape = 'ellipse'
-                            item_size = 12 # Slightly larger L5
-                            item_mass = 2
-
-                            if item_id not in added_nodes:
-                                nodes.append({
-                                    'id': item_id,
-                                    'label': item_label,
-                                    'title': f"Level {item_level}: {item_label}",
-                                    'group': f"level_{item_level}",
-                                    'color': item_color,
-                                    'shape': item_shape,
-                                    'size': item_size,
-                                    'mass': item_mass,
-                                    'font': {'size': base_font_size - 2} # Slightly smaller font for L5
-                                })
-                                added_nodes.add(item_id)
-
-                            # Add edge from parent (current node) to item node
-                            edges.append({
-                                'from': node_id, # Edge from the category that contains the items
-                                'to': item_id,
-                                # 'arrows': 'to', # << REMOVED ARROWS
-                                'length': 150,
-                                'color': {'color': '#e0e0e0', 'highlight': '#d0d0d0', 'hover': '#d0d0d0'}
-                            })
-
-
-    # 2. Build Hierarchy Nodes and Edges by processing Level 1
-    process_hierarchy_level(hierarchy_definition, None, 1)
-
-    # 3. Fetch *Approved* Data Points
-    conn = get_db()
-    cur = conn.cursor()
-    # Select columns needed for linking and display from the main data_points table
-    # <<< Fetch countries and domains instead of country, domain >>>
-    cur.execute('SELECT id, data_source_id, resource_type, category, subcategory, data_type, level5, countries, domains, metadata FROM data_points')
-    data_points = cur.fetchall()
-    conn.close()
-
-    # Get country/domain info
-    default_country_info = COUNTRY_INFO['default']
-
-    # 4. Process Data Points and Connect to Hierarchy, Country, Domain
-    for point in data_points:
-        point_dict = dict(point)
-        metadata = {}
-        if point_dict.get('metadata'):
-            try:
-                # Metadata is already stored as JSON string in DB
-                metadata = json.loads(point_dict['metadata'])
-            except json.JSONDecodeError:
-                pass # Ignore invalid JSON
-
-        # --- Parse Countries and Domains JSON ---
-        countries_list = []
-        domains_list = []
+    if graph_filter is not None:
+        if lod is not None:
+            return jsonify({"error": "lod cannot be combined with filters."}), 400
         try:
-            countries_list = json.loads(point_dict.get('countries', '[]'))
-        except json.JSONDecodeError:
-            print(f"Warning: Could not parse countries JSON for {point_dict['data_source_id']}")
-        try:
-            domains_list = json.loads(point_dict.get('domains', '[]'))
-        except json.JSONDecodeError:
-            print(f"Warning: Could not parse domains JSON for {point_dict['data_source_id']}")
-
-        # --- Use FIRST country/domain for node linking/coloring (simplification) ---
-        country = countries_list[0] if countries_list else None
-        domain = domains_list[0] if domains_list else None
-        # --- End Simplification ---
-
-        # --- Determine the leaf hierarchy node ID for this data point ---
-        # This uses the specific hierarchy fields stored in data_points
-        leaf_hierarchy_node_id = None
-        if point_dict.get('level5'):
-            leaf_hierarchy_node_id = get_hierarchy_node_id(5, point_dict['level5'])
-        elif point_dict.get('data_type'):
-            leaf_hierarchy_node_id = get_hierarchy_node_id(4, point_dict['data_type'])
-        elif point_dict.get('subcategory'):
-            leaf_hierarchy_node_id = get_hierarchy_node_id(3, point_dict['subcategory'])
-        elif point_dict.get('category'):
-            leaf_hierarchy_node_id = get_hierarchy_node_id(2, point_dict['category'])
-        elif point_dict.get('resource_type'):
-            leaf_hierarchy_node_id = get_hierarchy_node_id(1, point_dict['resource_type'])
-
-        # Ensure the determined hierarchy node actually exists from step 2
-        if leaf_hierarchy_node_id and leaf_hierarchy_node_id not in added_nodes: # Check if not None before checking set
-             print(f"Warning: Hierarchy node '{leaf_hierarchy_node_id}' for data point '{point_dict['data_source_id']}' not found in processed hierarchy. Skipping hierarchy link.")
-             leaf_hierarchy_node_id = None # Prevent edge creation to non-existent node
-
-
-        # --- Add Data Point Node ---
-        dp_node_id = f"dp_{point_dict['id']}"
-        dp_label = metadata.get('title', point_dict['data_source_id'])
-        country_info = COUNTRY_INFO.get(country, default_country_info) if country else default_country_info
-        dp_fill_color = country_info['color']
-        dp_border_color = '#555555'
-        dp_shape = 'dot'
-        # Update tooltip to show lists
-        tooltip = f"<b>{dp_label}</b><br>ID: {point_dict['data_source_id']}<br>Countries: {', '.join(countries_list)}<br>Domains: {', '.join(domains_list)}<br>Type: {point_dict.get('resource_type', 'N/A')}"
-
-        if dp_node_id not in added_nodes:
-            nodes.append({
-                'id': dp_node_id,
-                'label': dp_label,
-                'title': tooltip,
-                'group': 'data_point',
-                'shape': dp_shape,
-                'size': 18,
-                'mass': 3,
-                'font': {'size': base_font_size},
-                'color': {
-                    'background': dp_fill_color,
-                    'border': dp_border_color,
-                    'highlight': { 'background': dp_fill_color, 'border': '#2B7CE9' },
-                    'hover': { 'background': dp_fill_color, 'border': '#E04141' }
-                },
-                'borderWidth': 2,
-                'borderWidthSelected': 4,
-                'dataSourceId': point_dict['data_source_id']
-            })
-            added_nodes.add(dp_node_id)
-
-        # --- Add Edge from Hierarchy Leaf to Data Point ---
-        if leaf_hierarchy_node_id:
-            edges.append({
-                'from': leaf_hierarchy_node_id,
-                'to': dp_node_id,
-                'length': 80,
-                'color': {'color': '#c0c0c0', 'highlight': '#a0a0a0', 'hover': '#a0a0a0'}
-            })
-
-        # --- Add Country and Domain Nodes and Edges from Data Point ---
-        # Link to *all* countries and domains associated with the data point
-        for c_name in countries_list:
-            country_node_id = f"country_{c_name.replace(' ', '_').lower()}"
-            c_info = COUNTRY_INFO.get(c_name, default_country_info)
-            if country_node_id not in added_nodes:
-                country_label = f"{c_info['flag']} {c_name}"
-                nodes.append({
-                    'id': country_node_id, 'label': country_label, 'title': f"Country: {c_name}",
-                    'group': 'country_node', 'color': c_info['color'], 'shape': 'hexagon',
-                    'size': 30, 'mass': 15, 'font': {'size': base_font_size + 2}
-                })
-                added_nodes.add(country_node_id)
-            edges.append({
-                'from': dp_node_id, 'to': country_node_id, 'length': 200,
-                'color': {'color': '#dddddd', 'highlight': '#848484', 'hover': '#848484'}
-            })
-
-        for d_name in domains_list:
-            domain_node_id = f"domain_{d_name.replace(' ', '_').lower()}"
-            if domain_node_id not in added_nodes:
-                domain_shape = DOMAIN_SHAPES.get(d_name, DOMAIN_SHAPES['default'])
-                domain_color = '#FFDAB9'
-                nodes.append({
-                    'id': domain_node_id, 'label': d_name, 'title': f"Domain: {d_name}",
-                    'group': 'domain_node', 'color': domain_color, 'shape': domain_shape,
-                    'size': 22, 'mass': 8, 'font': {'size': base_font_size}
-                })
-                added_nodes.add(domain_node_id)
-            edges.append({
-                'from': dp_node_id, 'to': domain_node_id, 'length': 180,
-                'color': {'color': '#dddddd', 'highlight': '#848484', 'hover': '#848484'}
-            })
+            version, body = network_graph_cache.filtered_payload(graph_filter, graph_format)
+        except ValueError as e: # Unknown subtree path
+            return jsonify({"error": str(e)}), 400
+    else:
+        # Pre-encoded bytes for the current catalog version (rebuilt after any data_points write)
+        version, body = network_graph_cache.payload(graph_format, lod)
+    response = Response(body, mimetype='application/json')
+    response.headers['X-Catalog-Version'] = str(version) # Starting point for /api/network-data/changes
+    return response
+
+@app.route('/api/network-data/expand')
+@conditional_get()
+def expand_network_cluster():
+    """Data point nodes and edges of one cluster node (?node=<cluster id>&lod=<grouping it came from>)"""
+    cluster_id = request.args.get('node')
+    lod = request.args.get('lod', 'leaf')
+    if not cluster_id:
+        return jsonify({"error": "node (cluster id) is required."}), 400
+    if lod not in LOD_GROUPINGS:
+        return jsonify({"error": f"lod must be one of: {', '.join(LOD_GROUPINGS)}."}), 400
+
+    version, graph = network_graph_cache.expand(cluster_id, lod)
+    if graph is None:
+        # Unknown id, or the cluster no longer exists in this catalog version
+        return jsonify({"error": f"Cluster '{cluster_id}' not found.", "version": version}), 404
+    graph.update(node=cluster_id, version=version)
+    return jsonify(graph)
+
+@app.route('/api/network-data/neighborhood')
+@conditional_get()
+def get_network_neighborhood():
+    """
+    Nodes and edges within ?hops= (1-3, default 1) edges of ?node=, a graph
+    node id (L<level>_<name>, country_<name>, domain_<name> or dp_<id>).
+    ?format=compact as for /api/network-data.
+    """
+    node_id = request.args.get('node')
+    hops = request.args.get('hops', 1, type=int)
+    graph_format = request.args.get('format', 'full')
+    if not node_id:
+        return jsonify({"error": "node (graph node id) is required."}), 400
+    if not 1 <= hops <= NEIGHBORHOOD_MAX_HOPS:
+        return jsonify({"error": f"hops must be between 1 and {NEIGHBORHOOD_MAX_HOPS}."}), 400
+    if graph_format not in GRAPH_FORMATS:
+        return jsonify({"error": f"format must be one of: {', '.join(GRAPH_FORMATS)}."}), 400
+
+    version, subgraph = network_graph_cache.neighborhood(node_id, hops)
+    if subgraph is None:
+        return jsonify({"error": f"Node '{node_id}' not found.", "version": version}), 404
+    payload = compact_graph(subgraph) if graph_format == 'compact' else {'nodes': subgraph['nodes'], 'edges': subgraph['edges']}
+    payload.update(node=node_id, hops=hops, truncated=subgraph['truncated'], version=version)
+    return jsonify(payload)
+
+@app.route('/api/network-data/changes')
+@conditional_get()
+def get_network_data_changes():
+    """
+    Data point nodes added, updated and removed since catalog version ?since=,
+    with the nodes and edges the client needs to patch its graph in place.
+    Answers {"reset": true} when the change log no longer reaches back that far.
+    """
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({"error": "since (catalog version) is required."}), 400
 
+    graph = network_graph_cache.current() # Records and layout of one catalog version
+    complete, changes = get_catalog_changes(since, graph.version)
+    if not complete:
+        return jsonify({'version': graph.version, 'since': since, 'reset': True})
 
-    return jsonify({'nodes': nodes, 'edges': edges})
+    delta = network_graph_changes(graph.state, changes, HIERARCHY_GRAPH, graph.positions)
+    delta.update(version=graph.version, since=since, reset=False)
+    return jsonify(delta)
 
 # --- Admin Routes ---
 @app.route('/admin/login', methods=['GET', 'POST'])
@@ -1293,13 +1438,13 @@ def admin_review():
     pending = get_pending_submissions()
     # Parse JSON fields for display in the template
     for item in pending:
-        try:
-            item['countries_list'] = json.loads(item.get('countries', '[]'))
-            item['domains_list'] = json.loads(item.get('domains', '[]'))
-            item['primary_hierarchy_dict'] = json.loads(item.get('primary_hierarchy_path', '{}'))
-            item['related_metadata_list'] = json.loads(item.get('related_metadata', '[]'))
-            item['related_resources_list'] = json.loads(item.get('related_resources', '[]'))
-        except json.JSONDecodeError:
+        try: # NULL columns read as empty
+            item['countries_list'] = _submission_json(item, 'countries', [])
+            item['domains_list'] = _submission_json(item, 'domains', [])
+            item['primary_hierarchy_dict'] = _submission_json(item, 'primary_hierarchy_path', {})
+            item['related_metadata_list'] = _submission_json(item, 'related_metadata', [])
+            item['related_resources_list'] = _submission_json(item, 'related_resources', [])
+        except ValueError: # Includes json.JSONDecodeError
             item['countries_list'] = ['Error']
             item['domains_list'] = ['Error']
             item['primary_hierarchy_dict'] = {'Error': 'Invalid JSON'}
@@ -1307,6 +1452,89 @@ def admin_review():
             item['related_resources_list'] = ['Error']
     return render_template('admin_review.html', submissions=pending)
 
+def _submission_json(submission, key, default):
+    """A JSON column of a pending submission; NULL or empty reads as default, another JSON type raises ValueError"""
+    value = submission.get(key)
+    if value is None or value == '':
+        return default
+    parsed = json.loads(value)
+    if not isinstance(parsed, type(default)):
+        raise ValueError(f"{key} is not a JSON {type(default).__name__}")
+    return parsed
+
+def submission_to_data_point(submission):
+    """
+    Transform a pending submission into the tuple add_data_point expects.
+    Raises ValueError (json.JSONDecodeError for broken JSON fields) if the
+    submission cannot be approved as it is.
+    """
+    resource_name = submission.get('resource_name')
+    # Parse primary hierarchy and related data (NULL columns read as empty)
+    primary_hierarchy = _submission_json(submission, 'primary_hierarchy_path', {})
+    related_metadata_paths = _submission_json(submission, 'related_metadata', [])
+    related_resource_ids = _submission_json(submission, 'related_resources', [])
+    # <<< Year start/end can be None >>>
+    year_start = submission.get('year_start')
+    year_end = submission.get('year_end')
+
+    # Validate JSON lists are not empty
+    countries_list = _submission_json(submission, 'countries', [])
+    domains_list = _submission_json(submission, 'domains', [])
+    if not countries_list or not domains_list:
+        raise ValueError("missing Country or Domain selection")
+
+    # Extract hierarchy levels (use .get with None default)
+    resource_type = primary_hierarchy.get('resource_type') # Required
+    category = primary_hierarchy.get('category')
+    subcategory = primary_hierarchy.get('subcategory')
+    data_type = primary_hierarchy.get('data_type')
+    level5 = primary_hierarchy.get('level5')
+
+    # --- Validation ---
+    # <<< REMOVED year range check from required fields >>>
+    if not resource_name or not resource_type:
+        raise ValueError("missing required fields (Name, Type)")
+    # --- End Validation ---
+
+    # <<< Handle potentially None URL >>>
+    repository_url = submission.get('resource_url')
+    repository = 'Unknown'
+    if repository_url:
+        try:
+            parsed_url = urlparse(repository_url)
+            repository = parsed_url.netloc if parsed_url.netloc else 'Unknown'
+        except Exception:
+            repository = 'Unknown' # Keep Unknown if URL parsing fails
+
+    # <<< Description can be None/empty >>>
+    data_description = submission.get('description') # Allow None
+    keywords = submission.get('keywords')
+    contact_information = submission.get('contact_info')
+    last_updated = datetime.date.today().isoformat()
+    data_format = 'Unknown'
+    data_resolution = 'Unknown'
+
+    # Create metadata JSON
+    metadata_dict = {
+        "title": resource_name,
+        "institution": "Unknown",
+        "license": submission.get('license'),
+        "original_url": repository_url, # Store None if not provided
+        "related_metadata_categories": related_metadata_paths,
+        "related_resource_ids": related_resource_ids,
+        "submitted_description": data_description # Store None if not provided
+    }
+    metadata_json = json.dumps(metadata_dict)
+
+    # Prepare tuple for add_data_point (matching function signature)
+    # <<< Pass potentially None values for year_start, year_end, repository_url, data_description >>>
+    return (
+        None, resource_type, category, subcategory, data_type, level5,
+        year_start, year_end, data_format, data_resolution, repository, repository_url,
+        data_description, keywords, last_updated, contact_information, metadata_json,
+        json.dumps(countries_list), json.dumps(domains_list)
+    )
+
 @app.route('/admin/approve/<int:submission_id>', methods=['POST'])
 @admin_required
 def approve_submission(submission_id):
@@ -1317,77 +1545,7 @@ def approve_submission(submission_id):
 
     try:
         # --- Transform Submission Data ---
-        resource_name = submission.get('resource_name')
-        # Get JSON strings directly from submission
-        countries_json = submission.get('countries', '[]')
-        domains_json = submission.get('domains', '[]')
-        # Parse primary hierarchy and related data
-        primary_hierarchy = json.loads(submission.get('primary_hierarchy_path', '{}'))
-        related_metadata_paths = json.loads(submission.get('related_metadata', '[]'))
-        related_resource_ids = json.loads(submission.get('related_resources', '[]'))
-        # <<< Year start/end can be None >>>
-        year_start = submission.get('year_start')
-        year_end = submission.get('year_end')
-
-        # Validate JSON lists are not empty
-        countries_list = json.loads(countries_json)
-        domains_list = json.loads(domains_json)
-        if not countries_list or not domains_list:
-             flash(f'Submission {submission_id} missing Country or Domain selection. Cannot approve.', 'error')
-             return redirect(url_for('admin_review'))
-
-        # Extract hierarchy levels (use .get with None default)
-        resource_type = primary_hierarchy.get('resource_type') # Required
-        category = primary_hierarchy.get('category')
-        subcategory = primary_hierarchy.get('subcategory')
-        data_type = primary_hierarchy.get('data_type')
-        level5 = primary_hierarchy.get('level5')
-
-        # --- Validation ---
-        # <<< REMOVED year range check from required fields >>>
-        if not resource_name or not resource_type:
-             flash(f'Submission {submission_id} missing required fields (Name, Type). Cannot approve.', 'error')
-             return redirect(url_for('admin_review'))
-        # --- End Validation ---
-
-        # <<< Handle potentially None URL >>>
-        repository_url = submission.get('resource_url')
-        repository = 'Unknown'
-        if repository_url:
-            try:
-                parsed_url = urlparse(repository_url)
-                repository = parsed_url.netloc if parsed_url.netloc else 'Unknown'
-            except Exception:
-                repository = 'Unknown' # Keep Unknown if URL parsing fails
-
-        # <<< Description can be None/empty >>>
-        data_description = submission.get('description') # Allow None
-        keywords = submission.get('keywords')
-        contact_information = submission.get('contact_info')
-        last_updated = datetime.date.today().isoformat()
-        data_format = 'Unknown'
-        data_resolution = 'Unknown'
-
-        # Create metadata JSON
-        metadata_dict = {
-            "title": resource_name,
-            "institution": "Unknown",
-            "license": submission.get('license'),
-            "original_url": repository_url, # Store None if not provided
-            "related_metadata_categories": related_metadata_paths,
-            "related_resource_ids": related_resource_ids,
-            "submitted_description": data_description # Store None if not provided
-        }
-        metadata_json = json.dumps(metadata_dict)
-
-        # Prepare tuple for add_data_point (matching function signature)
-        # <<< Pass potentially None values for year_start, year_end, repository_url, data_description >>>
-        data_point_tuple = (
-            None, resource_type, category, subcategory, data_type, level5,
-            year_start, year_end, data_format, data_resolution, repository, repository_url,
-            data_description, keywords, last_updated, contact_information, metadata_json,
-            countries_json, domains_json
-        )
+        data_point_tuple = submission_to_data_point(submission)
 
         # --- Add to Main Data Points Table ---
         new_data_source_id = add_data_point(data_point_tuple)
@@ -1400,6 +1558,8 @@ def approve_submission(submission_id):
 
     except json.JSONDecodeError as e:
         flash(f'Error parsing JSON data for submission {submission_id}: {e}. Cannot approve.', 'error')
+    except ValueError as e:
+        flash(f'Submission {submission_id} {e}. Cannot approve.', 'error')
     except Exception as e:
         app.logger.error(f"Error approving submission {submission_id}: {e}", exc_info=True)
         flash(f'An error occurred while approving submission {submission_id}: {e}', 'error')
@@ -1424,75 +1584,184 @@ def reject_submission(submission_id):
 
     return redirect(url_for('admin_review'))
 
+# --- NEW ROUTE: Batch approve/reject ---
+@app.route('/admin/review/batch', methods=['POST'])
+@admin_required
+def batch_moderate_submissions():
+    """
+    Approve or reject several submissions at once.
+    Form fields (or JSON keys): action ('approve' or 'reject') and submission_ids.
+    All inserts, deletes and status updates run in one transaction.
+    JSON requests get the per-item report back; form posts get it as flash messages.
+    """
+    if request.is_json:
+        payload = request.get_json(silent=True) or {}
+        action = payload.get('action')
+        raw_ids = payload.get('submission_ids') or []
+    else:
+        action = request.form.get('action')
+        raw_ids = request.form.getlist('submission_ids')
+
+    submission_ids = []
+    for raw_id in raw_ids:
+        try:
+            submission_ids.append(int(raw_id))
+        except (TypeError, ValueError):
+            continue
+    submission_ids = list(dict.fromkeys(submission_ids)) # Drop repeats, keep order
+
+    if action not in ('approve', 'reject') or not submission_ids:
+        message = 'Select at least one submission and an action (approve or reject).'
+        if request.is_json:
+            return jsonify({"error": message}), 400
+        flash(message, 'warning')
+        return redirect(url_for('admin_review'))
+
+    results = []
+    approvals = []
+    if action == 'approve':
+        submissions = get_pending_submissions_by_ids(submission_ids)
+        for submission_id in submission_ids:
+            submission = submissions.get(submission_id)
+            if not submission:
+                results.append({'submission_id': submission_id, 'action': 'approve', 'status': 'not_found',
+                                'data_source_id': None, 'message': 'Submission not found.'})
+                continue
+            try:
+                approvals.append((submission_id, submission_to_data_point(submission)))
+            except ValueError as e:
+                results.append({'submission_id': submission_id, 'action': 'approve', 'status': 'invalid',
+                                'data_source_id': None, 'message': str(e)})
+
+    try:
+        results.extend(moderate_pending_submissions(
+            approvals=approvals,
+            rejections=submission_ids if action == 'reject' else ()
+        ))
+    except sqlite3.Error as e:
+        app.logger.error(f"Batch {action} of {len(submission_ids)} submissions failed: {e}", exc_info=True)
+        if request.is_json:
+            return jsonify({"error": f"Database error, nothing was changed: {e}"}), 500
+        flash(f'Batch {action} failed, nothing was changed: {e}', 'error')
+        return redirect(url_for('admin_review'))
+
+    results.sort(key=lambda result: submission_ids.index(result['submission_id']))
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+
+    if request.is_json:
+        return jsonify({"action": action, "counts": counts, "results": results})
+
+    done = counts.get('approved', 0) + counts.get('rejected', 0)
+    done_label = 'approved' if action == 'approve' else 'rejected'
+    flash(f'Batch {action}: {done} of {len(submission_ids)} submissions {done_label}.', 'success' if done else 'warning')
+    for result in results:
+        if result['status'] == 'approved':
+            flash(f"Submission {result['submission_id']} approved and added with ID: {result['data_source_id']}.", 'success')
+        elif result['status'] != 'rejected':
+            flash(f"Submission {result['submission_id']}: {result['status'].replace('_', ' ')}"
+                  + (f" ({result['message']})" if result['message'] else '') + '.', 'error')
+    return redirect(url_for('admin_review'))
+# --- END NEW ROUTE ---
+
 # --- NEW ROUTE: Download Database ---
 @app.route('/admin/download-db')
 @admin_required
 def download_db():
-    """Allows admin to download the current database file."""
+    """
+    Allows admin to download a consistent snapshot of the database.
+    Add ?compress=1 for a gzip-compressed copy.
+    """
+    compress = request.args.get('compress', '').lower() in ('1', 'true', 'yes')
+    snapshot_file = None
     try:
-        # Get the absolute path to the database file from database.py
-        db_path = DB_PATH # Use the imported DB_PATH
-        if not os.path.exists(db_path):
-            flash('Database file not found.', 'error')
-            return redirect(url_for('admin_review'))
-
-        # Send the file to the user
+        # Already open: the cached file may be replaced by a newer snapshot mid-download
+        snapshot_file = get_snapshot(compress=compress)
+        download_name = f'nomoreamr_backup_{datetime.date.today().isoformat()}.db' # Suggest a filename
+        # send_file streams the open file in chunks and closes it when done
         return send_file(
-            db_path,
+            snapshot_file,
+            mimetype='application/gzip' if compress else 'application/vnd.sqlite3',
             as_attachment=True,
-            download_name=f'nomoreamr_backup_{datetime.date.today().isoformat()}.db' # Suggest a filename
+            download_name=download_name + '.gz' if compress else download_name
         )
     except Exception as e:
+        if snapshot_file is not None:
+            snapshot_file.close()
         app.logger.error(f"Error downloading database: {e}", exc_info=True)
         flash(f'An error occurred while trying to download the database: {e}', 'error')
         return redirect(url_for('admin_review'))
 # --- END NEW ROUTE ---
 
+# --- Admin: SQL statement statistics ---
+@app.route('/admin/query-stats')
+@admin_required
+def admin_query_stats():
+    """
+    Per-statement latency percentiles, row counts and calling endpoints for this worker.
+    Add ?reset=1 to clear the counters after reading them. Empty unless the
+    worker runs with QUERY_STATS_ENABLED=1.
+    """
+    stats = query_stats.snapshot()
+    if request.args.get('reset') == '1':
+        query_stats.reset()
+    return jsonify({
+        'worker_pid': os.getpid(),
+        'enabled': query_stats.QUERY_STATS_ENABLED,
+        'slow_query_ms': query_stats.SLOW_QUERY_MS,
+        'statements': stats
+    })
+
 # --- NEW: Admin Manage Approved Resources ---
 @app.route('/admin/manage')
 @admin_required
 def admin_manage():
-    """Displays a list of approved resources for editing or deletion."""
-    approved_resources = get_all_data_points() # Fetch all approved points
-    # Parse JSON fields for display
-    for resource in approved_resources:
-        try:
-            if resource.get('metadata'):
-                 resource['metadata_obj'] = json.loads(resource['metadata'])
-            else:
-                 resource['metadata_obj'] = {}
-            # <<< Parse countries and domains JSON >>>
-            resource['countries_list'] = json.loads(resource.get('countries', '[]'))
-            resource['domains_list'] = json.loads(resource.get('domains', '[]'))
-        except json.JSONDecodeError:
-            resource['metadata_obj'] = {'Error': 'Invalid JSON'}
-            resource['countries_list'] = ['Error'] # Add error handling
-            resource['domains_list'] = ['Error']
-    return render_template('admin_manage.html', resources=approved_resources)
+    """Displays a page of approved resources for editing or deletion."""
+    page_args = {
+        'q': request.args.get('q', '').strip(),
+        'resource_type': request.args.get('resource_type', ''),
+        'country': request.args.get('country', ''),
+        'domain': request.args.get('domain', ''),
+        'sort': request.args.get('sort', 'created_at'),
+        'order': 'asc' if request.args.get('order') == 'asc' else 'desc',
+        'per_page': request.args.get('per_page', ADMIN_PAGE_SIZE, type=int)
+    }
+    page = get_data_points_page(
+        limit=page_args['per_page'],
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        sort=page_args['sort'],
+        descending=page_args['order'] == 'desc',
+        search=page_args['q'] or None,
+        resource_type=page_args['resource_type'] or None,
+        country=page_args['country'] or None,
+        domain=page_args['domain'] or None
+    )
+    # Only non-empty arguments are carried over into the pager links
+    page_args = {k: v for k, v in page_args.items() if v}
+    return render_template('admin_manage.html', resources=resource_cache.many(page['ids']), page=page,
+                           page_args=page_args, vocabularies=VOCABULARIES)
 
 # --- NEW: Edit Resource (GET - Show Form) ---
 @app.route('/admin/edit/<int:data_id>', methods=['GET'])
 @admin_required
 def edit_data_form(data_id):
     """Displays the form to edit an existing resource."""
-    data_point_row = get_data_point_by_id(data_id) # Fetch by primary key ID
-    if not data_point_row:
+    record = resource_cache.get(data_id) # Fetch by primary key ID (JSON already decoded)
+    if not record:
         flash(f'Resource with ID {data_id} not found.', 'error')
         return redirect(url_for('admin_manage'))
 
-    data_point = dict(data_point_row)
+    data_point = record.to_dict()
     form_data = {}
-    metadata = {}
     form_data_multidict = MultiDict() # Initialize MultiDict
 
     try:
-        if data_point.get('metadata'):
-            metadata = json.loads(data_point['metadata'])
+        metadata = record.metadata_obj
         data_point['metadata_obj'] = metadata # Keep for display
-
-        # <<< Parse countries and domains JSON from DB >>>
-        countries_list = json.loads(data_point.get('countries', '[]'))
-        domains_list = json.loads(data_point.get('domains', '[]'))
+        countries_list = record.countries_list
+        domains_list = record.domains_list
 
         # --- Populate form_data dictionary (used for MultiDict creation) ---
         form_data['resource_name'] = metadata.get('title', data_point.get('data_source_id'))
@@ -1552,28 +1821,19 @@ def edit_data_form(data_id):
 @admin_required
 def update_data(data_id):
     """Handles the submission of the edit form."""
-    original_data_point_row = get_data_point_by_id(data_id) # Fetch row object
-    if not original_data_point_row:
+    original_record = resource_cache.get(data_id) # Fetch decoded record
+    if not original_record:
         flash(f'Resource with ID {data_id} not found.', 'error')
         return redirect(url_for('admin_manage'))
 
-    # Convert row to dict for easier manipulation
-    original_data_point = dict(original_data_point_row)
+    # Copy to a dict for easier manipulation (cached records are shared)
+    original_data_point = original_record.to_dict()
 
     # --- Helper function to prepare data_point for template rendering ---
     def prepare_data_point_for_template(data_point_dict):
-        try:
-            if data_point_dict.get('metadata'):
-                data_point_dict['metadata_obj'] = json.loads(data_point_dict['metadata'])
-            else:
-                data_point_dict['metadata_obj'] = {}
-            # <<< Parse countries and domains JSON for display in template if needed >>>
-            data_point_dict['countries_list'] = json.loads(data_point_dict.get('countries', '[]'))
-            data_point_dict['domains_list'] = json.loads(data_point_dict.get('domains', '[]'))
-        except json.JSONDecodeError:
-            data_point_dict['metadata_obj'] = {'Error': 'Invalid JSON in DB'}
-            data_point_dict['countries_list'] = ['Error']
-            data_point_dict['domains_list'] = ['Error']
+        data_point_dict['metadata_obj'] = original_record.metadata_obj
+        data_point_dict['countries_list'] = original_record.countries_list
+        data_point_dict['domains_list'] = original_record.domains_list
         return data_point_dict
     # --- End Helper ---
 
@@ -1643,12 +1903,7 @@ def update_data(data_id):
              original_data_point = prepare_data_point_for_template(original_data_point)
              return render_template('edit_data.html', vocabularies=VOCABULARIES, data_point=original_data_point, form_data=MultiDict(form_data))
 
-        original_metadata = {}
-        if original_data_point.get('metadata'):
-            try:
-                original_metadata = json.loads(original_data_point['metadata'])
-            except json.JSONDecodeError:
-                pass # Keep original_metadata empty if parsing fails
+        original_metadata = original_record.metadata_obj
 
         metadata_dict = {
             "title": resource_name,
@@ -1722,61 +1977,63 @@ def delete_data(data_id):
     return redirect(url_for('admin_manage'))
 
 # --- NEW: API Endpoint for Searching Resources ---
+def highlight_snippet(snippet):
+    """HTML for a search snippet: the text escaped, matched terms wrapped in <mark>"""
+    if snippet is None:
+        return None
+    return str(escape(snippet)).replace(SNIPPET_MATCH_START, '<mark>').replace(SNIPPET_MATCH_END, '</mark>')
+
 @app.route('/api/search-resources')
+@conditional_get()
 def search_resources():
-    """API endpoint for Select2 AJAX search."""
+    """
+    API endpoint for Select2 AJAX search. yearFrom / yearTo keep resources overlapping those years.
+    Full-text matches come first; if there are fewer than limit, the rest are
+    filled from the trigram index, which tolerates typos ("Sweeden", "metagenom").
+    """
     search_term = request.args.get('q', '').strip()
     limit = request.args.get('limit', 15, type=int) # Limit results for performance
+    try:
+        year_from, year_to = parse_year(request.args, 'yearFrom'), parse_year(request.args, 'yearTo')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     if not search_term or len(search_term) < 2: # Require at least 2 characters
         return jsonify([])
 
-    conn = get_db()
-    c = conn.cursor()
-
-    # Prepare search pattern
-    search_pattern = f"%{search_term}%"
-
-    # Query across multiple fields: data_source_id, keywords, description, and title within metadata JSON
-    # Using LIKE for basic search. For JSON, we use json_extract.
-    # Note: json_extract might be slow on large datasets without indexing.
-    query = """
-        SELECT id, data_source_id, metadata, keywords, data_description
-        FROM data_points
-        WHERE data_source_id LIKE ?
-           OR keywords LIKE ?
-           OR data_description LIKE ?
-           OR json_extract(metadata, '$.title') LIKE ?
-        ORDER BY last_updated DESC
-        LIMIT ?
-    """
-    params = [search_pattern, search_pattern, search_pattern, search_pattern, limit]
-
-    try:
-        c.execute(query, params)
-        results = c.fetchall()
-    except sqlite3.Error as e:
-        logging.error(f"Error searching resources: {e}")
-        results = [] # Return empty on error
-    finally:
-        conn.close()
+    results = search_data_points(search_term, limit, year_from, year_to)
 
-    # Format results for Select2 { id: data_source_id, text: 'Title (ID)' }
+    # Format results for Select2 { id: data_source_id, text: 'Title (ID)' } plus the FTS highlight
+    # Titles come already decoded from the resource cache
+    records = {record.id: record for record in resource_cache.many([row_dict['id'] for row_dict in results])}
     formatted_results = []
-    for row in results:
-        row_dict = dict(row)
-        title = row_dict.get('data_source_id', 'Unknown ID') # Default to ID
-        try:
-            metadata = json.loads(row_dict.get('metadata', '{}'))
-            title = metadata.get('title', title) # Use title from metadata if available
-        except json.JSONDecodeError:
-            pass # Keep default title if metadata parsing fails
-
+    for row_dict in results:
+        record = records.get(row_dict['id'])
+        title = record.title if record else row_dict['data_source_id']
         formatted_results.append({
             "id": row_dict['data_source_id'], # Use data_source_id as the value
-            "text": f"{title} ({row_dict['data_source_id']})" # Display text
+            "text": f"{title} ({row_dict['data_source_id']})", # Display text
+            "snippet": highlight_snippet(row_dict.get('snippet')) # Escaped text with <mark> highlights (None without FTS5)
         })
 
+    if len(formatted_results) < limit:
+        # Fuzzy matches for what full-text search missed (misspellings, partial words)
+        allowed_ids = None
+        if year_from is not None or year_to is not None:
+            allowed_ids = set(get_year_overlap_ids(year_from, year_to))
+        found_ids = {row_dict['id'] for row_dict in results}
+        for data_id, score in trigram_index.search(search_term, limit + len(found_ids), allowed_ids):
+            record = resource_cache.get(data_id)
+            if data_id in found_ids or record is None:
+                continue
+            formatted_results.append({
+                "id": record.data_source_id,
+                "text": f"{record.title} ({record.data_source_id})",
+                "snippet": None # No highlight for fuzzy matches
+            })
+            if len(formatted_results) >= limit:
+                break
+
     return jsonify(formatted_results)
 # --- END NEW API Endpoint ---
 
@@ -1793,93 +2050,53 @@ def ai_chat_handler():
     if not user_query:
         return jsonify({"error": "No query provided."}), 400
 
-    conn = get_db()
-    c = conn.cursor()
-
-    # 1. Fetch summary of all resources (ID, Title, Resource Type, Keywords)
+    # 1. Summary of all resources (ID, Title, Resource Type, Keywords) from the resource cache
     # These will form the general knowledge base for the AI for this turn.
-    try:
-        c.execute("SELECT data_source_id, metadata, resource_type, category, keywords FROM data_points")
-        all_resources_rows = c.fetchall()
-    except sqlite3.Error as e:
-        logging.error(f"AI Chat - DB error fetching all resources: {e}")
-        return jsonify({"error": "Database error fetching resource summary."}), 500
-    
     all_resources_summary_list = []
-    for row_idx, row in enumerate(all_resources_rows):
-        row_dict = dict(row)
-        title = row_dict.get('data_source_id', f'Unknown Resource {row_idx+1}')
-        try:
-            metadata = json.loads(row_dict.get('metadata', '{}'))
-            title = metadata.get('title', title)
-        except json.JSONDecodeError:
-            pass
-        
-        countries_list_summary = json.loads(row_dict.get('countries', '[]'))
-        domains_list_summary = json.loads(row_dict.get('domains', '[]'))
-
+    for record in resource_cache.all():
         summary_entry = (
-            f"- ID: {row_dict['data_source_id']}\n"
-            f"  Title: {title}\n"
-            f"  Resource Type: {row_dict.get('resource_type', 'N/A')}\n"
-            f"  Category: {row_dict.get('category', 'N/A')}\n"
-            f"  Keywords: {row_dict.get('keywords', 'N/A')}\n"
-            f"  Countries: {', '.join(countries_list_summary)}\n"
-            f"  Domains: {', '.join(domains_list_summary)}\n"
-            f"  Years: {row_dict.get('year_start','N/A')}-{row_dict.get('year_end','N/A')}"
+            f"- ID: {record.data_source_id}\n"
+            f"  Title: {record.title}\n"
+            f"  Resource Type: {record.resource_type or 'N/A'}\n"
+            f"  Category: {record.category or 'N/A'}\n"
+            f"  Keywords: {record.keywords or 'N/A'}\n"
+            f"  Countries: {', '.join(record.countries_list)}\n"
+            f"  Domains: {', '.join(record.domains_list)}\n"
+            f"  Years: {record.year_start or 'N/A'}-{record.year_end or 'N/A'}"
         )
         all_resources_summary_list.append(summary_entry)
-    
+
     all_resources_summary_text = "\n".join(all_resources_summary_list)
     if not all_resources_summary_text:
         all_resources_summary_text = "No resources found in the database."
 
-    # 2. Fetch details for specifically selected resources
+    # 2. Details for specifically selected resources
     selected_resources_details_text = ""
     if selected_resource_ids:
-        try:
-            # Ensure selected_resource_ids is a list of strings for the query
-            placeholders = ','.join('?' for _ in selected_resource_ids)
-            c.execute(f"SELECT data_source_id, metadata, resource_type, category, subcategory, data_type, level5, data_description, keywords, countries, domains, year_start, year_end FROM data_points WHERE data_source_id IN ({placeholders})", selected_resource_ids)
-            selected_rows = c.fetchall()
-            
-            if selected_rows:
-                selected_resources_details_text += "\n\n== Details for Specifically Selected Resources ==\n"
-                for row in selected_rows:
-                    row_dict = dict(row)
-                    title = row_dict.get('data_source_id', 'Unknown ID')
-                    try:
-                        metadata = json.loads(row_dict.get('metadata', '{}'))
-                        title = metadata.get('title', title)
-                    except json.JSONDecodeError:
-                        pass
-                    
-                    countries_list = json.loads(row_dict.get('countries', '[]'))
-                    domains_list = json.loads(row_dict.get('domains', '[]'))
-
-                    selected_resources_details_text += (
-                        f"\n---\n"
-                        f"Resource ID: {row_dict['data_source_id']}\n"
-                        f"Title: {title}\n"
-                        f"Resource Type: {row_dict.get('resource_type')}\n"
-                        f"Category: {row_dict.get('category')}\n"
-                        f"Subcategory: {row_dict.get('subcategory')}\n"
-                        f"Data Type: {row_dict.get('data_type')}\n"
-                        f"Level 5 Item: {row_dict.get('level5')}\n"
-                        f"Description: {row_dict.get('data_description', 'N/A')}\n"
-                        f"Keywords: {row_dict.get('keywords', 'N/A')}\n"
-                        f"Countries: {', '.join(countries_list)}\n"
-                        f"Domains: {', '.join(domains_list)}\n"
-                        f"Year Range: {row_dict.get('year_start', 'N/A')} - {row_dict.get('year_end', 'N/A')}\n"
-                        f"---\n"
-                    )
-            else:
-                selected_resources_details_text = "\n\n(No details found for the specifically selected resource IDs, or none were selected.)\n"
-        except sqlite3.Error as e:
-            logging.error(f"AI Chat - DB error fetching selected resources: {e}")
-            selected_resources_details_text = "\n\n(Error fetching details for selected resources.)\n"
-    
-    conn.close()
+        selected_records = [resource_cache.get_by_source_id(source_id) for source_id in selected_resource_ids]
+        selected_records = [record for record in selected_records if record is not None]
+
+        if selected_records:
+            selected_resources_details_text += "\n\n== Details for Specifically Selected Resources ==\n"
+            for record in selected_records:
+                selected_resources_details_text += (
+                    f"\n---\n"
+                    f"Resource ID: {record.data_source_id}\n"
+                    f"Title: {record.title}\n"
+                    f"Resource Type: {record.resource_type}\n"
+                    f"Category: {record.category}\n"
+                    f"Subcategory: {record.subcategory}\n"
+                    f"Data Type: {record.data_type}\n"
+                    f"Level 5 Item: {record.level5}\n"
+                    f"Description: {record.data_description or 'N/A'}\n"
+                    f"Keywords: {record.keywords or 'N/A'}\n"
+                    f"Countries: {', '.join(record.countries_list)}\n"
+                    f"Domains: {', '.join(record.domains_list)}\n"
+                    f"Year Range: {record.year_start or 'N/A'} - {record.year_end or 'N/A'}\n"
+                    f"---\n"
+                )
+        else:
+            selected_resources_details_text = "\n\n(No details found for the specifically selected resource IDs, or none were selected.)\n"
 
     # 3. Get Vocabulary/Hierarchy Text
     hierarchy_context = get_detailed_vocab_text() # This provides the structure
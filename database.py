@@ -3,6 +3,16 @@ import os
 import json
 import yaml
 import logging # <<< Add logging import
+import threading
+import re
+import time
+import gzip
+import shutil
+import tempfile
+import base64
+import itertools
+
+import query_stats
 
 # Configure basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -10,12 +20,181 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Define database path - UPDATED TO USE RENDER DISK PATH
 DB_PATH = os.path.join('/database_nomoreamr', 'amr.db') # Use the Render mount path
 
-def get_db():
-    """Get a database connection"""
-    conn = sqlite3.connect(DB_PATH)
+# --- Connection tuning (applied once per connection) ---
+DB_BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', 5000))  # Wait for writers instead of "database is locked"
+DB_CACHE_SIZE_KB = int(os.environ.get('DB_CACHE_SIZE_KB', 20000))     # Page cache per connection
+DB_MMAP_SIZE = int(os.environ.get('DB_MMAP_SIZE', 256 * 1024 * 1024)) # Memory-mapped I/O for reads
+DB_STATEMENT_CACHE_SIZE = 256                                          # Prepared statements kept per connection
+
+# Bump when init_db gains a one-time migration (stored in PRAGMA user_version)
+SCHEMA_VERSION = 1
+
+# Rows per transaction for bulk_add_data_points
+BULK_CHUNK_SIZE = 500
+
+# Database snapshots: pages copied per backup step, bytes per streamed chunk
+SNAPSHOT_STEP_PAGES = 1024
+SNAPSHOT_STREAM_CHUNK = 256 * 1024
+
+# Columns the admin listing can be sorted by (all NOT NULL, each indexed together with id)
+PAGE_SORT_COLUMNS = ('created_at', 'last_updated', 'data_source_id', 'resource_type')
+
+# Set by init_db once the FTS5 search index is known to exist
+FTS_ENABLED = False
+
+# Control characters around matched terms in search snippets; the caller escapes the text before
+# turning them into markup (the indexed text is user-submitted)
+SNIPPET_MATCH_START = '\x02'
+SNIPPET_MATCH_END = '\x03'
+
+# Set by init_db once the data_points_years R*Tree is known to exist
+YEAR_INDEX_ENABLED = False
+
+# Stored in data_points_years for a NULL year_start / year_end (open-ended, overlaps any range)
+YEAR_OPEN_START = -9999
+YEAR_OPEN_END = 9999
+
+# Widest span of years /api/year-coverage returns at once
+YEAR_COVERAGE_MAX_YEARS = 500
+
+# Most recent catalog_changes rows kept; clients further behind reload the full graph
+CATALOG_CHANGES_KEPT = 10000
+
+# Facets kept in facet_counts; hierarchy values are full paths joined with FACET_PATH_SEPARATOR
+# (e.g. category 'Data/omics_data') so equal names under different parents never share a count
+HIERARCHY_FACETS = ('resource_type', 'category', 'subcategory', 'data_type', 'level5')
+FACETS = ('country', 'domain') + HIERARCHY_FACETS
+FACET_PATH_SEPARATOR = '/'
+
+# One connection per thread (i.e. per gunicorn worker thread), reused across requests
+_local = threading.local()
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    sqlite3 connection owned by the per-thread pool.
+    Helpers keep calling conn.close() as before; that only hands the connection
+    back to the pool (rolling back anything left uncommitted) once the
+    outermost caller is done with it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+
+    def cursor(self, factory=None):
+        # Route every statement through the timing cursor when instrumentation is on
+        if factory is None:
+            factory = query_stats.InstrumentedCursor if query_stats.QUERY_STATS_ENABLED else sqlite3.Cursor
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        self.checkouts = max(self.checkouts - 1, 0)
+        if self.checkouts == 0 and self.in_transaction:
+            self.rollback() # Same outcome as closing a connection with an open transaction
+
+    def dispose(self):
+        """Really close the underlying sqlite handle."""
+        super().close()
+
+
+def _connect():
+    """Open a new tuned connection for the pool"""
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        factory=PooledConnection,
+        cached_statements=DB_STATEMENT_CACHE_SIZE
+    )
     conn.row_factory = sqlite3.Row  # This allows accessing columns by name
+    conn.execute('PRAGMA journal_mode=WAL')  # Readers no longer block on admin writes
+    conn.execute(f'PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}')
+    conn.execute('PRAGMA synchronous=NORMAL')  # Safe with WAL, avoids an fsync per commit
+    conn.execute(f'PRAGMA mmap_size={DB_MMAP_SIZE}')
+    conn.execute(f'PRAGMA cache_size=-{DB_CACHE_SIZE_KB}')
     return conn
 
+def get_db():
+    """Get this thread's pooled database connection (opened and tuned on first use)"""
+    conn = getattr(_local, 'conn', None)
+    # Never reuse a connection inherited across a fork (gunicorn preload)
+    if conn is None or _local.pid != os.getpid():
+        conn = _connect()
+        _local.conn = conn
+        _local.pid = os.getpid()
+    conn.checkouts += 1
+    return conn
+
+def close_db(exception=None):
+    """
+    Release this thread's connection at the end of a request.
+    Resets the checkout count so a helper that forgot conn.close() cannot
+    leave a transaction open for the next request.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.pid != os.getpid():
+        return
+    conn.checkouts = 0
+    if conn.in_transaction:
+        conn.rollback()
+
+def dispose_db():
+    """Close this thread's pooled connection entirely (e.g. on worker shutdown)"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        conn.dispose()
+    _local.conn = None
+
+# Dedicated per-process connection used only to read PRAGMA data_version.
+# It never writes, so its data_version changes whenever anyone else commits.
+_version_lock = threading.Lock()
+_version_conn = None
+_version_pid = None
+
+def get_data_version():
+    """Cheap token that changes whenever any connection commits to the database"""
+    global _version_conn, _version_pid
+    with _version_lock:
+        if _version_conn is None or _version_pid != os.getpid():
+            _version_conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+            _version_pid = os.getpid()
+        return _version_conn.execute('PRAGMA data_version').fetchone()[0]
+
+_catalog_version_lock = threading.Lock()
+_catalog_version_cache = {'data_version': None, 'version': 0, 'updated_at': None}
+
+def get_catalog_state():
+    """
+    (version, updated_at) of the approved catalog (data_points), shared by all workers.
+    version is bumped and updated_at (unix seconds, None before the first write)
+    set by triggers on every insert, update and delete of a data point.
+    Only re-read from catalog_state when PRAGMA data_version says something
+    was committed since the last call.
+    """
+    data_version = get_data_version()
+    with _catalog_version_lock:
+        if _catalog_version_cache['data_version'] == data_version:
+            return _catalog_version_cache['version'], _catalog_version_cache['updated_at']
+    conn = get_db()
+    row = conn.execute('SELECT version, updated_at FROM catalog_state WHERE id = 1').fetchone()
+    conn.close()
+    version, updated_at = (row[0], row[1]) if row else (0, None)
+    with _catalog_version_lock:
+        _catalog_version_cache['data_version'] = data_version
+        _catalog_version_cache['version'] = version
+        _catalog_version_cache['updated_at'] = updated_at
+    return version, updated_at
+
+def get_catalog_version():
+    """Version number of the approved catalog (see get_catalog_state)"""
+    return get_catalog_state()[0]
+
 # Create database and tables
 def init_db():
     """Initialize the database with tables"""
@@ -87,9 +266,387 @@ def init_db():
                     submitter_info TEXT     -- Optional: could add user ID or email if auth is implemented
                 )''')
 
+    # Normalized country/domain links so filtering can use indexes instead of LIKE on JSON text
+    c.execute('''CREATE TABLE IF NOT EXISTS data_point_countries (
+                    country TEXT NOT NULL,
+                    data_point_id INTEGER NOT NULL REFERENCES data_points(id),
+                    PRIMARY KEY (country, data_point_id)
+                ) WITHOUT ROWID''')
+    c.execute('''CREATE TABLE IF NOT EXISTS data_point_domains (
+                    domain TEXT NOT NULL,
+                    data_point_id INTEGER NOT NULL REFERENCES data_points(id),
+                    PRIMARY KEY (domain, data_point_id)
+                ) WITHOUT ROWID''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_data_point_countries_dp ON data_point_countries (data_point_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_data_point_domains_dp ON data_point_domains (data_point_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_data_points_resource_type ON data_points (resource_type)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_data_points_repository_url ON data_points (repository_url)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_data_points_created_at ON data_points (created_at, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_data_points_last_updated ON data_points (last_updated, id)')
+
+    # Last counter handed out per base data_source_id (e.g. OMIC-UNKN-2024 -> 3 means -3 is taken)
+    c.execute('''CREATE TABLE IF NOT EXISTS data_source_id_counters (
+                    base_id TEXT PRIMARY KEY,
+                    last_suffix INTEGER NOT NULL
+                )''')
+
+    # Catalog version counter: bumped on every write to data_points (cache invalidation)
+    c.execute('''CREATE TABLE IF NOT EXISTS catalog_state (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    version INTEGER NOT NULL,
+                    updated_at INTEGER                  -- Unix time of the last data_points write
+                )''')
+    c.execute('INSERT OR IGNORE INTO catalog_state (id, version) VALUES (1, 0)')
+    catalog_columns = [row[1] for row in c.execute('PRAGMA table_info(catalog_state)').fetchall()]
+    if 'updated_at' not in catalog_columns:
+        # Last-Modified for the read APIs
+        c.execute('ALTER TABLE catalog_state ADD COLUMN updated_at INTEGER')
+
+    # Network graph layout shared by all workers: a node's position is written once and never moved
+    c.execute('''CREATE TABLE IF NOT EXISTS graph_positions (
+                    node_id TEXT PRIMARY KEY,           -- Node id in /api/network-data
+                    x REAL NOT NULL,
+                    y REAL NOT NULL
+                ) WITHOUT ROWID''')
+
+    # Which data point each catalog version touched (feeds /api/network-data/changes)
+    c.execute('''CREATE TABLE IF NOT EXISTS catalog_changes (
+                    version INTEGER PRIMARY KEY,        -- catalog_state.version after the write
+                    data_point_id INTEGER NOT NULL,
+                    change TEXT NOT NULL                -- insert, update, delete
+                )''')
+
+    # Deepest hierarchy node of each data point (hierarchy_nodes.id), set by trigger
+    data_point_columns = [row[1] for row in c.execute('PRAGMA table_info(data_points)').fetchall()]
+    if 'hierarchy_node_id' not in data_point_columns:
+        c.execute('ALTER TABLE data_points ADD COLUMN hierarchy_node_id INTEGER')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_data_points_hierarchy_node ON data_points (hierarchy_node_id)')
+
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        trigger_name = f'data_points_version_{event.lower()}'
+        row = 'old' if event == 'DELETE' else 'new'
+        # Setting the derived hierarchy_node_id is not a catalog change
+        when = 'WHEN old.hierarchy_node_id IS new.hierarchy_node_id' if event == 'UPDATE' else ''
+        existing = c.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (trigger_name,)).fetchone()
+        if existing and ('catalog_changes' not in existing[0] or when not in existing[0]):
+            # Trigger from an older schema (version bump only, or no hierarchy_node_id guard): replace it
+            c.execute(f'DROP TRIGGER {trigger_name}')
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS {trigger_name} AFTER {event} ON data_points {when} BEGIN
+                        UPDATE catalog_state SET version = version + 1, updated_at = CAST(strftime('%s', 'now') AS INTEGER)
+                        WHERE id = 1;
+                        INSERT INTO catalog_changes (version, data_point_id, change)
+                        SELECT version, {row}.id, '{event.lower()}' FROM catalog_state WHERE id = 1;
+                        DELETE FROM catalog_changes
+                        WHERE version <= (SELECT version FROM catalog_state WHERE id = 1) - {CATALOG_CHANGES_KEPT};
+                     END''')
+
+    _init_search_index(c)
+    _init_year_index(c)
+    _init_facet_counts(c)
+    _init_hierarchy_closure(c, relink='hierarchy_node_id' not in data_point_columns)
+
+    # One-time migrations, tracked with PRAGMA user_version
+    schema_version = c.execute('PRAGMA user_version').fetchone()[0]
+    if schema_version < 1:
+        # Backfill the junction tables from the existing JSON columns
+        _sync_facet_links(c)
+        logging.info("Backfilled data_point_countries/data_point_domains from JSON columns")
+    c.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
     conn.commit()
     conn.close()
 
+def _init_search_index(c):
+    """
+    Create the FTS5 full-text index over title, keywords, description and
+    data_source_id, plus the triggers that keep it in step with data_points.
+    Leaves FTS_ENABLED False (LIKE fallback) if SQLite was built without FTS5.
+    """
+    global FTS_ENABLED
+    exists = c.execute("SELECT 1 FROM sqlite_master WHERE name = 'data_points_fts'").fetchone() is not None
+    try:
+        c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS data_points_fts USING fts5(
+                        title, keywords, description, data_source_id,
+                        tokenize = 'unicode61 remove_diacritics 2'
+                    )''')
+    except sqlite3.OperationalError as e:
+        logging.warning(f"FTS5 not available, search falls back to LIKE: {e}")
+        FTS_ENABLED = False
+        return
+
+    # rowid of the index row is data_points.id; title lives inside the metadata JSON
+    fts_values = '''new.id,
+                     CASE WHEN json_valid(new.metadata) THEN json_extract(new.metadata, '$.title') END,
+                     new.keywords, new.data_description, new.data_source_id'''
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS data_points_fts_insert AFTER INSERT ON data_points BEGIN
+                    INSERT INTO data_points_fts (rowid, title, keywords, description, data_source_id)
+                    VALUES ({fts_values});
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS data_points_fts_delete AFTER DELETE ON data_points BEGIN
+                    DELETE FROM data_points_fts WHERE rowid = old.id;
+                 END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS data_points_fts_update
+                    AFTER UPDATE OF metadata, keywords, data_description, data_source_id ON data_points BEGIN
+                    DELETE FROM data_points_fts WHERE rowid = old.id;
+                    INSERT INTO data_points_fts (rowid, title, keywords, description, data_source_id)
+                    VALUES ({fts_values});
+                 END''')
+
+    if not exists:
+        # Index was just created: fill it from the rows already in the catalog
+        c.execute('''INSERT INTO data_points_fts (rowid, title, keywords, description, data_source_id)
+                     SELECT id, CASE WHEN json_valid(metadata) THEN json_extract(metadata, '$.title') END,
+                            keywords, data_description, data_source_id
+                     FROM data_points''')
+        logging.info("Built data_points_fts full-text index")
+    FTS_ENABLED = True
+
+def _year_interval_exprs(row=None):
+    """
+    SQL for the (first, last) year of a data_points row, with NULL bounds
+    open-ended. R*Tree rejects min > max, so a reversed range is taken the
+    right way round.
+    """
+    prefix = f'{row}.' if row else ''
+    start = f'COALESCE({prefix}year_start, {YEAR_OPEN_START})'
+    end = f'COALESCE({prefix}year_end, {YEAR_OPEN_END})'
+    return f'MIN({start}, {end})', f'MAX({start}, {end})'
+
+def _init_year_index(c):
+    """
+    Create the R*Tree over each data point's [year_start, year_end] interval
+    (data_points_years, keyed by data_points.id) and the triggers that keep it
+    in step. A NULL bound is open-ended and stored as YEAR_OPEN_START /
+    YEAR_OPEN_END. Leaves YEAR_INDEX_ENABLED False if SQLite was built without
+    R*Tree; overlap queries then use a composite index on the year columns.
+    """
+    global YEAR_INDEX_ENABLED
+    exists = c.execute("SELECT 1 FROM sqlite_master WHERE name = 'data_points_years'").fetchone() is not None
+    try:
+        c.execute('CREATE VIRTUAL TABLE IF NOT EXISTS data_points_years USING rtree(id, min_year, max_year)')
+    except sqlite3.OperationalError as e:
+        logging.warning(f"R*Tree not available, year filters use a composite index: {e}")
+        # Expressions must match _year_overlap_clause for the index to be used
+        c.execute(f"CREATE INDEX IF NOT EXISTS idx_data_points_years ON data_points ({', '.join(_year_interval_exprs())})")
+        YEAR_INDEX_ENABLED = False
+        return
+
+    def interval(row):
+        return ', '.join(_year_interval_exprs(row))
+
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS data_points_years_insert AFTER INSERT ON data_points BEGIN
+                    INSERT INTO data_points_years (id, min_year, max_year) VALUES (new.id, {interval('new')});
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS data_points_years_delete AFTER DELETE ON data_points BEGIN
+                    DELETE FROM data_points_years WHERE id = old.id;
+                 END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS data_points_years_update
+                    AFTER UPDATE OF year_start, year_end ON data_points BEGIN
+                    DELETE FROM data_points_years WHERE id = old.id;
+                    INSERT INTO data_points_years (id, min_year, max_year) VALUES (new.id, {interval('new')});
+                 END''')
+
+    if not exists:
+        # Index was just created: fill it from the rows already in the catalog
+        c.execute(f'''INSERT INTO data_points_years (id, min_year, max_year)
+                      SELECT id, {interval('data_points')} FROM data_points''')
+        logging.info("Built data_points_years interval index")
+    YEAR_INDEX_ENABLED = True
+
+_FACET_JSON_COLUMNS = {'country': 'countries', 'domain': 'domains'}
+
+def _facet_value_expr(row, facet):
+    """
+    SQL expression for one facet of a data_points row ('new', 'old' or a table alias):
+    the JSON list for country/domain, the hierarchy path (NULL if incomplete) otherwise.
+    """
+    if facet in _FACET_JSON_COLUMNS:
+        column = _FACET_JSON_COLUMNS[facet]
+        return f"CASE WHEN json_valid({row}.{column}) THEN {row}.{column} ELSE '[]' END"
+    depth = HIERARCHY_FACETS.index(facet) + 1
+    # NULL anywhere on the path makes the concatenation NULL, which is skipped
+    return f" || '{FACET_PATH_SEPARATOR}' || ".join(f"{row}.{level}" for level in HIERARCHY_FACETS[:depth])
+
+def _facet_values_select(row, facet):
+    """SELECT yielding the distinct values one trigger row has for a facet"""
+    if facet in _FACET_JSON_COLUMNS:
+        return f"SELECT DISTINCT value FROM json_each({_facet_value_expr(row, facet)})"
+    return f"SELECT value FROM (SELECT {_facet_value_expr(row, facet)} AS value) WHERE value IS NOT NULL"
+
+def _init_facet_counts(c):
+    """
+    Create facet_counts (resources per country, domain and hierarchy path)
+    and the triggers that keep it current on every data_points write.
+    """
+    exists = c.execute("SELECT 1 FROM sqlite_master WHERE name = 'facet_counts'").fetchone() is not None
+    c.execute('''CREATE TABLE IF NOT EXISTS facet_counts (
+                    facet TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (facet, value)
+                ) WITHOUT ROWID''')
+
+    def increment(row):
+        return "\n".join(f"""INSERT INTO facet_counts (facet, value, count)
+                             SELECT '{facet}', value, 1 FROM ({_facet_values_select(row, facet)}) WHERE true
+                             ON CONFLICT (facet, value) DO UPDATE SET count = count + 1;"""
+                         for facet in FACETS)
+
+    def decrement(row):
+        return "\n".join(f"""UPDATE facet_counts SET count = count - 1
+                             WHERE facet = '{facet}' AND value IN ({_facet_values_select(row, facet)});"""
+                         for facet in FACETS) + \
+            "\nDELETE FROM facet_counts WHERE count <= 0;"
+
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS data_points_facets_insert AFTER INSERT ON data_points BEGIN
+                    {increment('new')}
+                 END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS data_points_facets_delete AFTER DELETE ON data_points BEGIN
+                    {decrement('old')}
+                 END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS data_points_facets_update
+                    AFTER UPDATE OF countries, domains, {', '.join(HIERARCHY_FACETS)} ON data_points BEGIN
+                    {decrement('old')}
+                    {increment('new')}
+                 END''')
+
+    if not exists:
+        _rebuild_facet_counts(c)
+        logging.info("Built facet_counts from existing data points")
+
+def _rebuild_facet_counts(c):
+    """Recount every facet from data_points (on the caller's cursor/transaction)"""
+    c.execute('DELETE FROM facet_counts')
+    for facet in FACETS:
+        if facet in _FACET_JSON_COLUMNS:
+            c.execute(f'''INSERT INTO facet_counts (facet, value, count)
+                          SELECT '{facet}', j.value, COUNT(DISTINCT d.id)
+                          FROM data_points d, json_each({_facet_value_expr('d', facet)}) j
+                          GROUP BY j.value''')
+        else:
+            c.execute(f'''INSERT INTO facet_counts (facet, value, count)
+                          SELECT '{facet}', {_facet_value_expr('d', facet)} AS value, COUNT(*)
+                          FROM data_points d WHERE value IS NOT NULL
+                          GROUP BY value''')
+
+def _sync_facet_links(c, data_point_ids=None):
+    """
+    Rebuild the country/domain junction rows from the JSON columns of data_points.
+    Pass a list of data_points.id values, or None to rebuild every row.
+    Runs on the caller's cursor so it shares the caller's transaction.
+    """
+    for table, column, json_column in (('data_point_countries', 'country', 'countries'),
+                                       ('data_point_domains', 'domain', 'domains')):
+        if data_point_ids is None:
+            c.execute(f'DELETE FROM {table}')
+            c.execute(f'''INSERT OR IGNORE INTO {table} ({column}, data_point_id)
+                          SELECT j.value, d.id FROM data_points d, json_each(d.{json_column}) j
+                          WHERE json_valid(d.{json_column})''')
+        else:
+            ids = [(data_point_id,) for data_point_id in data_point_ids]
+            c.executemany(f'DELETE FROM {table} WHERE data_point_id = ?', ids)
+            c.executemany(f'''INSERT OR IGNORE INTO {table} ({column}, data_point_id)
+                              SELECT j.value, d.id FROM data_points d, json_each(d.{json_column}) j
+                              WHERE d.id = ? AND json_valid(d.{json_column})''', ids)
+
+def _hierarchy_paths(hierarchy):
+    """
+    (path, level, name, parent path) for every node of the resource type
+    hierarchy, parents first. Paths join the YAML keys with FACET_PATH_SEPARATOR
+    (e.g. 'Data/omics_data'), the same values data_points stores per level.
+    """
+    nodes = []
+
+    def walk(level_data, parent_path, level):
+        if level > len(HIERARCHY_FACETS) or not isinstance(level_data, dict):
+            return
+        for key, details in level_data.items():
+            if key in ('level', 'title') or not isinstance(details, dict):
+                continue
+            path = f"{parent_path}{FACET_PATH_SEPARATOR}{key}" if parent_path else key
+            nodes.append((path, level, key, parent_path))
+            walk(details.get('sub_categories'), path, level + 1)
+            if isinstance(details.get('items'), list) and level < len(HIERARCHY_FACETS):
+                for item in details['items']:
+                    name = item if isinstance(item, str) else (item or {}).get('name')
+                    if name:
+                        nodes.append((f"{path}{FACET_PATH_SEPARATOR}{name}", level + 1, name, path))
+
+    walk(hierarchy, None, 1)
+    return list(dict.fromkeys(nodes)) # A YAML list may repeat an item
+
+def _hierarchy_node_expr(row):
+    """SQL for the id of the deepest hierarchy node on a data_points row's path (its longest known prefix)"""
+    lookups = [f"(SELECT id FROM hierarchy_nodes WHERE path = {_facet_value_expr(row, facet)})"
+               for facet in reversed(HIERARCHY_FACETS)]
+    return f"COALESCE({', '.join(lookups)})"
+
+def _init_hierarchy_closure(c, relink=False):
+    """
+    Load the resource type hierarchy from structure_tree.yaml into
+    hierarchy_nodes and its closure table (every ancestor/descendant pair,
+    each node also with itself at depth 0), and keep
+    data_points.hierarchy_node_id pointing at each row's deepest node.
+    Node ids are stable across restarts; data points are re-linked only
+    when the vocabulary changed (or relink is set).
+    """
+    c.execute('''CREATE TABLE IF NOT EXISTS hierarchy_nodes (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT NOT NULL UNIQUE,          -- e.g. 'Data/omics_data' (FACET_PATH_SEPARATOR)
+                    level INTEGER NOT NULL,             -- 1-5
+                    name TEXT NOT NULL,                 -- Key in structure_tree.yaml
+                    parent_id INTEGER REFERENCES hierarchy_nodes(id)
+                )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS hierarchy_closure (
+                    ancestor_id INTEGER NOT NULL,
+                    descendant_id INTEGER NOT NULL,
+                    depth INTEGER NOT NULL,             -- 0 for the node itself
+                    PRIMARY KEY (ancestor_id, descendant_id)
+                ) WITHOUT ROWID''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_hierarchy_closure_descendant ON hierarchy_closure (descendant_id, ancestor_id)')
+
+    node_expr = _hierarchy_node_expr('new')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS data_points_hierarchy_insert AFTER INSERT ON data_points BEGIN
+                    UPDATE data_points SET hierarchy_node_id = {node_expr}
+                    WHERE id = new.id AND hierarchy_node_id IS NOT {node_expr};
+                 END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS data_points_hierarchy_update
+                    AFTER UPDATE OF {', '.join(HIERARCHY_FACETS)} ON data_points BEGIN
+                    UPDATE data_points SET hierarchy_node_id = {node_expr}
+                    WHERE id = new.id AND hierarchy_node_id IS NOT {node_expr};
+                 END''')
+
+    wanted = _hierarchy_paths(get_resource_type_hierarchy())
+    if not wanted:
+        return # Vocabulary missing: keep what is stored
+    stored = {tuple(row) for row in c.execute('''SELECT n.path, n.level, n.name, p.path FROM hierarchy_nodes n
+                                                 LEFT JOIN hierarchy_nodes p ON p.id = n.parent_id''')}
+    if stored != set(wanted):
+        wanted_paths = [path for path, _, _, _ in wanted]
+        c.execute(f"DELETE FROM hierarchy_nodes WHERE path NOT IN ({','.join('?' for _ in wanted_paths)})", wanted_paths)
+        for path, level, name, parent in wanted: # Parents come first
+            c.execute('''INSERT INTO hierarchy_nodes (path, level, name, parent_id)
+                         VALUES (?, ?, ?, (SELECT id FROM hierarchy_nodes WHERE path = ?))
+                         ON CONFLICT (path) DO UPDATE SET level = excluded.level, name = excluded.name,
+                                                         parent_id = excluded.parent_id''',
+                      (path, level, name, parent))
+        c.execute('DELETE FROM hierarchy_closure')
+        c.execute('''WITH RECURSIVE closure (ancestor_id, descendant_id, depth) AS (
+                         SELECT id, id, 0 FROM hierarchy_nodes
+                         UNION ALL
+                         SELECT closure.ancestor_id, n.id, closure.depth + 1
+                         FROM closure JOIN hierarchy_nodes n ON n.parent_id = closure.descendant_id
+                     )
+                     INSERT INTO hierarchy_closure (ancestor_id, descendant_id, depth)
+                     SELECT ancestor_id, descendant_id, depth FROM closure''')
+        logging.info(f"Loaded {len(wanted)} hierarchy nodes and their closure from structure_tree.yaml")
+        relink = True
+
+    if relink:
+        # Not a catalog change: the data_points_version_update trigger skips hierarchy_node_id-only updates
+        expr = _hierarchy_node_expr('data_points')
+        c.execute(f'UPDATE data_points SET hierarchy_node_id = {expr} WHERE hierarchy_node_id IS NOT {expr}')
+
 # Comment out or remove the entire function below
 # def load_initial_data():
 #     """Load initial data from SQL file if database is empty"""
@@ -113,10 +670,10 @@ def init_db():
 #             print("Error: init_data.sql not found.")
 #     conn.close()
 
-def generate_data_source_id(data):
+def _base_data_source_id(data):
     """
-    Generate a unique ID based on the data fields.
-    Format: {L2_PREFIX}-{INSTITUTION}-{YEAR}[-{COUNTER}]
+    Build the base ID (without counter) from the data fields.
+    Format: {L2_PREFIX}-{INSTITUTION}-{YEAR}
     Example: OMIC-NIPH-2023
     """
     # Extract Level 2 prefix (first 4 letters uppercase)
@@ -137,35 +694,66 @@ def generate_data_source_id(data):
     except (json.JSONDecodeError, TypeError):
         pass # Keep UNKNOWN if metadata is invalid or missing
 
-    # Generate base ID
-    base_id = f"{category_prefix}-{institution}-{year}"
-    data_source_id = base_id
+    return f"{category_prefix}-{institution}-{year}"
 
-    # Check if ID exists, append number if needed
-    conn = get_db()
-    c = conn.cursor()
-    counter = 1
-    while True:
-        c.execute('SELECT 1 FROM data_points WHERE data_source_id = ?', (data_source_id,))
-        if not c.fetchone():
-            break
-        data_source_id = f"{base_id}-{counter}"
-        counter += 1
-    
-    conn.close()
-    return data_source_id
+def _allocate_data_source_ids(c, base_id, count=1):
+    """
+    Reserve `count` consecutive IDs for base_id from data_source_id_counters.
+    Suffix 0 is the bare base ID, then base-1, base-2, ... (same scheme as before).
+    Must run inside the caller's write transaction (BEGIN IMMEDIATE) so that
+    concurrent workers serialize on the counter row.
+    """
+    row = c.execute('SELECT last_suffix FROM data_source_id_counters WHERE base_id = ?', (base_id,)).fetchone()
+    if row is not None:
+        last_suffix = row[0]
+    else:
+        # First allocation for this base since the counter table existed:
+        # seed it from the IDs already in the catalog (one indexed range scan)
+        last_suffix = -1
+        c.execute('''SELECT data_source_id FROM data_points
+                     WHERE data_source_id = ? OR (data_source_id > ? AND data_source_id < ?)''',
+                  (base_id, f"{base_id}-", f"{base_id}."))
+        for (existing_id,) in c.fetchall():
+            if existing_id == base_id:
+                last_suffix = max(last_suffix, 0)
+            else:
+                suffix = existing_id[len(base_id) + 1:]
+                if suffix.isdigit():
+                    last_suffix = max(last_suffix, int(suffix))
+
+    first_suffix = last_suffix + 1
+    last_suffix += count
+    c.execute('''INSERT INTO data_source_id_counters (base_id, last_suffix) VALUES (?, ?)
+                 ON CONFLICT (base_id) DO UPDATE SET last_suffix = excluded.last_suffix''',
+              (base_id, last_suffix))
+    return [base_id if suffix == 0 else f"{base_id}-{suffix}"
+            for suffix in range(first_suffix, last_suffix + 1)]
+
+def generate_data_source_id(data, c):
+    """
+    Generate a unique ID based on the data fields.
+    Format: {L2_PREFIX}-{INSTITUTION}-{YEAR}[-{COUNTER}]
+    Example: OMIC-NIPH-2023
+    Allocated from the per-base counter table on the caller's cursor, so the
+    ID is reserved in the same transaction as the INSERT that uses it.
+    """
+    return _allocate_data_source_ids(c, _base_data_source_id(data))[0]
 
-def check_duplicate_entry(data):
+def check_duplicate_entry(data, c=None):
     """
     Check if a similar entry already exists based on key fields.
     Using repository_url as a strong indicator of duplication.
     Returns False if repository_url is None or empty.
+    Pass a cursor to run the check inside an open transaction.
     """
     # Indices adjusted for assumed data tuple order: repository_url is index 11
     repository_url = data[11]
     if not repository_url:
         return False # Cannot check for duplicates without a URL
 
+    if c is not None:
+        return c.execute('SELECT 1 FROM data_points WHERE repository_url = ?', (repository_url,)).fetchone() is not None
+
     conn = get_db()
     c = conn.cursor()
     c.execute('SELECT 1 FROM data_points WHERE repository_url = ?', (repository_url,))
@@ -173,32 +761,17 @@ def check_duplicate_entry(data):
     conn.close()
     return exists
 
-def add_data_point(data):
-    """Add a new data point with auto-generated ID and year range"""
-    # The input 'data' tuple structure is assumed to be:
-    # (None, resource_type, category, subcategory, data_type, level5, year_start, year_end, data_format,
-    #  data_resolution, repository, repository_url, data_description, keywords,
-    #  last_updated, contact_information, metadata, countries_json, domains_json)
-    # Indices:   1           2          3            4          5        6           7          8
-    #            9              10          11             12                 13
-    #            14             15                  16         17             18
-
-    # <<< Call check_duplicate_entry which now handles None URL >>>
-    if check_duplicate_entry(data):
-        logging.warning(f"Duplicate entry detected based on repository_url: {data[11]}")
-        return None
-
-    # Generate unique ID (using same logic, doesn't depend on country/domain)
-    # Pass relevant parts for ID generation
-    id_gen_data = (
+def _id_gen_data(data):
+    """Pick the fields generate_data_source_id needs out of an add_data_point tuple"""
+    return (
         None, None, data[2], None, None, None, None, data[7], None, None, None, None, None,
         data[14], None, data[16] # category (2), year_end (7), last_updated (14), metadata (16)
     )
-    data_source_id = generate_data_source_id(id_gen_data)
 
-    # Create new data tuple matching the table columns
+def _data_point_row(data_source_id, data):
+    """Create the data tuple matching the INSERT_DATA_POINT_SQL columns"""
     # Ensure None is used for potentially missing values passed from approve_submission
-    new_data = (
+    return (
         data_source_id,
         data[1],  # resource_type (required)
         data[2] or None,  # category
@@ -220,16 +793,44 @@ def add_data_point(data):
         data[18]  # domains_json (required)
     )
 
+# Updated INSERT statement to match the refined column list and order
+INSERT_DATA_POINT_SQL = '''INSERT INTO data_points (
+                data_source_id, resource_type, category, subcategory, data_type, level5,
+                year_start, year_end, data_format, data_resolution, repository, repository_url,
+                data_description, keywords, last_updated, contact_information, metadata,
+                countries, domains
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+
+def add_data_point(data):
+    """Add a new data point with auto-generated ID and year range"""
+    # The input 'data' tuple structure is assumed to be:
+    # (None, resource_type, category, subcategory, data_type, level5, year_start, year_end, data_format,
+    #  data_resolution, repository, repository_url, data_description, keywords,
+    #  last_updated, contact_information, metadata, countries_json, domains_json)
+    # Indices:   1           2          3            4          5        6           7          8
+    #            9              10          11             12                 13
+    #            14             15                  16         17             18
+
     conn = get_db()
     c = conn.cursor()
+    data_source_id = None
     try:
-        # Updated INSERT statement to match the refined column list and order
-        c.execute('''INSERT INTO data_points (
-                        data_source_id, resource_type, category, subcategory, data_type, level5,
-                        year_start, year_end, data_format, data_resolution, repository, repository_url,
-                        data_description, keywords, last_updated, contact_information, metadata,
-                        countries, domains
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', new_data)
+        # Take the write lock up front: duplicate check, ID allocation and INSERT
+        # happen in one transaction, so concurrent approvals cannot collide
+        c.execute('BEGIN IMMEDIATE')
+
+        # <<< Call check_duplicate_entry which now handles None URL >>>
+        if check_duplicate_entry(data, c):
+            logging.warning(f"Duplicate entry detected based on repository_url: {data[11]}")
+            conn.rollback()
+            return None
+
+        # Generate unique ID (using same logic, doesn't depend on country/domain)
+        data_source_id = generate_data_source_id(_id_gen_data(data), c)
+        new_data = _data_point_row(data_source_id, data)
+
+        c.execute(INSERT_DATA_POINT_SQL, new_data)
+        _sync_facet_links(c, [c.lastrowid])
         conn.commit()
         logging.info(f"Added data point with ID: {data_source_id}")
     except sqlite3.IntegrityError as e:
@@ -245,6 +846,160 @@ def add_data_point(data):
 
     return data_source_id
 
+def _insert_data_point_chunk(c, chunk):
+    """
+    Insert a list of add_data_point tuples in one write transaction.
+    IDs are reserved per base ID in one counter update each, rows go in with
+    executemany, and the junction tables are filled for the new rowids.
+    Returns the allocated data_source_ids in input order.
+    """
+    c.execute('BEGIN IMMEDIATE')
+    base_ids = [_base_data_source_id(_id_gen_data(data)) for data in chunk]
+    allocated = {}
+    for base_id in dict.fromkeys(base_ids):
+        allocated[base_id] = iter(_allocate_data_source_ids(c, base_id, base_ids.count(base_id)))
+    data_source_ids = [next(allocated[base_id]) for base_id in base_ids]
+
+    # AUTOINCREMENT ids only grow, and we hold the write lock, so the new
+    # rows are exactly the ones above the current maximum
+    previous_max_id = c.execute('SELECT COALESCE(MAX(id), 0) FROM data_points').fetchone()[0]
+    c.executemany(INSERT_DATA_POINT_SQL, [_data_point_row(data_source_id, data)
+                                          for data_source_id, data in zip(data_source_ids, chunk)])
+    new_ids = [row[0] for row in c.execute('SELECT id FROM data_points WHERE id > ?', (previous_max_id,))]
+    _sync_facet_links(c, new_ids)
+    return data_source_ids
+
+def bulk_add_data_points(data_points, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Add many data points at once.
+    'data_points' is any iterable of the same tuples add_data_point takes.
+    Rows whose repository_url already exists (in the catalog or earlier in the
+    input) are skipped; the rest are inserted in transactions of chunk_size rows.
+    Returns a summary dict: inserted, duplicates, failed, data_source_ids.
+    """
+    summary = {'inserted': 0, 'duplicates': 0, 'failed': 0, 'data_source_ids': []}
+    conn = get_db()
+    c = conn.cursor()
+    started = time.monotonic()
+
+    def flush(chunk):
+        try:
+            summary['data_source_ids'].extend(_insert_data_point_chunk(c, chunk))
+            conn.commit()
+            summary['inserted'] += len(chunk)
+        except sqlite3.Error as e:
+            logging.error(f"Bulk insert of {len(chunk)} rows failed, chunk rolled back: {e}")
+            conn.rollback()
+            summary['failed'] += len(chunk)
+        elapsed = time.monotonic() - started
+        rate = summary['inserted'] / elapsed if elapsed > 0 else 0
+        logging.info(f"Bulk insert: {summary['inserted']} rows added ({rate:.0f} rows/s)")
+
+    try:
+        # Dedupe on repository_url in memory instead of one SELECT per row
+        c.execute('SELECT repository_url FROM data_points WHERE repository_url IS NOT NULL')
+        known_urls = {row[0] for row in c.fetchall()}
+
+        chunk = []
+        for data in data_points:
+            repository_url = data[11]
+            if repository_url:
+                if repository_url in known_urls:
+                    summary['duplicates'] += 1
+                    continue
+                known_urls.add(repository_url)
+            chunk.append(data)
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunk = []
+        if chunk:
+            flush(chunk)
+    finally:
+        conn.close()
+
+    if summary['duplicates']:
+        logging.warning(f"Bulk insert skipped {summary['duplicates']} duplicate repository_url rows")
+    return summary
+
+def moderate_pending_submissions(approvals=(), rejections=(), rejected_status='rejected'):
+    """
+    Approve and reject many pending submissions in one write transaction.
+    'approvals' is a list of (submission_id, add_data_point tuple) pairs;
+    approved rows are inserted into data_points and their submissions deleted.
+    'rejections' is a list of submission_ids whose status is set to rejected_status.
+    Only submissions still in status 'pending' are changed; others are reported
+    as 'not_pending'. Each item runs under its own savepoint, so one bad item
+    does not undo the rest.
+    Returns one result dict per item, in input order:
+    {'submission_id', 'action', 'status' ('approved', 'rejected', 'duplicate',
+     'not_found', 'not_pending', 'error'), 'data_source_id', 'message'}.
+    """
+    def not_moderated(submission_id, result):
+        # Nothing changed: say whether the submission is gone or was already moderated
+        row = c.execute('SELECT status FROM pending_submissions WHERE submission_id = ?', (submission_id,)).fetchone()
+        if row is None:
+            result['status'] = 'not_found'
+        else:
+            result['status'] = 'not_pending'
+            result['message'] = f"already {row[0]}"
+
+    results = []
+    conn = get_db()
+    c = conn.cursor()
+    try:
+        c.execute('BEGIN IMMEDIATE')
+        seen_urls = set()
+        for submission_id, data in approvals:
+            result = {'submission_id': submission_id, 'action': 'approve', 'status': 'approved',
+                      'data_source_id': None, 'message': None}
+            results.append(result)
+            repository_url = data[11]
+            if repository_url and (repository_url in seen_urls or check_duplicate_entry(data, c)):
+                result['status'] = 'duplicate'
+                result['message'] = f"repository_url already in the catalog: {repository_url}"
+                continue
+            c.execute('SAVEPOINT moderate_item')
+            try:
+                c.execute("DELETE FROM pending_submissions WHERE submission_id = ? AND status = 'pending'", (submission_id,))
+                if c.rowcount == 0:
+                    c.execute('RELEASE moderate_item')
+                    not_moderated(submission_id, result)
+                    continue
+                data_source_id = generate_data_source_id(_id_gen_data(data), c)
+                c.execute(INSERT_DATA_POINT_SQL, _data_point_row(data_source_id, data))
+                _sync_facet_links(c, [c.lastrowid])
+                c.execute('RELEASE moderate_item')
+            except sqlite3.Error as e:
+                c.execute('ROLLBACK TO moderate_item')
+                c.execute('RELEASE moderate_item')
+                result['status'] = 'error'
+                result['message'] = str(e)
+                continue
+            if repository_url:
+                seen_urls.add(repository_url)
+            result['data_source_id'] = data_source_id
+
+        for submission_id in rejections:
+            result = {'submission_id': submission_id, 'action': 'reject', 'status': 'rejected',
+                      'data_source_id': None, 'message': None}
+            results.append(result)
+            c.execute("UPDATE pending_submissions SET status = ? WHERE submission_id = ? AND status = 'pending'",
+                      (rejected_status, submission_id))
+            if c.rowcount == 0:
+                not_moderated(submission_id, result)
+        conn.commit()
+    except sqlite3.Error as e:
+        logging.error(f"Batch moderation failed, rolled back: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    approved = sum(1 for result in results if result['status'] == 'approved')
+    rejected = sum(1 for result in results if result['status'] == 'rejected')
+    logging.info(f"Batch moderation: {approved} approved, {rejected} rejected, {len(results) - approved - rejected} skipped")
+    return results
+
 def get_all_data_points():
     conn = get_db()
     c = conn.cursor()
@@ -269,6 +1024,343 @@ def get_all_data_points():
     
     return result
 
+def encode_cursor(values):
+    """Opaque, URL-safe continuation token for keyset pagination"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(token, length=None):
+    """
+    Inverse of encode_cursor; returns None for a missing or malformed token.
+    Only lists of str/int/float/None are accepted (they are bound as SQL
+    parameters), and of exactly 'length' values if given.
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or (length is not None and len(values) != length):
+        return None
+    if any(isinstance(value, bool) or not isinstance(value, (str, int, float, type(None))) for value in values):
+        return None
+    return values
+
+def get_data_points_page(limit=50, after=None, before=None, sort='created_at', descending=True,
+                         search=None, resource_type=None, country=None, domain=None):
+    """
+    One page of approved resources using keyset pagination on (sort column, id).
+    'after' / 'before' are cursors from a previous page's next_cursor / prev_cursor.
+    Filtering (search text, resource type, country, domain) and sorting run in SQL,
+    so the cost of a page does not depend on the size of the catalog.
+    Returns {'ids': [data_points.id, ...], 'next_cursor': str|None, 'prev_cursor': str|None};
+    callers decode the rows through resource_cache.
+    """
+    if sort not in PAGE_SORT_COLUMNS:
+        sort = 'created_at'
+    limit = max(1, min(int(limit), 500))
+
+    where = []
+    params = []
+    if search:
+        match_query = _fts_prefix_query(search) if FTS_ENABLED else None
+        if match_query:
+            where.append('id IN (SELECT rowid FROM data_points_fts WHERE data_points_fts MATCH ?)')
+            params.append(match_query)
+        else:
+            where.append("(data_source_id LIKE ? OR json_extract(metadata, '$.title') LIKE ?)")
+            params.extend([f'%{search}%'] * 2)
+    if resource_type:
+        where.append('resource_type = ?')
+        params.append(resource_type)
+    if country:
+        where.append('id IN (SELECT data_point_id FROM data_point_countries WHERE country = ?)')
+        params.append(country)
+    if domain:
+        where.append('id IN (SELECT data_point_id FROM data_point_domains WHERE domain = ?)')
+        params.append(domain)
+
+    # Walking backwards (prev page) flips both the comparison and the scan order
+    cursor_values = decode_cursor(before, length=2)
+    backwards = cursor_values is not None
+    if not backwards:
+        cursor_values = decode_cursor(after, length=2)
+    scan_descending = descending != backwards
+    if cursor_values:
+        where.append(f"({sort}, id) {'<' if scan_descending else '>'} (?, ?)")
+        params.extend(cursor_values)
+
+    direction = 'DESC' if scan_descending else 'ASC'
+    query = f'SELECT id, {sort} FROM data_points'
+    if where:
+        query += ' WHERE ' + ' AND '.join(where)
+    query += f' ORDER BY {sort} {direction}, id {direction} LIMIT ?'
+    params.append(limit + 1) # One extra row tells us whether another page exists
+
+    conn = get_db()
+    c = conn.cursor()
+    c.execute(query, params)
+    rows = c.fetchall()
+    conn.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+
+    next_cursor = prev_cursor = None
+    if rows:
+        first_key = encode_cursor([rows[0][sort], rows[0]['id']])
+        last_key = encode_cursor([rows[-1][sort], rows[-1]['id']])
+        # Forward scans know about the next page; a page reached by cursor always has a previous one
+        if backwards:
+            next_cursor = last_key
+            prev_cursor = first_key if has_more else None
+        else:
+            next_cursor = last_key if has_more else None
+            prev_cursor = first_key if cursor_values else None
+    return {'ids': [row['id'] for row in rows], 'next_cursor': next_cursor, 'prev_cursor': prev_cursor}
+
+def _fts_prefix_query(search_term):
+    """Turn free text into an FTS5 query that prefix-matches every word, e.g. 'metag swe' -> '"metag"* "swe"*'"""
+    words = re.findall(r'\w+', search_term)
+    return ' '.join(f'"{word}"*' for word in words)
+
+def search_data_points(search_term, limit=15, year_from=None, year_to=None):
+    """
+    Full-text search for the resource pickers.
+    Returns rows with id, data_source_id and a snippet (plain text,
+    matches between SNIPPET_MATCH_START and SNIPPET_MATCH_END), best BM25
+    match first (title and ID weigh more than description).
+    year_from / year_to keep only resources whose years overlap that range
+    (see _year_overlap_clause).
+    """
+    conn = get_db()
+    c = conn.cursor()
+    year_condition, year_params = ('1', [])
+    if year_from is not None or year_to is not None:
+        year_condition, year_params = _year_overlap_clause('d', year_from, year_to)
+    try:
+        match_query = _fts_prefix_query(search_term) if FTS_ENABLED else None
+        if match_query:
+            c.execute(f'''SELECT d.id, d.data_source_id,
+                                 snippet(data_points_fts, -1, ?, ?, '…', 12) AS snippet
+                          FROM data_points_fts
+                          JOIN data_points d ON d.id = data_points_fts.rowid
+                          WHERE data_points_fts MATCH ? AND {year_condition}
+                          ORDER BY bm25(data_points_fts, 10.0, 5.0, 1.0, 8.0)
+                          LIMIT ?''', [SNIPPET_MATCH_START, SNIPPET_MATCH_END, match_query, *year_params, limit])
+        elif not FTS_ENABLED:
+            # No FTS5 in this SQLite build: fall back to substring matching
+            search_pattern = f"%{search_term}%"
+            c.execute(f'''SELECT d.id, d.data_source_id, NULL AS snippet
+                          FROM data_points d
+                          WHERE (d.data_source_id LIKE ?
+                                 OR d.keywords LIKE ?
+                                 OR d.data_description LIKE ?
+                                 OR json_extract(d.metadata, '$.title') LIKE ?)
+                            AND {year_condition}
+                          ORDER BY d.last_updated DESC
+                          LIMIT ?''', [search_pattern, search_pattern, search_pattern, search_pattern, *year_params, limit])
+        else:
+            return [] # Nothing searchable in the term (only punctuation)
+        return [dict(row) for row in c.fetchall()]
+    except sqlite3.Error as e:
+        logging.error(f"Error searching resources: {e}")
+        return []
+    finally:
+        conn.close()
+
+def get_facet_counts(facets=None):
+    """
+    Resource counts per facet value from facet_counts, e.g.
+    {'country': {'Sweden': 12, ...}, 'category': {'Data/omics_data': 7, ...}, ...}.
+    Hierarchy values are paths joined with FACET_PATH_SEPARATOR.
+    """
+    facets = [facet for facet in (facets or FACETS) if facet in FACETS]
+    counts = {facet: {} for facet in facets}
+    if not facets:
+        return counts
+    conn = get_db()
+    c = conn.cursor()
+    placeholders = ','.join('?' for _ in facets)
+    c.execute(f'SELECT facet, value, count FROM facet_counts WHERE facet IN ({placeholders})', facets)
+    for facet, value, count in c.fetchall():
+        counts[facet][value] = count
+    conn.close()
+    return counts
+
+def _year_overlap_clause(alias, year_from, year_to):
+    """
+    SQL condition, with its parameters, for the data_points rows (as alias)
+    whose years overlap [year_from, year_to]. A None bound is unbounded; a
+    resource's NULL year_start / year_end is open-ended, and a reversed range
+    counts as if its years were swapped (as stored in data_points_years).
+    """
+    low = YEAR_OPEN_START if year_from is None else year_from
+    high = YEAR_OPEN_END if year_to is None else year_to
+    if YEAR_INDEX_ENABLED:
+        return f'{alias}.id IN (SELECT id FROM data_points_years WHERE max_year >= ? AND min_year <= ?)', [low, high]
+    first, last = _year_interval_exprs(alias)
+    return f'{last} >= ? AND {first} <= ?', [low, high]
+
+def get_year_overlap_ids(year_from=None, year_to=None):
+    """Ids (ascending) of the data points whose years overlap [year_from, year_to] (see _year_overlap_clause)"""
+    conn = get_db()
+    c = conn.cursor()
+    condition, params = _year_overlap_clause('d', year_from, year_to)
+    c.execute(f'SELECT d.id FROM data_points d WHERE {condition} ORDER BY d.id', params)
+    ids = [row[0] for row in c.fetchall()]
+    conn.close()
+    return ids
+
+def get_year_coverage(year_from=None, year_to=None):
+    """
+    Number of resources covering each year of [year_from, year_to], from the
+    year interval index: the count for a year is what a filter on that single
+    year returns, so open-ended resources count towards every year on their
+    open side. Missing bounds default to the earliest / latest year stored;
+    the span is capped at YEAR_COVERAGE_MAX_YEARS (keeping the latest years).
+    Returns {'year_from', 'year_to', 'counts': [...], 'undated'}, undated being
+    the resources with neither year (included in every count).
+    """
+    conn = get_db()
+    c = conn.cursor()
+    if YEAR_INDEX_ENABLED:
+        c.execute('SELECT min_year, max_year FROM data_points_years WHERE max_year >= ? AND min_year <= ?',
+                  (YEAR_OPEN_START if year_from is None else year_from, YEAR_OPEN_END if year_to is None else year_to))
+        intervals = [(int(low), int(high)) for low, high in c.fetchall()]
+    else:
+        condition, params = _year_overlap_clause('d', year_from, year_to)
+        c.execute(f'SELECT year_start, year_end FROM data_points d WHERE {condition}', params)
+        intervals = []
+        for start, end in c.fetchall():
+            start = YEAR_OPEN_START if start is None else start
+            end = YEAR_OPEN_END if end is None else end
+            intervals.append((min(start, end), max(start, end)))
+    conn.close()
+
+    undated = sum(1 for low, high in intervals if low == YEAR_OPEN_START and high == YEAR_OPEN_END)
+    if year_from is None or year_to is None:
+        known = [year for interval in intervals for year in interval if year not in (YEAR_OPEN_START, YEAR_OPEN_END)]
+        if not known:
+            return {'year_from': year_from, 'year_to': year_to, 'counts': [], 'undated': undated}
+        year_from = min(known) if year_from is None else year_from
+        year_to = max(known) if year_to is None else year_to
+    year_from = max(year_from, year_to - YEAR_COVERAGE_MAX_YEARS + 1)
+    if year_from > year_to:
+        return {'year_from': year_from, 'year_to': year_to, 'counts': [], 'undated': undated}
+
+    # +1 where an interval enters the window, -1 after it leaves; running sum = coverage per year
+    span = year_to - year_from + 1
+    steps = [0] * (span + 1)
+    for low, high in intervals:
+        if high < year_from or low > year_to:
+            continue
+        steps[max(low, year_from) - year_from] += 1
+        steps[min(high, year_to) - year_from + 1] -= 1
+    counts = list(itertools.accumulate(steps[:span]))
+    return {'year_from': year_from, 'year_to': year_to, 'counts': counts, 'undated': undated}
+
+def get_subtree_data_point_ids(path):
+    """
+    Ids (ascending) of the data points at or below a hierarchy node, given by
+    its path at any level 1-5 (e.g. 'Data/omics_data'), in one indexed query
+    over hierarchy_closure. None if the path is not in the vocabulary.
+    """
+    conn = get_db()
+    c = conn.cursor()
+    node = c.execute('SELECT id FROM hierarchy_nodes WHERE path = ?', (path,)).fetchone()
+    if node is None:
+        conn.close()
+        return None
+    c.execute('''SELECT d.id FROM hierarchy_closure hc
+                 JOIN data_points d ON d.hierarchy_node_id = hc.descendant_id
+                 WHERE hc.ancestor_id = ?
+                 ORDER BY d.id''', (node[0],))
+    ids = [row[0] for row in c.fetchall()]
+    conn.close()
+    return ids
+
+def get_graph_positions(node_ids):
+    """Stored network graph layout of the given nodes, {node_id: (x, y)} (nodes without one are left out)"""
+    conn = get_db()
+    c = conn.cursor()
+    c.execute('SELECT node_id, x, y FROM graph_positions WHERE node_id IN (SELECT value FROM json_each(?))',
+              (json.dumps(list(node_ids)),))
+    positions = {node_id: (x, y) for node_id, x, y in c.fetchall()}
+    conn.close()
+    return positions
+
+def add_graph_positions(positions):
+    """
+    Store positions {node_id: (x, y)} of newly placed nodes. Nodes that already
+    have a stored position (placed by another worker first) keep it; returns
+    how many positions were written.
+    """
+    if not positions:
+        return 0
+    conn = get_db()
+    c = conn.cursor()
+    try:
+        c.executemany('INSERT OR IGNORE INTO graph_positions (node_id, x, y) VALUES (?, ?, ?)',
+                      [(node_id, x, y) for node_id, (x, y) in positions.items()])
+        written = c.rowcount
+        conn.commit()
+        return written
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def delete_stale_graph_positions(node_ids, version):
+    """
+    Delete the stored positions of nodes that are no longer in the graph
+    (node_ids: every node of the graph at catalog version). Nothing is deleted
+    once the catalog has moved past version, so a worker still laying out an
+    older version never drops nodes a newer one added. Returns how many were deleted.
+    """
+    conn = get_db()
+    c = conn.cursor()
+    try:
+        c.execute('''DELETE FROM graph_positions
+                     WHERE node_id NOT IN (SELECT value FROM json_each(?))
+                       AND (SELECT version FROM catalog_state WHERE id = 1) = ?''',
+                  (json.dumps(list(node_ids)), version))
+        deleted = c.rowcount
+        conn.commit()
+        return deleted
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def get_catalog_changes(since, until):
+    """
+    Changes to data_points between two catalog versions (since < version <= until),
+    as (complete, [(version, data_point_id, change), ...]) oldest first.
+    complete is False when the log no longer reaches back to 'since'
+    (pruned, or older than the log itself); the caller must then start over.
+    """
+    if since == until:
+        return True, []
+    if since > until:
+        return False, []
+    conn = get_db()
+    c = conn.cursor()
+    oldest = c.execute('SELECT MIN(version) FROM catalog_changes').fetchone()[0]
+    if oldest is None or since < oldest - 1:
+        conn.close()
+        return False, []
+    c.execute('''SELECT version, data_point_id, change FROM catalog_changes
+                 WHERE version > ? AND version <= ? ORDER BY version''', (since, until))
+    rows = [tuple(row) for row in c.fetchall()]
+    conn.close()
+    return True, rows
+
 def get_main_categories():
     """Get the main categories from the structure_tree.yaml file"""
     try:
@@ -332,6 +1424,18 @@ def get_pending_submission_by_id(submission_id):
     conn.close()
     return dict(submission) if submission else None # Return as dict or None
 
+def get_pending_submissions_by_ids(submission_ids):
+    """Get several pending submissions in one query, as {submission_id: dict}"""
+    if not submission_ids:
+        return {}
+    conn = get_db()
+    c = conn.cursor()
+    placeholders = ','.join('?' for _ in submission_ids)
+    c.execute(f'SELECT * FROM pending_submissions WHERE submission_id IN ({placeholders})', list(submission_ids))
+    submissions = {row['submission_id']: dict(row) for row in c.fetchall()}
+    conn.close()
+    return submissions
+
 def update_pending_submission_status(submission_id, status):
     """Update the status of a pending submission"""
     conn = get_db()
@@ -434,6 +1538,8 @@ def update_data_point(data_id, updated_data):
              logging.warning(f"No rows updated for ID: {data_id}. ID might not exist.")
              # Optionally return False here if no update occurred, although the query itself didn't fail
              # return False
+        if 'countries' in updated_data or 'domains' in updated_data:
+            _sync_facet_links(c, [data_id])
         conn.commit()
         logging.info(f"Successfully updated data point with ID: {data_id}")
         return True
@@ -452,6 +1558,8 @@ def delete_data_point(data_id):
     conn = get_db()
     c = conn.cursor()
     try:
+        c.execute('DELETE FROM data_point_countries WHERE data_point_id = ?', (data_id,))
+        c.execute('DELETE FROM data_point_domains WHERE data_point_id = ?', (data_id,))
         c.execute('DELETE FROM data_points WHERE id = ?', (data_id,))
         conn.commit()
         print(f"Deleted data point with ID: {data_id}")
@@ -462,3 +1570,61 @@ def delete_data_point(data_id):
         return False
     finally:
         conn.close()
+
+# --- Consistent snapshots for admin download ---
+_snapshot_lock = threading.Lock()
+_snapshots = {} # compress flag -> {'version': data_version, 'path': file}
+
+def create_snapshot(dest_path, compress=False):
+    """
+    Write a consistent copy of the live database to dest_path using the
+    SQLite online backup API, SNAPSHOT_STEP_PAGES pages at a time so
+    readers and writers are never blocked for the whole copy.
+    The copy is a self-contained rollback-journal file; gzip it if compress.
+    """
+    tmp_path = f"{dest_path}.partial"
+    source = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+    target = sqlite3.connect(tmp_path)
+    try:
+        source.backup(target, pages=SNAPSHOT_STEP_PAGES, sleep=0.005)
+        target.execute('PRAGMA journal_mode=DELETE') # Downloaded file must not depend on a -wal file
+    finally:
+        target.close()
+        source.close()
+
+    if compress:
+        with open(tmp_path, 'rb') as raw, gzip.open(dest_path, 'wb') as packed:
+            shutil.copyfileobj(raw, packed, SNAPSHOT_STREAM_CHUNK)
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, dest_path)
+    return dest_path
+
+def get_snapshot(compress=False):
+    """
+    A snapshot matching the current database contents, as a file opened for
+    binary reading (the caller closes it). The last snapshot is reused until
+    PRAGMA data_version reports a commit. The file is opened under the lock, so
+    a newer snapshot replacing it cannot remove it first; an open file keeps
+    reading the unlinked snapshot.
+    """
+    with _snapshot_lock:
+        version = get_data_version()
+        cached = _snapshots.get(compress)
+        if cached and cached['version'] == version and os.path.exists(cached['path']):
+            return open(cached['path'], 'rb')
+
+        suffix = '.db.gz' if compress else '.db'
+        fd, path = tempfile.mkstemp(prefix='nomoreamr_snapshot_', suffix=suffix)
+        os.close(fd)
+        try:
+            create_snapshot(path, compress=compress)
+        except Exception:
+            os.remove(path)
+            raise
+        if cached and os.path.exists(cached['path']):
+            os.remove(cached['path']) # Open downloads keep reading their (unlinked) file
+        _snapshots[compress] = {'version': version, 'path': path}
+        logging.info(f"Created database snapshot {path} (data_version {version})")
+        return open(path, 'rb')
+
@@ -0,0 +1,208 @@
+"""
+Per-worker bitmap index for faceted filtering.
+
+Every facet value (country, domain, and the hierarchy path at each level,
+named as in database.FACETS) has a bitmap of the data points that carry it:
+a Python int with bit n set for data_points.id n. A filter is an OR of the
+selected values within a facet and an AND across facets, so a query is a
+handful of integer operations, and the count of every other facet value
+under that filter is one AND and one bit_count per value.
+
+The index follows the resource cache. When the catalog version moves it is
+patched from database.get_catalog_changes (only the changed ids are
+re-indexed) and rebuilt from scratch only when the change log does not reach
+back far enough.
+"""
+import logging
+import threading
+import time
+
+from database import get_catalog_changes, FACETS, HIERARCHY_FACETS, FACET_PATH_SEPARATOR
+
+FACET_INDEX_PATCH_MAX = 5000 # Above this many changed ids a full rebuild is cheaper
+
+
+def record_facet_values(record):
+    """{facet: set of values} of one ResourceRecord (hierarchy values are paths, e.g. 'Data/omics_data')"""
+    values = {
+        'country': set(record.countries_list),
+        'domain': set(record.domains_list),
+    }
+    path = []
+    for facet in HIERARCHY_FACETS:
+        level_value = record[facet]
+        if not level_value:
+            break # A path stops at its first empty level, like the facet_counts triggers
+        path.append(level_value)
+        values[facet] = {FACET_PATH_SEPARATOR.join(path)}
+    return values
+
+
+def bitmap_ids(bitmap):
+    """Data point ids whose bits are set, ascending"""
+    ids = []
+    offset = 0
+    while bitmap:
+        low = bitmap & 0xFFFFFFFFFFFFFFFF
+        while low:
+            bit = low & -low
+            ids.append(offset + bit.bit_length() - 1)
+            low ^= bit
+        bitmap >>= 64
+        offset += 64
+    return ids
+
+
+def _bitmap_from_ids(ids, size):
+    """One int with the given bits set, built via bytes (setting bits one by one is quadratic)"""
+    buffer = bytearray(size // 8 + 1)
+    for data_id in ids:
+        buffer[data_id >> 3] |= 1 << (data_id & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+class FacetIndex:
+    """Bitmaps per facet value over the resource cache, kept at its catalog version."""
+
+    def __init__(self, resource_cache):
+        self._resource_cache = resource_cache
+        self._lock = threading.Lock()
+        self._version = None
+        self._bitmaps = {facet: {} for facet in FACETS} # facet -> value -> int
+        self._all = 0                                   # Every indexed data point
+        self._values_by_id = {}                         # id -> record_facet_values(), to un-index on change
+
+    def _rebuild(self, state):
+        ids_by_value = {facet: {} for facet in FACETS}
+        values_by_id = {}
+        for record in state.records:
+            values = record_facet_values(record)
+            values_by_id[record.id] = values
+            for facet, facet_values in values.items():
+                for value in facet_values:
+                    ids_by_value[facet].setdefault(value, []).append(record.id)
+        size = max(values_by_id, default=0) + 1
+        self._bitmaps = {facet: {value: _bitmap_from_ids(ids, size) for value, ids in by_value.items()}
+                         for facet, by_value in ids_by_value.items()}
+        self._all = _bitmap_from_ids(values_by_id, size)
+        self._values_by_id = values_by_id
+
+    def _patch(self, state, changed_ids):
+        for data_id in changed_ids:
+            bit = 1 << data_id
+            for facet, facet_values in self._values_by_id.pop(data_id, {}).items():
+                for value in facet_values:
+                    remaining = self._bitmaps[facet][value] & ~bit
+                    if remaining:
+                        self._bitmaps[facet][value] = remaining
+                    else:
+                        del self._bitmaps[facet][value]
+            self._all &= ~bit
+
+            record = state.by_id.get(data_id)
+            if record is None:
+                continue # Deleted
+            values = self._values_by_id[data_id] = record_facet_values(record)
+            for facet, facet_values in values.items():
+                for value in facet_values:
+                    self._bitmaps[facet][value] = self._bitmaps[facet].get(value, 0) | bit
+            self._all |= bit
+
+    def refresh(self):
+        """Bring the index to the resource cache's catalog version"""
+        state = self._resource_cache.snapshot()
+        if state.version == self._version:
+            return
+        with self._lock:
+            if state.version == self._version:
+                return
+            started = time.perf_counter()
+            changes = None
+            if self._version is not None:
+                complete, rows = get_catalog_changes(self._version, state.version)
+                if complete:
+                    changes = {data_id for _, data_id, _ in rows}
+            if changes is not None and len(changes) <= FACET_INDEX_PATCH_MAX:
+                self._patch(state, changes)
+                how = f"patched {len(changes)} ids"
+            else:
+                self._rebuild(state)
+                how = f"rebuilt {len(self._values_by_id)} ids"
+            self._version = state.version
+            logging.info(f"Facet index {how} for catalog version {state.version} in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    def _selected(self, selections):
+        """{facet: OR of the selected values' bitmaps} for the facets with a selection (lock held)"""
+        selected = {}
+        for facet, values in selections.items():
+            if values:
+                bitmap = 0
+                for value in values:
+                    bitmap |= self._bitmaps[facet].get(value, 0)
+                selected[facet] = bitmap
+        return selected
+
+    def _match(self, selected, excluded=None):
+        """AND of the selected facets, leaving out one facet if given (lock held)"""
+        bitmap = self._all
+        for facet, facet_bitmap in selected.items():
+            if facet != excluded:
+                bitmap &= facet_bitmap
+        return bitmap
+
+    def query(self, selections, with_ids=False):
+        """
+        Resources matching selections ({facet: [values]}; any value within a
+        facet, every facet) and live counts per facet value. Counts for a facet
+        apply the selections of all the *other* facets, so each checkbox shows
+        how many results choosing it would add or keep. Only values with a
+        non-zero count are returned.
+        Returns {'version', 'total', 'counts': {facet: {value: n}}[, 'ids']}.
+        """
+        self.refresh()
+        with self._lock: # Patches mutate the bitmap dicts in place
+            version = self._version
+            selected = self._selected(selections)
+            matched = self._match(selected)
+            counts = {}
+            for facet, by_value in self._bitmaps.items():
+                base = self._match(selected, facet) if facet in selected else matched
+                facet_counts = {}
+                for value, bitmap in by_value.items():
+                    count = (bitmap & base).bit_count()
+                    if count:
+                        facet_counts[value] = count
+                counts[facet] = facet_counts
+
+        result = {'version': version, 'total': matched.bit_count(), 'counts': counts}
+        if with_ids:
+            result['ids'] = bitmap_ids(matched)
+        return result
+
+    def matching_ids(self, selections):
+        """Ids (ascending) of the resources matching selections, as in query()"""
+        self.refresh()
+        with self._lock:
+            bitmap = self._match(self._selected(selections))
+        return bitmap_ids(bitmap)
+
+    def nested_counts(self, facets):
+        """
+        Resource counts down a chain of facets, for the explorer trees:
+        {(value, ...): n} for every prefix of the chain with a non-zero count,
+        e.g. ('country', 'domain') gives {('Sweden',): 12, ('Sweden', 'Human'): 7, ...}.
+        Returns (version, counts).
+        """
+        self.refresh()
+        counts = {}
+        with self._lock:
+            def descend(prefix, bitmap, depth):
+                for value, value_bitmap in self._bitmaps[facets[depth]].items():
+                    matched = bitmap & value_bitmap
+                    if matched:
+                        key = prefix + (value,)
+                        counts[key] = matched.bit_count()
+                        if depth + 1 < len(facets):
+                            descend(key, matched, depth + 1)
+            descend((), self._all, 0)
+            return self._version, counts
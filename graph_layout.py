@@ -0,0 +1,241 @@
+"""
+Server-side layout for the /api/network-data graph.
+
+Positions are computed with a vectorized force-directed layout (springs
+along edges, repulsion between nodes) seeded from the vocabulary
+hierarchy: hierarchy nodes start on a radial tree, every other node starts
+next to the nodes it is linked to. The browser receives x/y per node and
+draws the graph with physics disabled.
+
+A GraphLayout keeps the positions of the previous catalog version. Nodes
+that already have a position never move; new nodes are placed next to
+their neighbours (a new data point next to its hierarchy leaf) and only
+they are relaxed. Given load/save functions (database.get_graph_positions /
+add_graph_positions for the main graph) the positions live in the database
+instead: every worker loads the stored positions of the graph's nodes and a
+node keeps the position first stored for it, so all workers serve the same
+x/y for the same catalog version.
+"""
+import logging
+import math
+import time
+import zlib
+
+import numpy as np
+
+LAYOUT_SEED = 7
+LAYOUT_ITERATIONS = 100            # Full layout (first build of a worker)
+LAYOUT_INCREMENTAL_ITERATIONS = 40 # Only the nodes new in this catalog version move
+LAYOUT_RING_STEP = 260             # Distance between hierarchy levels in the seed
+LAYOUT_SPRING = 0.06
+LAYOUT_REPULSION = 12000.0
+LAYOUT_GRAVITY = 0.002             # Keeps unconnected nodes from drifting off
+LAYOUT_REPULSION_SAMPLE = 500      # Repel against a random sample of nodes beyond this size
+LAYOUT_CHUNK = 1024                # Rows of the pairwise repulsion computed at once
+LAYOUT_SAVE_ATTEMPTS = 3           # Re-placements when another worker stored some of the same nodes first
+DEFAULT_EDGE_LENGTH = 100
+GOLDEN_ANGLE = math.pi * (3 - math.sqrt(5))
+
+
+def _stable_fraction(node_id):
+    """A number in [0, 1) that only depends on the node id (same spot on every worker)"""
+    return zlib.crc32(node_id.encode('utf-8')) / 2**32
+
+
+def _hierarchy_seed(nodes, edges):
+    """Radial tree positions for the level_* nodes; each subtree gets a wedge sized by its leaf count"""
+    hierarchy_ids = {node['id'] for node in nodes if str(node.get('group', '')).startswith('level_')}
+    children = {}
+    has_parent = set()
+    for edge in edges:
+        if edge['from'] in hierarchy_ids and edge['to'] in hierarchy_ids and edge['to'] not in has_parent:
+            children.setdefault(edge['from'], []).append(edge['to'])
+            has_parent.add(edge['to'])
+    roots = [node['id'] for node in nodes if node['id'] in hierarchy_ids and node['id'] not in has_parent]
+
+    leaf_counts = {}
+    def count_leaves(node_id):
+        if node_id not in leaf_counts:
+            leaf_counts[node_id] = sum(count_leaves(child) for child in children.get(node_id, ())) or 1
+        return leaf_counts[node_id]
+
+    positions = {}
+    def place(node_id, depth, start, end):
+        angle = (start + end) / 2
+        radius = depth * LAYOUT_RING_STEP
+        positions[node_id] = (radius * math.cos(angle), radius * math.sin(angle))
+        offset = start
+        for child in children.get(node_id, ()):
+            width = (end - start) * count_leaves(child) / count_leaves(node_id)
+            place(child, depth + 1, offset, offset + width)
+            offset += width
+
+    total = sum(count_leaves(root) for root in roots) or 1
+    offset = 0.0
+    for root in roots:
+        width = 2 * math.pi * count_leaves(root) / total
+        place(root, 1, offset, offset + width)
+        offset += width
+    return positions
+
+
+def _seed_near_neighbours(node_ids, neighbours, edge_lengths, positions):
+    """
+    Place nodes without a position next to already placed neighbours, in
+    passes, so data points land by their hierarchy leaf and country/domain
+    nodes by their data points. Anything left over goes on an outer ring.
+    """
+    pending = [node_id for node_id in node_ids if node_id not in positions]
+    while pending:
+        placed_any = False
+        still_pending = []
+        for node_id in pending:
+            anchors = [other for other in neighbours.get(node_id, ()) if other in positions]
+            if not anchors:
+                still_pending.append(node_id)
+                continue
+            ax = sum(positions[other][0] for other in anchors) / len(anchors)
+            ay = sum(positions[other][1] for other in anchors) / len(anchors)
+            length = sum(edge_lengths.get((node_id, other), DEFAULT_EDGE_LENGTH) for other in anchors) / len(anchors)
+            # Outward from the centre, spread around the anchor by a per-node angle
+            base = math.atan2(ay, ax) if (ax or ay) else 0.0
+            fraction = _stable_fraction(node_id)
+            angle = base + (fraction - 0.5) * math.pi
+            distance = length * (0.6 + 0.8 * ((fraction * 7919) % 1))
+            positions[node_id] = (ax + distance * math.cos(angle), ay + distance * math.sin(angle))
+            placed_any = True
+        pending = still_pending
+        if not placed_any:
+            break
+
+    if pending:
+        radius = max((math.hypot(x, y) for x, y in positions.values()), default=0.0) + LAYOUT_RING_STEP
+        for index, node_id in enumerate(pending):
+            angle = index * GOLDEN_ANGLE
+            positions[node_id] = (radius * math.cos(angle), radius * math.sin(angle))
+
+
+def relax(pos, movable, edge_src, edge_dst, edge_len, iterations, seed=LAYOUT_SEED):
+    """
+    Force-directed relaxation of pos (n x 2, modified in place). Only the rows
+    in 'movable' are moved; the other nodes still pull and push on them.
+    Repulsion is exact up to LAYOUT_REPULSION_SAMPLE nodes and estimated from
+    a fresh random sample per iteration above that.
+    """
+    n = len(pos)
+    if n == 0 or len(movable) == 0 or iterations <= 0:
+        return pos
+    rng = np.random.default_rng(seed)
+    temperature = float(LAYOUT_RING_STEP)
+    cooling = (1.0 / temperature) ** (1.0 / iterations) # Ends at a 1 px step
+
+    for _ in range(iterations):
+        disp = np.zeros_like(pos)
+
+        if len(edge_src):
+            delta = pos[edge_dst] - pos[edge_src]
+            dist = np.sqrt((delta ** 2).sum(axis=1)) + 1e-6
+            pull = delta * (LAYOUT_SPRING * (dist - edge_len) / dist)[:, None]
+            for axis in (0, 1):
+                disp[:, axis] += np.bincount(edge_src, weights=pull[:, axis], minlength=n)
+                disp[:, axis] -= np.bincount(edge_dst, weights=pull[:, axis], minlength=n)
+
+        if n > LAYOUT_REPULSION_SAMPLE:
+            others = pos[rng.choice(n, LAYOUT_REPULSION_SAMPLE, replace=False)]
+            scale = n / LAYOUT_REPULSION_SAMPLE
+        else:
+            others = pos
+            scale = 1.0
+        other_x = others[:, 0].astype(np.float32)
+        other_y = others[:, 1].astype(np.float32)
+        for start in range(0, len(movable), LAYOUT_CHUNK):
+            rows = movable[start:start + LAYOUT_CHUNK]
+            dx = pos[rows, 0].astype(np.float32)[:, None] - other_x
+            dy = pos[rows, 1].astype(np.float32)[:, None] - other_y
+            dist2 = dx * dx + dy * dy
+            dist2 += 1.0 # Keeps coincident pairs finite (their dx/dy are 0 anyway)
+            strength = dist2 ** -1.5
+            disp[rows, 0] += scale * LAYOUT_REPULSION * (dx * strength).sum(axis=1)
+            disp[rows, 1] += scale * LAYOUT_REPULSION * (dy * strength).sum(axis=1)
+
+        disp -= LAYOUT_GRAVITY * pos
+        step = disp[movable]
+        length = np.sqrt((step ** 2).sum(axis=1)) + 1e-9
+        pos[movable] += step * (np.minimum(length, temperature) / length)[:, None]
+        temperature *= cooling
+    return pos
+
+
+class GraphLayout:
+    """
+    Node positions of a network graph, carried over from one catalog version to
+    the next; shared through load_positions/save_positions when given.
+    """
+
+    def __init__(self, load_positions=None, save_positions=None):
+        self._positions = {}
+        self._load_positions = load_positions # (node_ids) -> {node_id: (x, y)} of those stored
+        self._save_positions = save_positions # ({node_id: (x, y)} of new nodes) -> number stored
+
+    def update(self, nodes, edges):
+        """Positions {node_id: (x, y)} for this graph; existing nodes keep theirs"""
+        if self._load_positions is None:
+            return self._place(nodes, edges)[0]
+        node_ids = [node['id'] for node in nodes]
+        for _ in range(LAYOUT_SAVE_ATTEMPTS):
+            self._positions = self._load_positions(node_ids)
+            positions, new_ids = self._place(nodes, edges)
+            if not new_ids or self._save_positions({node_id: positions[node_id] for node_id in new_ids}) == len(new_ids):
+                return positions
+            logging.info("Graph layout: some nodes were placed by another worker first, placing again")
+        # Still racing: use whatever is stored now, keeping ours only for nodes nobody stored
+        stored = self._load_positions(node_ids)
+        self._positions = {node_id: stored.get(node_id, position) for node_id, position in positions.items()}
+        return self._positions
+
+    def _place(self, nodes, edges):
+        """(positions for this graph, ids of the nodes placed now)"""
+        started = time.perf_counter()
+        node_ids = [node['id'] for node in nodes]
+        index = {node_id: i for i, node_id in enumerate(node_ids)}
+        neighbours = {}
+        edge_lengths = {}
+        edge_src, edge_dst, edge_len = [], [], []
+        for edge in edges:
+            a, b = edge['from'], edge['to']
+            if a not in index or b not in index:
+                continue
+            length = edge.get('length') or DEFAULT_EDGE_LENGTH
+            neighbours.setdefault(a, []).append(b)
+            neighbours.setdefault(b, []).append(a)
+            edge_lengths[(a, b)] = edge_lengths[(b, a)] = length
+            edge_src.append(index[a])
+            edge_dst.append(index[b])
+            edge_len.append(length)
+
+        positions = {node_id: self._positions[node_id] for node_id in node_ids if node_id in self._positions}
+        incremental = bool(positions)
+        new_ids = [node_id for node_id in node_ids if node_id not in positions]
+        if not new_ids:
+            self._positions = positions
+            return positions, new_ids
+
+        if not incremental:
+            positions.update(_hierarchy_seed(nodes, edges))
+        _seed_near_neighbours(node_ids, neighbours, edge_lengths, positions)
+
+        pos = np.array([positions[node_id] for node_id in node_ids], dtype=float)
+        if incremental:
+            movable = np.array([index[node_id] for node_id in new_ids], dtype=np.intp)
+            iterations = LAYOUT_INCREMENTAL_ITERATIONS
+        else:
+            movable = np.arange(len(node_ids), dtype=np.intp)
+            iterations = LAYOUT_ITERATIONS
+        relax(pos, movable, np.array(edge_src, dtype=np.intp), np.array(edge_dst, dtype=np.intp),
+              np.array(edge_len, dtype=float), iterations)
+
+        pos = np.round(pos, 1)
+        self._positions = {node_id: (float(x), float(y)) for node_id, (x, y) in zip(node_ids, pos.tolist())}
+        logging.info(f"Graph layout: {len(new_ids)} of {len(node_ids)} nodes placed "
+                     f"({'incremental' if incremental else 'full'}) in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return self._positions, new_ids
@@ -0,0 +1,206 @@
+"""
+Bulk loader for the data_points catalog.
+
+Reads resources from a CSV or JSONL file, validates them against the
+vocabulary in structure_tree.yaml and inserts them with
+database.bulk_add_data_points.
+
+Usage:
+    python load_resources.py resources.jsonl
+    python load_resources.py resources.csv --chunk-size 1000 --db ./amr.db
+    python load_resources.py resources.csv --dry-run   # validate only
+
+Columns / keys (only title, countries, domains and resource_type are required):
+    title, countries, domains, resource_type, category, subcategory, data_type,
+    level5, year_start, year_end, data_format, data_resolution, repository_url,
+    data_description, keywords, contact_information, license, institution,
+    last_updated
+In CSV files, countries, domains and keywords are separated by ';'.
+"""
+import argparse
+import csv
+import datetime
+import json
+import logging
+import os
+import sys
+import time
+from urllib.parse import urlparse
+
+import database
+
+HIERARCHY_FIELDS = ['resource_type', 'category', 'subcategory', 'data_type', 'level5']
+
+
+def read_rows(path):
+    """
+    Yield one dict per resource from a .csv or .jsonl file. A JSONL line that
+    is not a JSON object is yielded as a ValueError, so the caller can count
+    it as invalid and carry on.
+    """
+    if path.lower().endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                yield {k: (v.strip() if isinstance(v, str) else v) for k, v in row.items() if k}
+    else:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield ValueError(f"not valid JSON ({e})")
+                    continue
+                yield row if isinstance(row, dict) else ValueError("not a JSON object")
+
+
+def as_list(value):
+    """Accept a JSON list or a ';'-separated string"""
+    if value is None or value == '':
+        return []
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in str(value).split(';') if v.strip()]
+
+
+def as_year(value):
+    if value is None or value == '':
+        return None
+    return int(value)
+
+
+def hierarchy_children(details):
+    """Names of the nodes directly below a hierarchy node (sub_categories keys and items)"""
+    children = set()
+    if isinstance(details, dict):
+        if isinstance(details.get('sub_categories'), dict):
+            children.update(details['sub_categories'].keys())
+        for item in details.get('items') or []:
+            children.add(item.get('name') if isinstance(item, dict) else item)
+    return children
+
+
+def hierarchy_path_error(hierarchy, path):
+    """Return an error message if the L1..L5 path is not in the vocabulary, else None"""
+    levels = [path.get(field) for field in HIERARCHY_FIELDS]
+    if not levels[0]:
+        return "resource_type is required"
+    if levels[0] not in hierarchy:
+        return f"unknown resource_type '{levels[0]}'"
+    node = hierarchy[levels[0]]
+    for depth in range(1, len(levels)):
+        value = levels[depth]
+        if not value:
+            # The path may stop early, but must not skip a level
+            if any(levels[depth + 1:]):
+                return f"{HIERARCHY_FIELDS[depth]} is missing below {levels[depth - 1]}"
+            break
+        if value not in hierarchy_children(node):
+            return f"'{value}' is not a {HIERARCHY_FIELDS[depth]} under '{levels[depth - 1]}'"
+        sub_categories = node.get('sub_categories') if isinstance(node, dict) else None
+        node = sub_categories.get(value, {}) if isinstance(sub_categories, dict) else {}
+    return None
+
+
+def row_to_data_point(row, vocabularies):
+    """Validate one input row and convert it to an add_data_point tuple"""
+    main_categories = vocabularies['main_categories']
+    title = row.get('title') or row.get('resource_name')
+    countries = as_list(row.get('countries'))
+    domains = as_list(row.get('domains'))
+    if not title:
+        raise ValueError("title is required")
+    if not countries or not domains:
+        raise ValueError("at least one country and one domain are required")
+    unknown = [c for c in countries if c not in main_categories.get('Country', [])]
+    unknown += [d for d in domains if d not in main_categories.get('Domain', [])]
+    if unknown:
+        raise ValueError(f"not in vocabulary: {', '.join(unknown)}")
+
+    path = {field: row.get(field) or None for field in HIERARCHY_FIELDS}
+    error = hierarchy_path_error(vocabularies['resource_type_hierarchy'], path)
+    if error:
+        raise ValueError(error)
+
+    year_start = as_year(row.get('year_start'))
+    year_end = as_year(row.get('year_end'))
+    if year_start is not None and year_end is not None and year_start > year_end:
+        raise ValueError("year_start is after year_end")
+
+    repository_url = row.get('repository_url') or None
+    repository = row.get('repository') or (urlparse(repository_url).netloc if repository_url else None) or 'Unknown'
+    description = row.get('data_description') or row.get('description') or None
+    keywords = row.get('keywords') or None
+    if isinstance(keywords, list) or (keywords and ';' in keywords):
+        keywords = ','.join(as_list(keywords)) # Stored comma-separated like form submissions
+
+    metadata = {
+        "title": title,
+        "institution": row.get('institution') or "Unknown",
+        "license": row.get('license') or None,
+        "original_url": repository_url,
+        "related_metadata_categories": [],
+        "related_resource_ids": [],
+        "submitted_description": description
+    }
+
+    return (
+        None, path['resource_type'], path['category'], path['subcategory'], path['data_type'], path['level5'],
+        year_start, year_end, row.get('data_format') or None, row.get('data_resolution') or None,
+        repository, repository_url, description, keywords,
+        row.get('last_updated') or datetime.date.today().isoformat(),
+        row.get('contact_information') or row.get('contact_info') or None,
+        json.dumps(metadata), json.dumps(countries), json.dumps(domains)
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load resources into the catalog from CSV or JSONL.")
+    parser.add_argument('path', help="Input .csv or .jsonl file")
+    parser.add_argument('--db', help=f"Database file (default: {database.DB_PATH})")
+    parser.add_argument('--chunk-size', type=int, default=database.BULK_CHUNK_SIZE,
+                        help="Rows per transaction (default: %(default)s)")
+    parser.add_argument('--dry-run', action='store_true', help="Validate the input without writing")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.DB_PATH = os.path.abspath(args.db)
+    vocabularies = {
+        'main_categories': database.get_main_categories(),
+        'resource_type_hierarchy': database.get_resource_type_hierarchy()
+    }
+    if not vocabularies['resource_type_hierarchy']:
+        print("Error: vocabulary could not be loaded from structure_tree.yaml.")
+        return 1
+
+    invalid = 0
+
+    def valid_rows():
+        nonlocal invalid
+        for line_number, row in enumerate(read_rows(args.path), start=1):
+            try:
+                if isinstance(row, ValueError):
+                    raise row
+                yield row_to_data_point(row, vocabularies)
+            except (ValueError, TypeError) as e:
+                invalid += 1
+                logging.warning(f"Row {line_number} skipped: {e}")
+
+    started = time.monotonic()
+    if args.dry_run:
+        valid = sum(1 for _ in valid_rows())
+        print(f"{valid} valid rows, {invalid} invalid rows (dry run, nothing written).")
+        return 0 if invalid == 0 else 1
+
+    database.init_db()
+    summary = database.bulk_add_data_points(valid_rows(), chunk_size=args.chunk_size)
+    elapsed = time.monotonic() - started
+    rate = summary['inserted'] / elapsed if elapsed > 0 else 0
+    print(f"Inserted {summary['inserted']} rows in {elapsed:.1f}s ({rate:.0f} rows/s); "
+          f"{summary['duplicates']} duplicates, {invalid} invalid, {summary['failed']} failed.")
+    return 0 if summary['failed'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,701 @@
+"""
+Network graph payload for /api/network-data.
+
+The hierarchy part of the graph (levels 1-5 from structure_tree.yaml) is
+built once from the vocabulary; data point, country and domain nodes are
+added from the resource cache. Every node carries x/y from graph_layout,
+so the browser can draw it without running physics. The finished payload
+is kept per worker as pre-encoded JSON bytes keyed on the catalog version,
+so a request that hits the cache costs one version check and a copy of the
+bytes.
+"""
+import json
+import logging
+import math
+import threading
+from collections import namedtuple, OrderedDict
+
+from database import (
+    get_graph_positions, add_graph_positions, delete_stale_graph_positions, get_year_overlap_ids,
+    get_subtree_data_point_ids
+)
+from graph_layout import GraphLayout
+
+BASE_FONT_SIZE = 16 # Increased base font size
+
+# --- Define shapes for domains ---
+DOMAIN_SHAPES = {
+    'Human': 'dot',
+    'Animal': 'square',
+    'Environment': 'triangle',
+    'default': 'ellipse'
+}
+
+# --- Define Country Flags and Colors (Pastel Palette) ---
+COUNTRY_INFO = {
+    "Denmark": {"flag": "🇩🇰", "color": "#FFB6B6"}, # Pastel Red
+    "Norway": {"flag": "🇳🇴", "color": "#AEC6CF"}, # Pastel Blue
+    "Sweden": {"flag": "🇸🇪", "color": "#FDFD96"}, # Pastel Yellow
+    "Finland": {"flag": "🇫🇮", "color": "#B3E2CD"}, # Pastel Green
+    "default": {"flag": "🏳️", "color": "#E0E0E0"}  # Light Grey for others
+}
+
+# Look of the hierarchy nodes per level: (color, shape, size, mass)
+HIERARCHY_LEVEL_STYLES = {
+    1: ('#87CEEB', 'database', 24, 10), # Resource Type, Sky Blue
+    2: ('#90EE90', 'ellipse', 20, 8),   # Category, Light Green
+    3: ('#FFB6C1', 'ellipse', 16, 6),   # Subcategory, Light Pink
+    4: ('#FFD700', 'ellipse', 14, 4),   # Data Type, Gold
+    5: ('#FFA07A', 'ellipse', 12, 2),   # Item/Leaf, Light Salmon
+}
+
+HIERARCHY_EDGE_COLOR = {'color': '#e0e0e0', 'highlight': '#d0d0d0', 'hover': '#d0d0d0'}
+LEAF_EDGE_COLOR = {'color': '#c0c0c0', 'highlight': '#a0a0a0', 'hover': '#a0a0a0'}
+FACET_EDGE_COLOR = {'color': '#dddddd', 'highlight': '#848484', 'hover': '#848484'}
+
+
+def make_edge(from_id, to_id, length, color):
+    """Graph edge with a deterministic id, so clients can update or remove it by id"""
+    return {'id': f"{from_id}->{to_id}", 'from': from_id, 'to': to_id, 'length': length, 'color': color}
+
+
+# --- Function to generate consistent node IDs for hierarchy ---
+def get_hierarchy_node_id(level, name):
+    """Generates a consistent node ID for hierarchy levels."""
+    # Replace spaces and special chars for cleaner IDs
+    clean_name = ''.join(e for e in name if e.isalnum() or e == '_').lower()
+    return f"L{level}_{clean_name}"
+
+
+def build_hierarchy_graph(hierarchy_definition):
+    """
+    Nodes and edges for the vocabulary hierarchy (levels 1-5).
+    Returns {'nodes': [...], 'edges': [...], 'node_ids': set(), 'parents': {id: [parent ids]}};
+    built once at startup.
+    """
+    nodes = []
+    edges = []
+    added_nodes = set() # Keep track of added node IDs
+
+    def add_node(node_id, label, level, font_size, style_level=None):
+        color, shape, size, mass = HIERARCHY_LEVEL_STYLES[style_level or level]
+        if node_id not in added_nodes:
+            nodes.append({
+                'id': node_id,
+                'label': label,
+                'title': f"Level {level}: {label}", # Tooltip indicates level
+                'group': f"level_{level}",
+                'color': color,
+                'shape': shape,
+                'size': size,
+                'mass': mass, # Mass influences physics layout
+                'font': {'size': font_size}
+            })
+            added_nodes.add(node_id)
+
+    added_edges = set()
+    parents = {} # child node id -> parent node ids (a name can appear under several parents)
+    def add_edge(edge):
+        if edge['id'] not in added_edges: # Edge ids must be unique for vis.DataSet
+            edges.append(edge)
+            added_edges.add(edge['id'])
+            parents.setdefault(edge['to'], []).append(edge['from'])
+
+    # --- Helper Function to Recursively Build Hierarchy Nodes/Edges ---
+    def process_hierarchy_level(level_data, parent_node_id, current_level):
+        if current_level > 5: # Limit recursion depth
+            return
+
+        for key, details in level_data.items():
+            # Skip metadata keys like 'level', 'title' if they are siblings to actual categories
+            if key in ['level', 'title']:
+                continue
+            if not isinstance(details, dict): # Ensure details is a dictionary
+                print(f"Skipping invalid hierarchy entry: {key} (details not a dict)")
+                continue
+
+            node_id = get_hierarchy_node_id(current_level, key)
+            add_node(node_id, details.get('title', key.replace('_', ' ').title()), current_level, BASE_FONT_SIZE)
+
+            # Add edge from parent to this node (length influences physics layout)
+            if parent_node_id:
+                add_edge(make_edge(parent_node_id, node_id, 100 + (current_level * 10), HIERARCHY_EDGE_COLOR))
+
+            # Recurse for sub_categories
+            if isinstance(details.get('sub_categories'), dict):
+                process_hierarchy_level(details['sub_categories'], node_id, current_level + 1)
+
+            # Process items as Level 5 leaves
+            item_level = current_level + 1
+            if isinstance(details.get('items'), list) and item_level <= 5:
+                for item in details['items']:
+                    item_details = item if isinstance(item, dict) else {} # Keep the whole dict
+                    item_name = item if isinstance(item, str) else item_details.get('name')
+                    if not item_name:
+                        continue
+                    item_id = get_hierarchy_node_id(item_level, item_name)
+                    # Use title from item details if available, otherwise format name
+                    item_label = item_details.get('title', item_name.replace('_', ' ').title())
+                    add_node(item_id, item_label, item_level, BASE_FONT_SIZE - 2, style_level=5) # Items look like L5 leaves
+
+                    # Add edge from the category that contains the items to the item node
+                    add_edge(make_edge(node_id, item_id, 150, HIERARCHY_EDGE_COLOR))
+
+    process_hierarchy_level(hierarchy_definition or {}, None, 1)
+    return {'nodes': nodes, 'edges': edges, 'node_ids': added_nodes, 'parents': parents}
+
+
+def leaf_hierarchy_node_id(point):
+    """ID of the deepest hierarchy node a data point names (None if it names none)"""
+    for level, column in ((5, 'level5'), (4, 'data_type'), (3, 'subcategory'), (2, 'category'), (1, 'resource_type')):
+        value = getattr(point, column)
+        if value:
+            return get_hierarchy_node_id(level, value)
+    return None
+
+
+def data_point_elements(point, hierarchy_node_ids):
+    """
+    Nodes and edges contributed by one ResourceRecord: its own node, the edge
+    from its hierarchy leaf, and its country/domain nodes with their edges.
+    Country/domain nodes are shared between points; callers de-duplicate by id.
+    """
+    nodes = []
+    edges = []
+    countries_list = point.countries_list
+    domains_list = point.domains_list
+    default_country_info = COUNTRY_INFO['default']
+
+    # --- Use FIRST country for node coloring (simplification) ---
+    country = countries_list[0] if countries_list else None
+
+    # Ensure the hierarchy node actually exists in the vocabulary graph
+    leaf_id = leaf_hierarchy_node_id(point)
+    if leaf_id and leaf_id not in hierarchy_node_ids:
+        print(f"Warning: Hierarchy node '{leaf_id}' for data point '{point.data_source_id}' not found in processed hierarchy. Skipping hierarchy link.")
+        leaf_id = None # Prevent edge creation to non-existent node
+
+    # --- Data Point Node ---
+    dp_node_id = f"dp_{point.id}"
+    dp_label = point.metadata_obj.get('title', point.data_source_id)
+    country_info = COUNTRY_INFO.get(country, default_country_info) if country else default_country_info
+    dp_fill_color = country_info['color']
+    tooltip = f"<b>{dp_label}</b><br>ID: {point.data_source_id}<br>Countries: {', '.join(countries_list)}<br>Domains: {', '.join(domains_list)}<br>Type: {point.resource_type or 'N/A'}"
+    nodes.append({
+        'id': dp_node_id,
+        'label': dp_label,
+        'title': tooltip,
+        'group': 'data_point',
+        'shape': 'dot',
+        'size': 18,
+        'mass': 3,
+        'font': {'size': BASE_FONT_SIZE},
+        'color': {
+            'background': dp_fill_color,
+            'border': '#555555',
+            'highlight': {'background': dp_fill_color, 'border': '#2B7CE9'},
+            'hover': {'background': dp_fill_color, 'border': '#E04141'}
+        },
+        'borderWidth': 2,
+        'borderWidthSelected': 4,
+        'dataSourceId': point.data_source_id
+    })
+
+    # --- Edge from Hierarchy Leaf to Data Point ---
+    if leaf_id:
+        edges.append(make_edge(leaf_id, dp_node_id, 80, LEAF_EDGE_COLOR))
+
+    # --- Country and Domain Nodes and Edges (all of them, not just the first) ---
+    facet_nodes, facet_edges = facet_elements(dp_node_id, countries_list, domains_list)
+    nodes.extend(facet_nodes)
+    edges.extend(facet_edges)
+    return nodes, edges
+
+
+def country_node(c_name):
+    c_info = COUNTRY_INFO.get(c_name, COUNTRY_INFO['default'])
+    return {
+        'id': f"country_{c_name.replace(' ', '_').lower()}", 'label': f"{c_info['flag']} {c_name}", 'title': f"Country: {c_name}",
+        'group': 'country_node', 'color': c_info['color'], 'shape': 'hexagon',
+        'size': 30, 'mass': 15, 'font': {'size': BASE_FONT_SIZE + 2}
+    }
+
+
+def domain_node(d_name):
+    return {
+        'id': f"domain_{d_name.replace(' ', '_').lower()}", 'label': d_name, 'title': f"Domain: {d_name}",
+        'group': 'domain_node', 'color': '#FFDAB9', 'shape': DOMAIN_SHAPES.get(d_name, DOMAIN_SHAPES['default']),
+        'size': 22, 'mass': 8, 'font': {'size': BASE_FONT_SIZE}
+    }
+
+
+def facet_elements(node_id, countries, domains):
+    """Country and domain nodes for a data point (or cluster) node, with the edges to them"""
+    nodes = []
+    edges = []
+    for c_name in dict.fromkeys(countries): # Repeated names would repeat edge ids
+        node = country_node(c_name)
+        nodes.append(node)
+        edges.append(make_edge(node_id, node['id'], 200, FACET_EDGE_COLOR))
+    for d_name in dict.fromkeys(domains):
+        node = domain_node(d_name)
+        nodes.append(node)
+        edges.append(make_edge(node_id, node['id'], 180, FACET_EDGE_COLOR))
+    return nodes, edges
+
+
+def _merge_elements(nodes, edges, added_nodes, new_nodes, new_edges):
+    """Append new nodes (skipping ids already in added_nodes) and edges"""
+    for node in new_nodes:
+        if node['id'] not in added_nodes:
+            nodes.append(node)
+            added_nodes.add(node['id'])
+    edges.extend(new_edges)
+
+
+def build_network_graph(records, hierarchy_graph, clusters=None):
+    """
+    The full {'nodes', 'edges'} graph: vocabulary hierarchy plus every data point.
+    With clusters (see lod_clusters) each cluster is one node instead of its members.
+    """
+    nodes = list(hierarchy_graph['nodes'])
+    edges = list(hierarchy_graph['edges'])
+    added_nodes = set(hierarchy_graph['node_ids'])
+    clustered = set()
+    if clusters:
+        labels = {node['id']: node['label'] for node in hierarchy_graph['nodes']}
+        for cluster_id, cluster in clusters.items():
+            clustered.update(point.id for point in cluster.members)
+            _merge_elements(nodes, edges, added_nodes, *cluster_elements(cluster_id, cluster, labels))
+    for point in records:
+        if point.id not in clustered:
+            _merge_elements(nodes, edges, added_nodes, *data_point_elements(point, hierarchy_graph['node_ids']))
+    return {'nodes': nodes, 'edges': edges}
+
+
+# --- Level of detail: large groups of data points drawn as one cluster node ---
+LOD_GROUPINGS = ('leaf', 'leaf_country')
+LOD_CLUSTER_MIN_SIZE = 30 # Groups with more data points than this are clustered
+CLUSTER_COLOR = {
+    'background': '#D8BFD8', 'border': '#8B668B',
+    'highlight': {'background': '#E6CFE6', 'border': '#2B7CE9'},
+    'hover': {'background': '#E6CFE6', 'border': '#E04141'}
+}
+
+Cluster = namedtuple('Cluster', 'leaf_id country members position')
+
+
+def lod_clusters(records, hierarchy_graph, grouping, positions):
+    """
+    Data points grouped per hierarchy leaf (grouping 'leaf') or per leaf and
+    first country ('leaf_country'). Returns {cluster node id: Cluster} for the
+    groups larger than LOD_CLUSTER_MIN_SIZE; a cluster sits at the centre of
+    its members' layout positions. There is at most one cluster per leaf (per
+    country), so the clustered graph is bounded by the vocabulary size.
+    """
+    groups = {}
+    for point in records:
+        leaf_id = leaf_hierarchy_node_id(point)
+        if leaf_id not in hierarchy_graph['node_ids']:
+            leaf_id = None
+        country = None
+        if grouping == 'leaf_country' and point.countries_list:
+            country = point.countries_list[0]
+        groups.setdefault((leaf_id, country), []).append(point)
+
+    clusters = {}
+    for (leaf_id, country), members in groups.items():
+        if len(members) <= LOD_CLUSTER_MIN_SIZE:
+            continue
+        cluster_id = f"cluster_{leaf_id or 'unclassified'}"
+        if country:
+            cluster_id += f"__{country.replace(' ', '_').lower()}"
+        placed = [positions[f"dp_{point.id}"] for point in members if f"dp_{point.id}" in positions]
+        position = None
+        if placed:
+            position = (round(sum(x for x, _ in placed) / len(placed), 1), round(sum(y for _, y in placed) / len(placed), 1))
+        clusters[cluster_id] = Cluster(leaf_id, country, members, position)
+    return clusters
+
+
+def cluster_elements(cluster_id, cluster, hierarchy_labels):
+    """A cluster node, the edge from its hierarchy leaf and the country/domain nodes of its members"""
+    size = len(cluster.members)
+    label = hierarchy_labels.get(cluster.leaf_id, 'Unclassified')
+    if cluster.country:
+        label += f" · {cluster.country}"
+    node = {
+        'id': cluster_id,
+        'label': f"{label} ({size})",
+        'title': f"<b>{label}</b><br>{size} resources<br>Double-click to show them",
+        'group': 'cluster',
+        'shape': 'dot',
+        'size': min(60, 20 + 4 * int(math.log2(size))),
+        'mass': 5,
+        'font': {'size': BASE_FONT_SIZE},
+        'color': CLUSTER_COLOR,
+        'borderWidth': 2
+    }
+    if cluster.position:
+        node['x'], node['y'] = cluster.position
+    nodes = [node]
+    edges = []
+    if cluster.leaf_id:
+        edges.append(make_edge(cluster.leaf_id, cluster_id, 120, LEAF_EDGE_COLOR))
+    facet_nodes, facet_edges = facet_elements(
+        cluster_id,
+        [country for point in cluster.members for country in point.countries_list],
+        [domain for point in cluster.members for domain in point.domains_list]
+    )
+    return nodes + facet_nodes, edges + facet_edges
+
+
+def cluster_members_graph(cluster, hierarchy_graph):
+    """{'nodes', 'edges'} of a cluster's data points as the full graph draws them (for expanding it)"""
+    nodes = []
+    edges = []
+    added_nodes = set()
+    for point in cluster.members:
+        _merge_elements(nodes, edges, added_nodes, *data_point_elements(point, hierarchy_graph['node_ids']))
+    return {'nodes': nodes, 'edges': edges}
+
+
+def with_positions(nodes, positions):
+    """Copies of the nodes with x/y from a GraphLayout (nodes without a position are left as they are)"""
+    result = []
+    for node in nodes:
+        position = positions.get(node['id'])
+        result.append(dict(node, x=position[0], y=position[1]) if position else node)
+    return result
+
+
+def network_graph_changes(state, changes, hierarchy_graph, positions=None):
+    """
+    Delta between the graph at an older catalog version and the graph of
+    'state' (a resource cache CacheState), from catalog_changes rows.
+    Returns {'added', 'updated', 'removed'} data point node ids plus the
+    'nodes' and 'edges' of every added or updated point (including its
+    country/domain nodes), positioned from 'positions' when given. Clients
+    drop the old edges of updated and removed points, then upsert nodes and edges.
+    """
+    first_change = {}
+    for _, data_point_id, change in changes:
+        first_change.setdefault(data_point_id, change)
+
+    delta = {'added': [], 'updated': [], 'removed': [], 'nodes': [], 'edges': []}
+    added_nodes = set()
+    for data_point_id, change in first_change.items():
+        point = state.by_id.get(data_point_id)
+        node_id = f"dp_{data_point_id}"
+        if point is None:
+            if change != 'insert': # Inserted and deleted again within the window: nothing to send
+                delta['removed'].append(node_id)
+            continue
+        delta['added' if change == 'insert' else 'updated'].append(node_id)
+        point_nodes, point_edges = data_point_elements(point, hierarchy_graph['node_ids'])
+        for node in point_nodes:
+            if node['id'] not in added_nodes:
+                delta['nodes'].append(node)
+                added_nodes.add(node['id'])
+        delta['edges'].extend(point_edges)
+    if positions:
+        delta['nodes'] = with_positions(delta['nodes'], positions)
+    return delta
+
+
+# --- Filtered graphs ---
+FILTERED_GRAPHS_KEPT = 32 # Encoded filtered graphs kept per worker (least recently used dropped)
+
+# countries/domains/resource_types are frozensets (empty: no filter), years and subtree None when unset
+GraphFilter = namedtuple('GraphFilter', 'countries domains resource_types year_from year_to subtree')
+
+
+def graph_filter_ids(graph_filter):
+    """
+    Set of data point ids allowed by the GraphFilter's year range and subtree
+    (a hierarchy path such as 'Data/omics_data'), from the same database
+    queries as /api/filter-resources; None if it sets neither.
+    Raises ValueError if the subtree path is not in the vocabulary.
+    """
+    allowed_ids = None
+    if graph_filter.subtree:
+        subtree_ids = get_subtree_data_point_ids(graph_filter.subtree)
+        if subtree_ids is None:
+            raise ValueError("Unknown hierarchy node in subtree.")
+        allowed_ids = set(subtree_ids)
+    if graph_filter.year_from is not None or graph_filter.year_to is not None:
+        year_ids = set(get_year_overlap_ids(graph_filter.year_from, graph_filter.year_to))
+        allowed_ids = year_ids if allowed_ids is None else allowed_ids & year_ids
+    return allowed_ids
+
+
+def record_matches(point, graph_filter, allowed_ids=None):
+    """
+    True if a ResourceRecord passes a GraphFilter. Countries, domains and
+    resource types match on any selected value; allowed_ids (from
+    graph_filter_ids) applies the year range and subtree.
+    """
+    if graph_filter.countries and graph_filter.countries.isdisjoint(point.countries_list):
+        return False
+    if graph_filter.domains and graph_filter.domains.isdisjoint(point.domains_list):
+        return False
+    if graph_filter.resource_types and point.resource_type not in graph_filter.resource_types:
+        return False
+    if allowed_ids is not None and point.id not in allowed_ids:
+        return False
+    return True
+
+
+def build_filtered_graph(records, hierarchy_graph, graph_filter):
+    """
+    The graph of the records passing graph_filter: their data point nodes,
+    the country/domain nodes they link to, and only the hierarchy nodes on
+    the paths down to their leaves.
+    """
+    allowed_ids = graph_filter_ids(graph_filter)
+    points = [point for point in records if record_matches(point, graph_filter, allowed_ids)]
+    kept = set()
+    for point in points:
+        pending = [leaf_hierarchy_node_id(point)]
+        while pending:
+            node_id = pending.pop()
+            if node_id in hierarchy_graph['node_ids'] and node_id not in kept:
+                kept.add(node_id)
+                pending.extend(hierarchy_graph['parents'].get(node_id, ()))
+
+    nodes = [node for node in hierarchy_graph['nodes'] if node['id'] in kept]
+    edges = [edge for edge in hierarchy_graph['edges'] if edge['from'] in kept and edge['to'] in kept]
+    added_nodes = set(kept)
+    for point in points:
+        _merge_elements(nodes, edges, added_nodes, *data_point_elements(point, hierarchy_graph['node_ids']))
+    return {'nodes': nodes, 'edges': edges}
+
+
+# --- k-hop neighborhoods ---
+NEIGHBORHOOD_MAX_HOPS = 3
+NEIGHBORHOOD_MAX_NODES = 2000 # A country or domain is one hop from most of the catalog
+
+# Nodes by id, the edge list, and per node id a list of (neighbour id, edge index)
+GraphIndex = namedtuple('GraphIndex', 'nodes edges adjacency')
+
+
+def build_graph_index(graph):
+    """Adjacency index of a {'nodes', 'edges'} graph, for neighborhood()"""
+    nodes = {node['id']: node for node in graph['nodes']}
+    adjacency = {node_id: [] for node_id in nodes}
+    for edge_index, edge in enumerate(graph['edges']):
+        adjacency[edge['from']].append((edge['to'], edge_index))
+        adjacency[edge['to']].append((edge['from'], edge_index))
+    return GraphIndex(nodes, graph['edges'], adjacency)
+
+
+def neighborhood(index, node_id, hops, max_nodes=NEIGHBORHOOD_MAX_NODES):
+    """
+    {'nodes', 'edges', 'truncated'} of the subgraph within 'hops' edges of
+    node_id (a hierarchy, country, domain or dp_ node id), nearest nodes
+    first, with every edge between the returned nodes. Stops at max_nodes
+    and sets 'truncated'. Returns None if the node is not in the graph.
+    """
+    if node_id not in index.nodes:
+        return None
+    included = {node_id}
+    order = [node_id]
+    frontier = [node_id]
+    truncated = False
+    for _ in range(hops):
+        next_frontier = []
+        for current in frontier:
+            for neighbour, _ in index.adjacency[current]:
+                if neighbour in included:
+                    continue
+                if len(order) >= max_nodes:
+                    truncated = True
+                    break
+                included.add(neighbour)
+                order.append(neighbour)
+                next_frontier.append(neighbour)
+            if truncated:
+                break
+        frontier = next_frontier
+        if truncated or not frontier:
+            break
+
+    edge_indexes = sorted({edge_index for current in order
+                           for neighbour, edge_index in index.adjacency[current] if neighbour in included})
+    return {
+        'nodes': [index.nodes[current] for current in order],
+        'edges': [index.edges[edge_index] for edge_index in edge_indexes],
+        'truncated': truncated
+    }
+
+
+def encode_json(payload):
+    """Compact UTF-8 JSON bytes, ready to send"""
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+# Per-node values of the compact format; every other node field goes into the style table
+COMPACT_NODE_COLUMNS = ('id', 'label', 'title', 'x', 'y', 'dataSourceId')
+
+
+def compact_graph(graph):
+    """
+    Columnar form of a {'nodes', 'edges'} graph (?format=compact). Nodes are
+    parallel arrays of their own values plus an index into 'nodeStyles', the
+    distinct remaining field sets (group, shape, color, size, ...). Edges are
+    from/to node indexes plus an index into 'edgeStyles'; their ids are
+    "from->to" and are rebuilt by the client (see make_edge).
+    """
+    nodes = {column: [] for column in COMPACT_NODE_COLUMNS}
+    nodes['style'] = []
+    node_styles, node_style_index = [], {}
+    node_index = {}
+    for node in graph['nodes']:
+        node_index[node['id']] = len(node_index)
+        for column in COMPACT_NODE_COLUMNS:
+            nodes[column].append(node.get(column))
+        style = {key: value for key, value in node.items() if key not in COMPACT_NODE_COLUMNS}
+        key = repr(style) # Nodes of one kind are built with the same field order
+        if key not in node_style_index:
+            node_style_index[key] = len(node_styles)
+            node_styles.append(style)
+        nodes['style'].append(node_style_index[key])
+
+    edges = {'from': [], 'to': [], 'style': []}
+    edge_styles, edge_style_index = [], {}
+    edge_from, edge_to, edge_style = edges['from'], edges['to'], edges['style']
+    for edge in graph['edges']:
+        edge_from.append(node_index[edge['from']])
+        edge_to.append(node_index[edge['to']])
+        key = (edge['length'], id(edge['color'])) # Edge colors are the shared *_EDGE_COLOR dicts (see make_edge)
+        style = edge_style_index.get(key)
+        if style is None:
+            style = edge_style_index[key] = len(edge_styles)
+            edge_styles.append({'length': edge['length'], 'color': edge['color']})
+        edge_style.append(style)
+
+    return {'format': 'compact', 'nodes': nodes, 'nodeStyles': node_styles,
+            'edges': edges, 'edgeStyles': edge_styles}
+
+
+GRAPH_FORMATS = {
+    'full': encode_json,
+    'compact': lambda graph: encode_json(compact_graph(graph)),
+}
+
+# (catalog version, CacheState, node positions, full graph with x/y, {(format, lod): JSON bytes},
+# {key: structure derived from this version}); bodies and derived are filled in on first use
+GraphEntry = namedtuple('GraphEntry', 'version state positions graph bodies derived')
+
+
+class NetworkGraphCache:
+    """
+    Pre-encoded /api/network-data payloads of this worker (one per format and
+    level of detail), rebuilt when the catalog version changes. The layout is
+    stored in the database (graph_positions), so every worker serves the same
+    positions for a catalog version and they carry over between versions.
+    """
+
+    def __init__(self, resource_cache, hierarchy_graph):
+        self._resource_cache = resource_cache
+        self._hierarchy_graph = hierarchy_graph
+        self._layout = GraphLayout(get_graph_positions, add_graph_positions)
+        self._lock = threading.Lock()       # Bodies and derived data of an entry, filtered results
+        self._build_lock = threading.Lock() # Held while a new catalog version is laid out
+        self._entry = GraphEntry(None, None, {}, None, {}, {}) # Swapped as one tuple
+        self._filtered = OrderedDict() # (version, GraphFilter, format) -> JSON bytes
+
+    def current(self):
+        """
+        GraphEntry of the current catalog version, with its layout and the full
+        positioned graph. The layout (and its graph_positions reads and writes)
+        runs under the build lock only, so filtered graphs and requests still
+        working on the previous entry are not held up by it.
+        """
+        state = self._resource_cache.snapshot()
+        entry = self._entry
+        if entry.version != state.version:
+            with self._build_lock:
+                entry = self._entry
+                if entry.version != state.version:
+                    graph = build_network_graph(state.records, self._hierarchy_graph)
+                    positions = self._layout.update(graph['nodes'], graph['edges'])
+                    removed = delete_stale_graph_positions(positions.keys(), state.version)
+                    if removed:
+                        logging.info(f"Graph layout: dropped {removed} stored positions of removed nodes")
+                    graph['nodes'] = with_positions(graph['nodes'], positions)
+                    entry = self._entry = GraphEntry(state.version, state, positions, graph, {}, {})
+        return entry
+
+    def _clusters(self, entry, lod):
+        """Clusters of one grouping for an entry (call with the lock held)"""
+        key = ('clusters', lod)
+        if key not in entry.derived:
+            entry.derived[key] = lod_clusters(entry.state.records, self._hierarchy_graph, lod, entry.positions)
+        return entry.derived[key]
+
+    def _index(self, entry):
+        """GraphIndex of the full, positioned graph of an entry (call with the lock held)"""
+        if 'index' not in entry.derived:
+            entry.derived['index'] = build_graph_index(entry.graph)
+        return entry.derived['index']
+
+    def payload(self, graph_format='full', lod=None):
+        """(catalog version, JSON bytes) of the current graph in one of GRAPH_FORMATS, clustered by lod (one of LOD_GROUPINGS)"""
+        entry = self.current()
+        key = (graph_format, lod)
+        body = entry.bodies.get(key)
+        if body is None:
+            with self._lock:
+                body = entry.bodies.get(key)
+                if body is None:
+                    if lod:
+                        graph = build_network_graph(entry.state.records, self._hierarchy_graph, self._clusters(entry, lod))
+                        graph['nodes'] = with_positions(graph['nodes'], entry.positions)
+                    else:
+                        graph = entry.graph # Built and positioned once per version in current()
+                    body = entry.bodies[key] = GRAPH_FORMATS[graph_format](graph)
+                    logging.info(f"Network graph ({graph_format}, lod {lod or 'none'}) encoded for catalog version {entry.version} ({len(body)} bytes)")
+        return entry.version, body
+
+    def expand(self, cluster_id, lod):
+        """(catalog version, {'nodes', 'edges'} of the cluster's members), graph None if there is no such cluster"""
+        entry = self.current()
+        with self._lock:
+            cluster = self._clusters(entry, lod).get(cluster_id)
+        if cluster is None:
+            return entry.version, None
+        graph = cluster_members_graph(cluster, self._hierarchy_graph)
+        graph['nodes'] = with_positions(graph['nodes'], entry.positions)
+        return entry.version, graph
+
+    def filtered_payload(self, graph_filter, graph_format='full'):
+        """
+        (catalog version, JSON bytes) of the graph narrowed by a GraphFilter,
+        laid out on its own, so cost follows the size of the result. The last
+        FILTERED_GRAPHS_KEPT results are kept.
+        """
+        state = self._resource_cache.snapshot()
+        key = (state.version, graph_filter, graph_format)
+        with self._lock:
+            body = self._filtered.get(key)
+            if body is not None:
+                self._filtered.move_to_end(key)
+                return state.version, body
+
+        graph = build_filtered_graph(state.records, self._hierarchy_graph, graph_filter)
+        positions = GraphLayout().update(graph['nodes'], graph['edges'])
+        graph['nodes'] = with_positions(graph['nodes'], positions)
+        body = GRAPH_FORMATS[graph_format](graph)
+        with self._lock:
+            self._filtered[key] = body
+            while len(self._filtered) > FILTERED_GRAPHS_KEPT:
+                self._filtered.popitem(last=False)
+        return state.version, body
+
+    def neighborhood(self, node_id, hops):
+        """(catalog version, neighborhood() result for the current graph)"""
+        entry = self.current()
+        with self._lock:
+            index = self._index(entry)
+        return entry.version, neighborhood(index, node_id, hops)
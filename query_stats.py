@@ -0,0 +1,232 @@
+"""
+SQL instrumentation for the connections handed out by database.get_db.
+
+Every statement run through an InstrumentedCursor is timed (execute plus
+fetching its rows), counted and attributed to the Flask endpoint that ran
+it. Statements slower than SLOW_QUERY_MS are logged together with their
+EXPLAIN QUERY PLAN, and per-statement latency percentiles are available
+from snapshot() for the admin stats endpoint.
+
+Off by default (normalizing and timing every statement costs CPU on every
+request); set QUERY_STATS_ENABLED=1 while profiling.
+"""
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+
+QUERY_STATS_ENABLED = os.environ.get('QUERY_STATS_ENABLED', '0') != '0'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+QUERY_STATS_SAMPLES = 1000 # Latency samples kept per normalized statement
+
+slow_query_logger = logging.getLogger('slow_query')
+
+_context = threading.local()
+_stats_lock = threading.Lock()
+_stats = {}
+
+_SQL_COMMENT = re.compile(r'--[^\n]*')
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+_EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def set_endpoint(endpoint):
+    """Attribute the statements run by this thread to a request endpoint (None to clear)"""
+    _context.endpoint = endpoint
+
+
+def normalize_sql(sql):
+    """Collapse literals, placeholder lists and whitespace so equivalent statements share one entry"""
+    sql = _SQL_COMMENT.sub(' ', sql)
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _PLACEHOLDER_LIST.sub('(?, ...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def _explain(connection, sql, params):
+    """EXPLAIN QUERY PLAN for one statement, as 'detail' lines (uninstrumented cursor)"""
+    if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+        return None
+    try:
+        rows = sqlite3.Cursor(connection).execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+        return [row[3] for row in rows]
+    except sqlite3.Error as e:
+        return [f"(plan unavailable: {e})"]
+
+
+def record(connection, sql, params, duration_ms, rows):
+    """Add one finished statement to the stats and log it if it was slow"""
+    endpoint = getattr(_context, 'endpoint', None)
+    key = normalize_sql(sql)
+    with _stats_lock:
+        entry = _stats.get(key)
+        if entry is None:
+            entry = _stats[key] = {
+                'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0, 'slow': 0,
+                'samples': deque(maxlen=QUERY_STATS_SAMPLES), 'endpoints': Counter(), 'plan': None
+            }
+        entry['count'] += 1
+        entry['total_ms'] += duration_ms
+        entry['max_ms'] = max(entry['max_ms'], duration_ms)
+        entry['rows'] += max(rows, 0)
+        entry['samples'].append(duration_ms)
+        entry['endpoints'][endpoint or '-'] += 1
+        is_slow = duration_ms >= SLOW_QUERY_MS
+        if is_slow:
+            entry['slow'] += 1
+        needs_plan = is_slow and entry['plan'] is None
+
+    if is_slow:
+        if needs_plan:
+            plan = _explain(connection, sql, params) # Outside the lock: runs a statement
+            with _stats_lock:
+                entry['plan'] = plan
+        else:
+            with _stats_lock:
+                plan = entry['plan']
+        slow_query_logger.warning(
+            f"Slow query ({duration_ms:.1f} ms, {rows} rows, endpoint {endpoint or '-'}): {key}"
+            + (''.join(f"\n    PLAN: {line}" for line in plan) if plan else '')
+        )
+
+
+def _percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(round(fraction * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def snapshot():
+    """Aggregated stats per normalized statement, slowest total time first"""
+    with _stats_lock:
+        entries = [(key, dict(entry, samples=sorted(entry['samples']), endpoints=dict(entry['endpoints'])))
+                   for key, entry in _stats.items()]
+    result = []
+    for key, entry in entries:
+        samples = entry['samples']
+        result.append({
+            'statement': key,
+            'count': entry['count'],
+            'total_ms': round(entry['total_ms'], 3),
+            'mean_ms': round(entry['total_ms'] / entry['count'], 3) if entry['count'] else 0.0,
+            'p50_ms': round(_percentile(samples, 0.50), 3),
+            'p95_ms': round(_percentile(samples, 0.95), 3),
+            'p99_ms': round(_percentile(samples, 0.99), 3),
+            'max_ms': round(entry['max_ms'], 3),
+            'rows': entry['rows'],
+            'slow_count': entry['slow'],
+            'endpoints': entry['endpoints'],
+            'plan': entry['plan']
+        })
+    result.sort(key=lambda item: item['total_ms'], reverse=True)
+    return result
+
+
+def reset():
+    with _stats_lock:
+        _stats.clear()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    sqlite3 cursor that times each statement from execute() until its rows
+    have been fetched (or the next statement starts) and reports it via record().
+    """
+
+    def _finish(self):
+        pending = getattr(self, '_pending', None)
+        if pending is None:
+            return
+        self._pending = None
+        sql, params, elapsed, rows = pending
+        if rows < 0:
+            rows = max(self.rowcount, 0) # Statements that return no rows (INSERT/UPDATE/DELETE)
+        record(self.connection, sql, params, elapsed * 1000, rows)
+
+    def _timed(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._pending[2] += time.perf_counter() - started
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        self._pending = [sql, parameters, 0.0, -1]
+        try:
+            self._timed(super().execute, sql, parameters)
+        except BaseException:
+            self._pending = None # A failed statement is not recorded (nor by the next call)
+            raise
+        if self.description is not None:
+            self._pending[3] = 0 # SELECT-like: count rows as they are fetched
+        else:
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        seq_of_parameters = list(seq_of_parameters)
+        self._pending = [sql, seq_of_parameters[0] if seq_of_parameters else (), 0.0, -1]
+        try:
+            self._timed(super().executemany, sql, seq_of_parameters)
+        except BaseException:
+            self._pending = None
+            raise
+        self._finish()
+        return self
+
+    def fetchone(self):
+        if getattr(self, '_pending', None) is None:
+            return super().fetchone()
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        else:
+            self._pending[3] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        if getattr(self, '_pending', None) is None:
+            return super().fetchmany(size if size is not None else self.arraysize)
+        size = size if size is not None else self.arraysize
+        rows = self._timed(super().fetchmany, size)
+        self._pending[3] += len(rows)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        if getattr(self, '_pending', None) is None:
+            return super().fetchall()
+        rows = self._timed(super().fetchall)
+        self._pending[3] += len(rows)
+        self._finish()
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
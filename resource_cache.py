@@ -0,0 +1,193 @@
+"""
+Per-worker cache of decoded data_points rows.
+
+Every approved resource is held once as a ResourceRecord with its JSON
+columns (metadata, countries, domains) already decoded. The cache is
+updated only when database.get_catalog_version() changes, so listing,
+detail and graph endpoints stop paying json.loads and dict allocation
+per row per request. An update re-reads just the rows named in
+database.get_catalog_changes; the whole catalog is loaded again only when
+that log does not reach back far enough.
+"""
+import json
+import logging
+import threading
+from collections import namedtuple
+
+from database import get_db, get_catalog_version, get_catalog_changes
+
+# Columns of data_points, in table order
+RESOURCE_COLUMNS = (
+    'id', 'data_source_id', 'resource_type', 'category', 'subcategory', 'data_type', 'level5',
+    'year_start', 'year_end', 'data_format', 'data_resolution', 'repository', 'repository_url',
+    'data_description', 'keywords', 'last_updated', 'contact_information', 'metadata',
+    'created_at', 'countries', 'domains'
+)
+
+# Above this many changed ids a full reload is cheaper than a patch
+RESOURCE_CACHE_PATCH_MAX = 5000
+# Ids per "WHERE id IN (...)" when re-reading changed rows
+RESOURCE_CACHE_PATCH_CHUNK = 500
+
+# Computed fields a client may request next to the columns (see ResourceRecord.project)
+DESCRIPTION_PREVIEW_CHARS = 160
+DERIVED_FIELDS = ('title', 'countries_list', 'domains_list', 'description_preview')
+PROJECTABLE_FIELDS = RESOURCE_COLUMNS + DERIVED_FIELDS
+
+
+def _decode_json(text, default, data_source_id, column):
+    if not text:
+        return default
+    try:
+        return json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        logging.warning(f"Invalid {column} JSON for {data_source_id}")
+        return default
+
+
+class ResourceRecord:
+    """
+    One approved resource with its JSON columns decoded.
+    Column values keep their database names (templates and JSON output use them),
+    decoded values live in metadata_obj, countries_list and domains_list.
+    Treat records as read-only: they are shared between requests.
+    """
+    __slots__ = RESOURCE_COLUMNS + ('metadata_obj', 'countries_list', 'domains_list', 'title')
+
+    def __init__(self, row):
+        for column in RESOURCE_COLUMNS:
+            setattr(self, column, row[column])
+        self.metadata_obj = _decode_json(self.metadata, {}, self.data_source_id, 'metadata')
+        if not isinstance(self.metadata_obj, dict):
+            self.metadata_obj = {}
+        self.countries_list = _decode_json(self.countries, [], self.data_source_id, 'countries')
+        self.domains_list = _decode_json(self.domains, [], self.data_source_id, 'domains')
+        self.title = self.metadata_obj.get('title') or self.data_source_id
+
+    def __getitem__(self, key):
+        """dict-style access so code written for row dicts keeps working"""
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def to_dict(self):
+        """The raw row, as dict(sqlite3.Row) used to return"""
+        return {column: getattr(self, column) for column in RESOURCE_COLUMNS}
+
+    @property
+    def description_preview(self):
+        """Start of data_description, enough for a result card"""
+        text = self.data_description or ''
+        if len(text) <= DESCRIPTION_PREVIEW_CHARS:
+            return text
+        return text[:DESCRIPTION_PREVIEW_CHARS].rsplit(' ', 1)[0] + '…'
+
+    def project(self, fields):
+        """Only the requested fields (names from PROJECTABLE_FIELDS), as a dict"""
+        return {field: getattr(self, field) for field in fields}
+
+    def to_api_dict(self):
+        """Row plus decoded country/domain lists (shape of /api/filter-resources items)"""
+        result = self.to_dict()
+        result['countries_list'] = self.countries_list
+        result['domains_list'] = self.domains_list
+        return result
+
+
+class CacheState(namedtuple('CacheState', 'version records by_id by_source_id')):
+    """One consistent load of the catalog: records newest first plus lookups by id and data_source_id"""
+    __slots__ = ()
+
+
+class ResourceCache:
+    """All ResourceRecords of this worker, keyed by id and data_source_id."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Replaced as a whole on reload, so readers never see a half-built cache
+        self._state = CacheState(None, (), {}, {})
+
+    def _load(self, version):
+        conn = get_db()
+        c = conn.cursor()
+        c.execute(f"SELECT {', '.join(RESOURCE_COLUMNS)} FROM data_points ORDER BY created_at DESC, id DESC")
+        records = tuple(ResourceRecord(row) for row in c.fetchall())
+        conn.close()
+        self._state = CacheState(
+            version, records,
+            {record.id: record for record in records},
+            {record.data_source_id: record for record in records}
+        )
+        logging.info(f"Resource cache loaded {len(records)} records (catalog version {version})")
+
+    def _patch(self, version, changed_ids):
+        """Re-read only the changed rows; deleted ones drop out"""
+        state = self._state
+        by_id = dict(state.by_id)
+        for data_id in changed_ids:
+            by_id.pop(data_id, None)
+        changed_ids = sorted(changed_ids)
+        conn = get_db()
+        c = conn.cursor()
+        for start in range(0, len(changed_ids), RESOURCE_CACHE_PATCH_CHUNK):
+            chunk = changed_ids[start:start + RESOURCE_CACHE_PATCH_CHUNK]
+            c.execute(f"SELECT {', '.join(RESOURCE_COLUMNS)} FROM data_points WHERE id IN ({','.join('?' for _ in chunk)})",
+                      chunk)
+            for row in c.fetchall():
+                by_id[row['id']] = ResourceRecord(row)
+        conn.close()
+        # Same order as _load: newest first
+        records = tuple(sorted(by_id.values(), key=lambda record: (record.created_at, record.id), reverse=True))
+        self._state = CacheState(version, records, by_id, {record.data_source_id: record for record in records})
+        logging.info(f"Resource cache patched {len(changed_ids)} records (catalog version {version})")
+
+    def refresh(self, force=False):
+        """Bring the cache to the current catalog version; returns that version"""
+        version = get_catalog_version()
+        if force or version != self._state.version:
+            with self._lock:
+                if force or version != self._state.version:
+                    changes = None
+                    if not force and self._state.version is not None:
+                        complete, rows = get_catalog_changes(self._state.version, version)
+                        if complete:
+                            changes = {data_id for _, data_id, _ in rows}
+                    if changes is not None and len(changes) <= RESOURCE_CACHE_PATCH_MAX:
+                        self._patch(version, changes)
+                    else:
+                        self._load(version)
+        return self._state.version
+
+    @property
+    def version(self):
+        return self.refresh()
+
+    def snapshot(self):
+        """The current CacheState (version and records that belong together)"""
+        self.refresh()
+        return self._state
+
+    def all(self):
+        """Every record, newest first"""
+        return self.snapshot().records
+
+    def get(self, data_id):
+        return self.snapshot().by_id.get(data_id)
+
+    def get_by_source_id(self, data_source_id):
+        return self.snapshot().by_source_id.get(data_source_id)
+
+    def many(self, data_ids):
+        """Records for ids returned by a SQL query, in the same order"""
+        by_id = self.snapshot().by_id
+        if any(data_id not in by_id for data_id in data_ids):
+            # The query saw a commit the cache has not loaded yet
+            self.refresh(force=True)
+            by_id = self._state.by_id
+        return [by_id[data_id] for data_id in data_ids if data_id in by_id]
+
+
+resource_cache = ResourceCache()
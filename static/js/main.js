@@ -280,6 +280,12 @@ function setupModal() {
     };
 }
 
+// Fields the result cards and the sidebar hierarchy need (full rows stay on the server)
+const RESULT_CARD_FIELDS = [
+    'data_source_id', 'title', 'description_preview', 'resource_type', 'category',
+    'subcategory', 'data_type', 'level5', 'countries_list', 'domains_list'
+];
+
 function filterAndDisplayResults(selectedCategories) {
     // Fetch data from the server
     fetch('/api/filter-resources', {
@@ -287,10 +293,11 @@ function filterAndDisplayResults(selectedCategories) {
         headers: {
             'Content-Type': 'application/json',
         },
-        body: JSON.stringify(selectedCategories)
+        body: JSON.stringify({ ...selectedCategories, fields: RESULT_CARD_FIELDS })
     })
     .then(response => response.json())
-    .then(data => {
+    .then(page => {
+        const data = page.items;
         displayResults(data);
         updateResultsCount(data);
         displayActiveFilters(selectedCategories);
@@ -333,8 +340,8 @@ function displayResults(data) {
             console.error('Failed to parse metadata:', e);
         }
 
-        const title = metadata.title || resource.data_source_id;
-        const description = (metadata.description || resource.data_description || 'No description available.').substring(0, 120) + '...';
+        const title = resource.title || metadata.title || resource.data_source_id;
+        const description = (metadata.description || resource.description_preview || resource.data_description || 'No description available.').substring(0, 120) + '...';
         const countriesDisplay = Array.isArray(resource.countries_list) ? resource.countries_list.join(', ') : 'N/A';
         const domainsDisplay = Array.isArray(resource.domains_list) ? resource.domains_list.join(', ') : 'N/A';
 
@@ -1033,220 +1040,99 @@ function initializeTree(targetId) {
     }
 }
 
-// Fetch country data and build tree
-function fetchAndBuildCountryTree(container) {
-    // First get the main categories
-    fetch('/api/main-categories')
-        .then(response => response.json())
-        .then(data => {
-            const countries = data.Country;
-            
-            // Create a resource tree element
-            const treeElement = document.createElement('div');
-            treeElement.className = 'resource-tree';
-            
-            // Add each country as a top-level node
-            countries.forEach(country => {
-                const countryNode = createTreeNode(country, 'country');
-                
-                // Fetch resources for this country and add sub-categories
-                fetch('/api/filter-resources', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify({ countries: [country] })
-                })
-                .then(response => response.json())
-                .then(resources => {
-                    // Create domain sub-nodes
-                    const domains = [...new Set(resources.map(r => r.domain))];
-                    
-                    // Update the count badge
-                    countryNode.querySelector('.node-count').textContent = resources.length;
-                    
-                    // If there are resources, make the node expandable
-                    if (resources.length > 0) {
-                        const childContainer = document.createElement('div');
-                        childContainer.className = 'child-nodes';
-                        
-                        domains.forEach(domain => {
-                            const domainResources = resources.filter(r => r.domain === domain);
-                            const domainNode = createTreeNode(domain, 'domain', domainResources.length);
-                            
-                            // Add resource type level
-                            const resourceTypes = [...new Set(domainResources.map(r => r.resource_type))];
-                            const typeContainer = document.createElement('div');
-                            typeContainer.className = 'child-nodes';
-                            
-                            resourceTypes.forEach(type => {
-                                const typeResources = domainResources.filter(r => r.resource_type === type);
-                                const typeNode = createTreeNode(type, 'resource-type', typeResources.length);
-                                
-                                // Make the type node link to filtered results
-                                typeNode.querySelector('.node-content').addEventListener('click', function(e) {
-                                    e.stopPropagation();
-                                    filterAndShowResults([country], [domain], [type]);
-                                });
-                                
-                                typeContainer.appendChild(typeNode);
-                            });
-                            
-                            domainNode.appendChild(typeContainer);
-                            domainNode.querySelector('.node-content').addEventListener('click', function(e) {
-                                e.stopPropagation();
-                                toggleNode(this.parentNode);
-                            });
-                            
-                            childContainer.appendChild(domainNode);
-                        });
-                        
-                        countryNode.appendChild(childContainer);
-                        countryNode.querySelector('.node-content').addEventListener('click', function() {
-                            toggleNode(this.parentNode);
-                        });
-                    }
-                });
-                
-                treeElement.appendChild(countryNode);
+// All explorer trees (country, domain, hierarchy) come from one /api/tree request:
+// grouped on the server, with counts and {id, data_source_id, title} stubs at the leaves
+let resourceTreesPromise = null;
+function fetchResourceTrees() {
+    if (!resourceTreesPromise) {
+        resourceTreesPromise = fetch('/api/tree')
+            .then(response => response.json())
+            .catch(error => {
+                console.error('Error fetching resource trees:', error);
+                resourceTreesPromise = null; // Retry on the next tree
+                return { country: [], domain: [], hierarchy: [] };
             });
-            
-            container.appendChild(treeElement);
+    }
+    return resourceTreesPromise;
+}
+
+// Header element of a node made by createTreeNode
+function treeNodeHeader(node) {
+    return node.firstElementChild;
+}
+
+// Leaf stubs under a tree node: clicking one opens the resource details
+function appendResourceStubs(container, resources) {
+    resources.forEach(resource => {
+        const stubNode = createTreeNode(resource.title, 'leafnode resource-stub');
+        stubNode.dataset.resourceId = resource.data_source_id;
+        const countElement = treeNodeHeader(stubNode).querySelector('.count');
+        if (countElement) {
+            countElement.remove();
+        }
+        treeNodeHeader(stubNode).addEventListener('click', function(e) {
+            e.stopPropagation();
+            showResourceDetails(resource.data_source_id);
         });
+        container.appendChild(stubNode);
+    });
 }
 
-// Fetch domain data and build tree
-function fetchAndBuildDomainTree(container) {
-    fetch('/api/main-categories')
-        .then(response => response.json())
-        .then(data => {
-            const domains = data.Domain;
-            
-            const treeElement = document.createElement('div');
-            treeElement.className = 'resource-tree';
-            
-            domains.forEach(domain => {
-                const domainNode = createTreeNode(domain, 'domain');
-                
-                fetch('/api/filter-resources', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify({ domains: [domain] })
-                })
-                .then(response => response.json())
-                .then(resources => {
-                    // Update count
-                    domainNode.querySelector('.node-count').textContent = resources.length;
-                    
-                    if (resources.length > 0) {
-                        const childContainer = document.createElement('div');
-                        childContainer.className = 'child-nodes';
-                        
-                        // Group by resource type
-                        const resourceTypes = [...new Set(resources.map(r => r.resource_type))];
-                        
-                        resourceTypes.forEach(type => {
-                            const typeResources = resources.filter(r => r.resource_type === type);
-                            const typeNode = createTreeNode(type, 'resource-type', typeResources.length);
-                            
-                            // Add categories
-                            const categories = [...new Set(typeResources.map(r => r.category))];
-                            const categoryContainer = document.createElement('div');
-                            categoryContainer.className = 'child-nodes';
-                            
-                            categories.forEach(category => {
-                                const catResources = typeResources.filter(r => r.category === category);
-                                const catNode = createTreeNode(category, 'category', catResources.length);
-                                
-                                catNode.querySelector('.node-content').addEventListener('click', function(e) {
-                                    e.stopPropagation();
-                                    filterAndShowResults(null, [domain], [type], category);
-                                });
-                                
-                                categoryContainer.appendChild(catNode);
-                            });
-                            
-                            typeNode.appendChild(categoryContainer);
-                            typeNode.querySelector('.node-content').addEventListener('click', function(e) {
-                                e.stopPropagation();
-                                toggleNode(this.parentNode);
-                            });
-                            
-                            childContainer.appendChild(typeNode);
-                        });
-                        
-                        domainNode.appendChild(childContainer);
-                        domainNode.querySelector('.node-content').addEventListener('click', function() {
-                            toggleNode(this.parentNode);
-                        });
-                    }
-                });
-                
-                treeElement.appendChild(domainNode);
-            });
-            
-            container.appendChild(treeElement);
+// Render one /api/tree node and its subtree. cssClasses gives the class per depth;
+// onLeafGroup(path) runs when a node with resources but no child groups is clicked.
+function renderTreeNode(treeNode, depth, cssClasses, path, onLeafGroup) {
+    const nodePath = [...path, treeNode.name];
+    const hasChildren = treeNode.children.length > 0 || treeNode.resources.length > 0;
+    const cssClass = cssClasses[Math.min(depth, cssClasses.length - 1)];
+    const node = createTreeNode(formatCategoryName(treeNode.name), cssClass, treeNode.count, hasChildren);
+
+    if (hasChildren) {
+        const childContainer = document.createElement('div');
+        childContainer.className = 'child-nodes';
+        treeNode.children.forEach(child => {
+            childContainer.appendChild(renderTreeNode(child, depth + 1, cssClasses, nodePath, onLeafGroup));
         });
+        appendResourceStubs(childContainer, treeNode.resources);
+        node.appendChild(childContainer);
+    }
+
+    treeNodeHeader(node).addEventListener('click', function(e) {
+        e.stopPropagation();
+        if (treeNode.children.length === 0 && treeNode.resources.length > 0 && onLeafGroup) {
+            onLeafGroup(nodePath);
+        }
+        toggleNode(node);
+    });
+    return node;
 }
 
-// Build the resource type tree using the hierarchy data
-function fetchAndBuildTypeTree(container) {
-    fetch('/api/resource-hierarchy')
-        .then(response => response.json())
-        .then(hierarchy => {
-            const treeElement = document.createElement('div');
-            treeElement.className = 'resource-tree';
-            
-            // For each top level resource type
-            Object.keys(hierarchy).forEach(resourceType => {
-                const typeNode = createTreeNode(resourceType, 'resource-type');
-                
-                // Fetch resources for this type
-                fetch('/api/filter-resources', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify({ resourceTypes: [resourceType] })
-                })
-                .then(response => response.json())
-                .then(resources => {
-                    // Update count
-                    typeNode.querySelector('.node-count').textContent = resources.length;
-                    
-                    // Always build the hierarchy even if no resources
-                    if (hierarchy[resourceType].sub_categories) {
-                        const childContainer = document.createElement('div');
-                        childContainer.className = 'child-nodes';
-                        
-                        // Add categories from the hierarchy
-                        Object.keys(hierarchy[resourceType].sub_categories).forEach(category => {
-                            const catResources = resources.filter(r => r.category === category);
-                            const catNode = createTreeNode(formatCategoryName(category), 'category', catResources.length);
-                            
-                            // Add subcategories if available - always show them regardless of resources
-                            const subCategories = hierarchy[resourceType].sub_categories[category];
-                            
-                            // Process this category's subcategories recursively
-                            processDeepHierarchy(subCategories, catNode, resourceType, category, resources);
-                            
-                            childContainer.appendChild(catNode);
-                        });
-                        
-                        typeNode.appendChild(childContainer);
-                        typeNode.querySelector('.node-content').addEventListener('click', function() {
-                            toggleNode(this.parentNode);
-                        });
-                    }
-                });
-                
-                treeElement.appendChild(typeNode);
-            });
-            
-            container.appendChild(treeElement);
+function buildTreeFromApi(container, treeName, cssClasses, onLeafGroup) {
+    fetchResourceTrees().then(trees => {
+        const treeElement = document.createElement('div');
+        treeElement.className = 'resource-tree';
+        (trees[treeName] || []).forEach(treeNode => {
+            treeElement.appendChild(renderTreeNode(treeNode, 0, cssClasses, [], onLeafGroup));
         });
+        container.appendChild(treeElement);
+    });
+}
+
+// Country -> domain -> resource type
+function fetchAndBuildCountryTree(container) {
+    buildTreeFromApi(container, 'country', ['country', 'domain', 'resource-type'],
+        ([country, domain, type]) => filterAndShowResults([country], [domain], [type]));
+}
+
+// Domain -> resource type -> category
+function fetchAndBuildDomainTree(container) {
+    buildTreeFromApi(container, 'domain', ['domain', 'resource-type', 'category'],
+        ([domain, type, category]) => filterAndShowResults(null, [domain], [type], category === 'uncategorized' ? null : category));
+}
+
+// Full vocabulary hierarchy (levels 1-5), including nodes without resources
+function fetchAndBuildTypeTree(container) {
+    buildTreeFromApi(container, 'hierarchy', ['level-1', 'level-2', 'level-3', 'level-4', 'level-5'],
+        ([type, category, subcategory]) => filterAndShowResults(null, null, [type], category || null, subcategory || null));
 }
 
 // Toggle node expansion
@@ -1457,6 +1343,150 @@ function updateColorOpacity(colorProperty, opacity) {
 }
 
 
+// --- NEW: Compact network graph format ---
+const NETWORK_LOD = 'leaf'; // Large groups of resources arrive as cluster nodes, expanded on double-click
+const NETWORK_DATA_URL = `/api/network-data?format=compact&lod=${NETWORK_LOD}`;
+const COMPACT_NODE_COLUMNS = ['id', 'label', 'title', 'x', 'y', 'dataSourceId'];
+
+// Turn a ?format=compact payload (parallel arrays + style tables) back into vis nodes/edges
+function decodeCompactGraph(data) {
+    if (!data || data.format !== 'compact') {
+        return data; // Already {nodes, edges} (or nothing to decode)
+    }
+    const columns = data.nodes;
+    const nodes = columns.id.map((id, i) => {
+        // Each node gets its own copy of the style, vis updates nodes in place
+        const node = structuredClone(data.nodeStyles[columns.style[i]]);
+        COMPACT_NODE_COLUMNS.forEach(column => {
+            const value = columns[column][i];
+            if (value !== null && value !== undefined) {
+                node[column] = value;
+            }
+        });
+        return node;
+    });
+    const edges = data.edges.from.map((fromIndex, i) => {
+        const from = columns.id[fromIndex];
+        const to = columns.id[data.edges.to[i]];
+        // Same "from->to" ids as the server, so delta updates can address them
+        return Object.assign(structuredClone(data.edgeStyles[data.edges.style[i]]), { id: `${from}->${to}`, from: from, to: to });
+    });
+    return { nodes: nodes, edges: edges };
+}
+
+
+// --- NEW: Incremental network graph updates ---
+const NETWORK_UPDATE_INTERVAL_MS = 60000;
+let networkGraphVersion = null; // Catalog version the displayed graph reflects (set by loads, reloads and deltas)
+
+// Apply a /api/network-data/changes delta to the graph DataSets in place
+function applyNetworkGraphChanges(nodes, edges, delta) {
+    // Updated points get their edges re-sent, removed points lose them
+    const stale = new Set([...delta.updated, ...delta.removed]);
+    if (stale.size > 0) {
+        edges.remove(edges.getIds({ filter: edge => stale.has(edge.from) || stale.has(edge.to) }));
+    }
+    nodes.remove(delta.removed);
+    nodes.update(delta.nodes);
+    edges.update(delta.edges);
+
+    // Country/domain nodes no resource links to any more
+    const linked = new Set(edges.map(edge => edge.to));
+    nodes.remove(nodes.getIds({
+        filter: node => (node.group === 'country_node' || node.group === 'domain_node') && !linked.has(node.id)
+    }));
+}
+
+// Replace a cluster node by the resources it stands for
+function expandNetworkCluster(nodes, edges, clusterId) {
+    return fetch(`/api/network-data/expand?node=${encodeURIComponent(clusterId)}&lod=${NETWORK_LOD}`)
+        .then(response => {
+            if (response.status === 404) {
+                return reloadNetworkGraph(nodes, edges).then(() => null); // Catalog changed, cluster is gone
+            }
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(data => {
+            if (!data) {
+                return;
+            }
+            edges.remove(edges.getIds({ filter: edge => edge.from === clusterId || edge.to === clusterId }));
+            nodes.remove(clusterId);
+            nodes.update(data.nodes);
+            edges.update(data.edges);
+        });
+}
+
+// Replace the whole graph (the server could not produce a delta)
+function reloadNetworkGraph(nodes, edges) {
+    let version = null;
+    return fetch(NETWORK_DATA_URL)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            version = parseInt(response.headers.get('X-Catalog-Version'), 10);
+            return response.json();
+        })
+        .then(decodeCompactGraph)
+        .then(data => {
+            nodes.clear();
+            edges.clear();
+            nodes.add(data.nodes);
+            edges.add(data.edges);
+            if (Number.isFinite(version)) {
+                networkGraphVersion = version; // The watcher continues from here
+            }
+            return version;
+        });
+}
+
+// Poll for catalog changes while the page is visible
+function watchNetworkGraphChanges(nodes, edges, version) {
+    if (!Number.isFinite(version)) {
+        return;
+    }
+    networkGraphVersion = version;
+    let inFlight = false;
+    setInterval(() => {
+        if (inFlight || document.visibilityState !== 'visible') {
+            return;
+        }
+        inFlight = true;
+        const since = networkGraphVersion;
+        fetch(`/api/network-data/changes?since=${since}`)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+                return response.json();
+            })
+            .then(delta => {
+                if (networkGraphVersion !== since) {
+                    return; // Reloaded meanwhile (e.g. by a cluster expansion); the delta is stale
+                }
+                if (delta.reset) {
+                    return reloadNetworkGraph(nodes, edges);
+                }
+                // Changed resources may sit inside a cluster; the clustered graph is small, reload it
+                const changed = delta.added.length + delta.updated.length + delta.removed.length > 0;
+                if (changed && nodes.getIds({ filter: node => node.group === 'cluster' }).length > 0) {
+                    return reloadNetworkGraph(nodes, edges);
+                }
+                if (delta.version !== since) {
+                    applyNetworkGraphChanges(nodes, edges, delta);
+                    networkGraphVersion = delta.version;
+                }
+            })
+            .catch(error => console.error('Error updating network graph:', error))
+            .finally(() => { inFlight = false; });
+    }, NETWORK_UPDATE_INTERVAL_MS);
+}
+
+
 // --- Updated Function for Physics-Based Network Graph ---
 function setupNetworkGraph() {
     const container = document.getElementById('network-graph-container');
@@ -1474,13 +1504,16 @@ function setupNetworkGraph() {
         return;
     }
 
-    fetch('/api/network-data')
+    let graphVersion = null;
+    fetch(NETWORK_DATA_URL)
         .then(response => {
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
+            graphVersion = parseInt(response.headers.get('X-Catalog-Version'), 10);
             return response.json();
         })
+        .then(decodeCompactGraph)
         .then(data => {
             if (loadingIndicator) loadingIndicator.style.display = 'none'; // Hide loading indicator
 
@@ -1492,6 +1525,8 @@ function setupNetworkGraph() {
 
             const nodes = new vis.DataSet(data.nodes);
             const edges = new vis.DataSet(data.edges);
+            // The server sends a precomputed layout (x/y per node): draw it as is, no physics
+            const positioned = data.nodes.length > 0 && data.nodes.every(node => Number.isFinite(node.x) && Number.isFinite(node.y));
 
             const options = {
                 nodes: {
@@ -1534,7 +1569,7 @@ function setupNetworkGraph() {
                     },
                     smooth: {
                         enabled: true,
-                        type: "dynamic",
+                        type: positioned ? "continuous" : "dynamic", // Dynamic edges need physics
                         roundness: 0.5
                     },
                     hoverWidth: 1.5,
@@ -1545,7 +1580,7 @@ function setupNetworkGraph() {
                     }
                 },
                 physics: {
-                    enabled: true,
+                    enabled: !positioned,
                     solver: 'forceAtlas2Based',
                     forceAtlas2Based: {
                         gravitationalConstant: -50,
@@ -1681,6 +1716,12 @@ function setupNetworkGraph() {
                     const clickedNodeId = params.nodes[0];
                     const nodeData = nodes.get(clickedNodeId); // Get data for the double-clicked node
 
+                    if (nodeData && nodeData.group === 'cluster') {
+                        expandNetworkCluster(nodes, edges, clickedNodeId)
+                            .catch(error => console.error('Error expanding cluster:', error));
+                        return;
+                    }
+
                     // Check if it's a data point node and has the necessary ID
                     if (nodeData && nodeData.group === 'data_point' && nodeData.dataSourceId) {
                         if (typeof showResourceDetails === 'function') {
@@ -1700,12 +1741,18 @@ function setupNetworkGraph() {
             network.on("zoom", hideHint);
             network.on("dragStart", hideHint);
 
+            if (positioned) {
+                network.fit();
+            }
+
             // Disable physics after stabilization for static, faster graph
             network.on("stabilizationIterationsDone", function () {
                 console.log("Network stabilized, disabling physics for static display.");
                 network.setOptions({ physics: { enabled: false } });
             });
 
+            // Keep the graph current without reloading it
+            watchNetworkGraphChanges(nodes, edges, graphVersion);
         })
         .catch(error => {
             console.error('Error fetching or processing network data:', error);
@@ -0,0 +1,103 @@
+"""
+Shared fixtures. The database module is pointed at a temporary file before
+app is imported (app runs init_db() at import time), and the working
+directory is the repository root, where structure_tree.yaml is read from.
+"""
+import itertools
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.chdir(REPO_ROOT)
+
+import database  # noqa: E402
+from resource_cache import ResourceCache  # noqa: E402
+
+database.DB_PATH = os.path.join(tempfile.mkdtemp(prefix='nomoreamr_tests_'), 'amr.db')
+
+_resource_numbers = itertools.count()
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    import app
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def admin_client(client):
+    with client.session_transaction() as session:
+        session['is_admin'] = True
+    return client
+
+
+@pytest.fixture
+def add_submission():
+    """add_submission(title, url, **columns) -> submission_id of a pending submission"""
+    def add(title, url, **columns):
+        submission = {
+            'resource_name': title,
+            'countries': '["Sweden"]',
+            'domains': '["Human"]',
+            'primary_hierarchy_path': '{"resource_type": "Data", "category": "omics_data"}',
+            'resource_url': url,
+            'related_metadata': '[]',
+            'related_resources': '[]',
+        }
+        submission.update(columns)
+        submission_id = database.add_pending_submission(submission)
+        assert submission_id, "add_pending_submission failed"
+        return submission_id
+    return add
+
+
+@pytest.fixture
+def add_resource(app_module):
+    """add_resource(title, countries, domains, path=(...), **columns) -> data_points.id"""
+    def add(title, countries, domains, path=('Data', 'omics_data', 'genomic', 'whole_genome_sequencing', None),
+            keywords='amr', year_start=2015, year_end=2020):
+        number = next(_resource_numbers)
+        metadata = json.dumps({'title': title, 'institution': 'Unknown'})
+        data_source_id = database.add_data_point((
+            None, *path, year_start, year_end, None, None, 'example.org', f'https://example.org/{number}',
+            'Test resource', keywords, '2024-01-01', None, metadata, json.dumps(countries), json.dumps(domains)
+        ))
+        assert data_source_id, "add_data_point failed"
+        return database.get_data_point_by_source_id(data_source_id)['id']
+    return add
+
+
+@pytest.fixture
+def patch_checker():
+    """
+    patch_checker(index_cls, state) -> (index, check) for a per-worker index
+    (FacetIndex, TrigramIndex) over its own resource cache. The index is built
+    once, after which a full rebuild fails the test; check() refreshes it and
+    asserts state(index) equals the state of an index built from scratch.
+    """
+    def make(index_cls, state):
+        index = index_cls(ResourceCache())
+        index.refresh()
+
+        def no_rebuild(cache_state):
+            raise AssertionError("expected a patch, got a full rebuild")
+        index._rebuild = no_rebuild
+
+        def check():
+            index.refresh()
+            fresh = index_cls(ResourceCache())
+            fresh.refresh()
+            assert fresh._version == index._version
+            assert state(index) == state(fresh)
+        return index, check
+    return make
@@ -0,0 +1,47 @@
+import database
+
+
+def edge_set(edges):
+    return {(edge['from'], edge['to']) for edge in edges}
+
+
+def test_delta_patches_old_graph_into_new(client, add_resource):
+    updated = add_resource('Slovenian isolates', ['Slovenia'], ['Human'])
+    removed = add_resource('Slovenian farms', ['Slovenia'], ['Animal'])
+    old = client.get('/api/network-data')
+    since = int(old.headers['X-Catalog-Version'])
+    old_graph = old.get_json()
+
+    added = add_resource('Slovak wastewater', ['Slovakia'], ['Environment'])
+    assert database.update_data_point(updated, {'domains': '["Animal"]', 'countries': '["Slovakia"]'})
+    assert database.delete_data_point(removed)
+    transient = add_resource('Short-lived entry', ['Slovakia'], ['Human'])
+    assert database.delete_data_point(transient)
+
+    delta = client.get(f'/api/network-data/changes?since={since}').get_json()
+    assert delta['reset'] is False and delta['since'] == since
+    assert delta['added'] == [f'dp_{added}']
+    assert delta['updated'] == [f'dp_{updated}']
+    assert delta['removed'] == [f'dp_{removed}'] # Inserted and deleted within the window: not sent at all
+    assert all('x' in node for node in delta['nodes'])
+
+    # Apply it the way main.js does and compare with the graph of the new version
+    touched = set(delta['updated']) | set(delta['removed'])
+    nodes = {node['id'] for node in old_graph['nodes']} - set(delta['removed'])
+    nodes |= {node['id'] for node in delta['nodes']}
+    edges = {edge for edge in edge_set(old_graph['edges']) if not touched & set(edge)} | edge_set(delta['edges'])
+    new = client.get('/api/network-data')
+    assert int(new.headers['X-Catalog-Version']) == delta['version']
+    new_graph = new.get_json()
+    assert {node_id for node_id in nodes if node_id.startswith('dp_')} == \
+        {node['id'] for node in new_graph['nodes'] if node['id'].startswith('dp_')}
+    assert edges == edge_set(new_graph['edges'])
+
+
+def test_delta_edge_cases(client):
+    version = database.get_catalog_version()
+    current = client.get(f'/api/network-data/changes?since={version}').get_json()
+    assert (current['added'], current['updated'], current['removed']) == ([], [], [])
+    assert client.get('/api/network-data/changes?since=-100').get_json()['reset'] is True
+    assert client.get(f'/api/network-data/changes?since={version + 1}').get_json()['reset'] is True
+    assert client.get('/api/network-data/changes').status_code == 400
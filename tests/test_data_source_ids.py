@@ -0,0 +1,40 @@
+import json
+import threading
+
+import database
+
+
+def test_concurrent_inserts_get_consecutive_ids(add_resource):
+    data_ids = []
+    errors = []
+
+    def insert():
+        try:
+            for _ in range(5):
+                data_ids.append(add_resource('Concurrent approval', ['Sweden'], ['Human'], year_end=1987))
+        except Exception as e: # Surfaced below; an exception in a thread would not fail the test
+            errors.append(e)
+        finally:
+            database.dispose_db()
+
+    threads = [threading.Thread(target=insert) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+    source_ids = {database.get_data_point_by_id(data_id)['data_source_id'] for data_id in data_ids}
+    assert source_ids == {'OMIC-UNKN-1987'} | {f'OMIC-UNKN-1987-{suffix}' for suffix in range(1, 40)}
+
+
+def test_bulk_insert_continues_after_existing_ids(add_resource):
+    add_resource('Existing resource', ['Norway'], ['Animal'], year_end=1988)
+    metadata = json.dumps({'title': 'Bulk resource', 'institution': 'Unknown'})
+    rows = [(None, 'Data', 'omics_data', 'genomic', 'whole_genome_sequencing', None, 2000, 1988, None, None,
+             'example.org', f'https://example.org/bulk/{number}', 'Bulk resource', 'amr', '2024-01-01', None,
+             metadata, '["Norway"]', '["Animal"]')
+            for number in range(3)]
+    summary = database.bulk_add_data_points(rows)
+    assert summary['inserted'] == 3
+    assert summary['data_source_ids'] == ['OMIC-UNKN-1988-1', 'OMIC-UNKN-1988-2', 'OMIC-UNKN-1988-3']
@@ -0,0 +1,80 @@
+import database
+from facet_index import FacetIndex
+
+
+def index_state(index):
+    return index._bitmaps, index._all, index._values_by_id
+
+
+def test_patch_matches_rebuild(add_resource, patch_checker):
+    first = add_resource('Swedish isolates', ['Sweden'], ['Human'])
+    second = add_resource('Danish surveillance', ['Denmark', 'Norway'], ['Animal'], path=('Systems', None, None, None, None))
+    index, check = patch_checker(FacetIndex, index_state)
+
+    added = add_resource('Finnish metagenomes', ['Finland'], ['Environment'],
+                         path=('Data', 'omics_data', 'metagenomic', 'wastewater_metagenomes', None))
+    check()
+
+    database.update_data_point(first, {'countries': '["Norway", "Iceland"]', 'domains': '["Animal"]'})
+    check()
+
+    database.update_data_point(added, {'category': None, 'subcategory': None, 'data_type': None, 'resource_type': 'Systems'})
+    check()
+
+    database.delete_data_point(second)
+    check()
+    assert second not in index._values_by_id
+    assert not index._all >> second & 1
+
+
+def test_counts_match_facet_counts_table(app_module, add_resource):
+    add_resource('Norwegian isolates', ['Norway'], ['Human'])
+    result = app_module.facet_index.query({})
+    stored = database.get_facet_counts()
+    assert result['counts'] == {facet: counts for facet, counts in stored.items()}
+
+
+def test_filter_resources_matches_sql(client, add_resource):
+    add_resource('Swedish wastewater', ['Sweden'], ['Environment'])
+    add_resource('Swedish clinics', ['Sweden', 'Denmark'], ['Human'], path=('Systems', None, None, None, None))
+    add_resource('Danish farms', ['Denmark'], ['Animal', 'Human'])
+    filters = [
+        {},
+        {'countries': ['Sweden']},
+        {'countries': ['Sweden', 'Denmark'], 'domains': ['Human']},
+        {'resourceTypes': ['Systems']},
+        {'domains': ['Animal'], 'resourceTypes': ['Data', 'Systems']},
+        {'countries': ['Atlantis']},
+    ]
+    conn = database.get_db()
+    for request_filters in filters:
+        # The query /api/filter-resources ran before the bitmap index
+        query = 'SELECT id FROM data_points WHERE 1=1'
+        params = []
+        if request_filters.get('countries'):
+            query += (' AND id IN (SELECT data_point_id FROM data_point_countries WHERE country IN ('
+                      + ','.join('?' * len(request_filters['countries'])) + '))')
+            params.extend(request_filters['countries'])
+        if request_filters.get('domains'):
+            query += (' AND id IN (SELECT data_point_id FROM data_point_domains WHERE domain IN ('
+                      + ','.join('?' * len(request_filters['domains'])) + '))')
+            params.extend(request_filters['domains'])
+        if request_filters.get('resourceTypes'):
+            query += ' AND resource_type IN (' + ','.join('?' * len(request_filters['resourceTypes'])) + ')'
+            params.extend(request_filters['resourceTypes'])
+        expected = [row[0] for row in conn.execute(query + ' ORDER BY id', params).fetchall()]
+
+        response = client.post('/api/filter-resources', json=request_filters)
+        assert response.status_code == 200
+        assert [item['id'] for item in response.get_json()] == expected
+    conn.close()
+
+
+def test_filter_values_must_be_lists_of_strings(client):
+    for filters in ({'countries': 'Sweden'}, {'domains': [1]}, {'resourceTypes': [['Data']]}, {'countries': {'Sweden': True}}):
+        response = client.post('/api/filter-resources', json=filters)
+        assert response.status_code == 400, filters
+        assert 'list of strings' in response.get_json()['error']
+    assert client.post('/api/filter-resources', json=['Sweden']).status_code == 400
+    assert client.post('/api/filter-resources', json={'countries': ['Sweden'], 'domains': None}).status_code == 200
+    assert client.get('/api/facets?country=Sweden&country=Norway').status_code == 200
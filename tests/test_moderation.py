@@ -0,0 +1,43 @@
+def by_submission(report):
+    return {result['submission_id']: result for result in report['results']}
+
+
+def test_batch_approve_reports_each_item(admin_client, add_submission):
+    good = add_submission('Batch approved', 'https://example.org/batch-approved')
+    no_countries = add_submission('No countries', 'https://example.org/batch-null', countries=None)
+    repeat = add_submission('Same URL twice', 'https://example.org/batch-approved')
+
+    response = admin_client.post('/admin/review/batch', json={
+        'action': 'approve', 'submission_ids': [good, no_countries, repeat, 999999]
+    })
+    assert response.status_code == 200
+    report = response.get_json()
+    results = by_submission(report)
+    assert [result['submission_id'] for result in report['results']] == [good, no_countries, repeat, 999999]
+    assert results[good]['status'] == 'approved' and results[good]['data_source_id']
+    assert results[no_countries]['status'] == 'invalid' # NULL column: one bad item, not a 500
+    assert results[repeat]['status'] == 'duplicate'
+    assert results[999999]['status'] == 'not_found'
+    assert report['counts'] == {'approved': 1, 'invalid': 1, 'duplicate': 1, 'not_found': 1}
+
+
+def test_batch_reject_only_changes_pending_submissions(admin_client, add_submission):
+    first = add_submission('Rejected once', 'https://example.org/batch-reject-1')
+    second = add_submission('Rejected in the second batch', 'https://example.org/batch-reject-2')
+
+    report = admin_client.post('/admin/review/batch', json={'action': 'reject', 'submission_ids': [first]}).get_json()
+    assert report['counts'] == {'rejected': 1}
+
+    report = admin_client.post('/admin/review/batch', json={'action': 'reject', 'submission_ids': [first, second]}).get_json()
+    results = by_submission(report)
+    assert results[first]['status'] == 'not_pending'
+    assert results[second]['status'] == 'rejected'
+    assert report['counts'] == {'not_pending': 1, 'rejected': 1}
+
+
+def test_review_page_lists_submissions_with_null_columns(admin_client, add_submission):
+    submission_id = add_submission('Null metadata', 'https://example.org/review-null',
+                                   related_metadata=None, primary_hierarchy_path=None)
+    response = admin_client.get('/admin/review')
+    assert response.status_code == 200
+    assert f'Submission #{submission_id} '.encode() in response.data
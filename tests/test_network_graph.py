@@ -0,0 +1,69 @@
+import database
+import network_graph
+
+
+def test_graph_built_once_per_version(monkeypatch, client, add_resource):
+    data_id = add_resource('Estonian ward isolates', ['Estonia'], ['Human'])
+    builds = []
+    real_build = network_graph.build_network_graph
+    def counting_build(records, hierarchy_graph, clusters=None):
+        builds.append(clusters is not None)
+        return real_build(records, hierarchy_graph, clusters)
+    monkeypatch.setattr(network_graph, 'build_network_graph', counting_build)
+
+    full = client.get('/api/network-data')
+    compact = client.get('/api/network-data?format=compact')
+    around = client.get(f'/api/network-data/neighborhood?node=dp_{data_id}')
+    assert full.status_code == compact.status_code == around.status_code == 200
+    assert f'dp_{data_id}' in {node['id'] for node in full.get_json()['nodes']}
+    assert all('x' in node for node in full.get_json()['nodes'])
+    assert builds == [False] # Layout, both formats and the neighborhood index share one build
+
+
+def test_removed_nodes_lose_stored_positions(client, add_resource):
+    data_id = add_resource('Latvian ward isolates', ['Latvia'], ['Human'])
+    client.get('/api/network-data')
+    node_id = f'dp_{data_id}'
+    assert node_id in database.get_graph_positions([node_id])
+
+    database.delete_data_point(data_id)
+    version = database.get_catalog_version()
+    # A worker still on the previous version must not prune
+    assert database.delete_stale_graph_positions([node_id], version - 1) == 0
+    client.get('/api/network-data')
+    assert database.get_graph_positions([node_id]) == {}
+
+
+def test_year_filtered_graph_matches_filter_resources(client, add_resource):
+    add_resource('Open-ended Lithuanian survey', ['Lithuania'], ['Human'], year_start=2012, year_end=None)
+    add_resource('Reversed Lithuanian survey', ['Lithuania'], ['Human'], year_start=2019, year_end=2014)
+    add_resource('Early Lithuanian survey', ['Lithuania'], ['Human'], year_start=2001, year_end=2003)
+    for year_from, year_to in ((2016, 2017), (2004, None), (None, 2002), (2030, 2040)):
+        filters = {'countries': ['Lithuania']}
+        query = 'countries=Lithuania'
+        if year_from is not None:
+            filters['yearFrom'] = year_from
+            query += f'&yearFrom={year_from}'
+        if year_to is not None:
+            filters['yearTo'] = year_to
+            query += f'&yearTo={year_to}'
+        expected = {f"dp_{item['id']}" for item in client.post('/api/filter-resources', json=filters).get_json()}
+        nodes = client.get(f'/api/network-data?{query}').get_json()['nodes']
+        assert {node['id'] for node in nodes if node['id'].startswith('dp_')} == expected, (year_from, year_to)
+
+
+def test_subtree_is_a_hierarchy_path_in_both_endpoints(client, add_resource):
+    add_resource('Maltese genomes', ['Malta'], ['Human'])
+    add_resource('Maltese metagenomes', ['Malta'], ['Environment'],
+                 path=('Data', 'omics_data', 'metagenomic', 'wastewater_metagenomes', None))
+    add_resource('Maltese system', ['Malta'], ['Human'], path=('Systems', None, None, None, None))
+    for subtree in ('Data', 'Data/omics_data/genomic', 'Systems'):
+        filters = {'countries': ['Malta'], 'subtree': subtree}
+        expected = {f"dp_{item['id']}" for item in client.post('/api/filter-resources', json=filters).get_json()}
+        assert expected, subtree
+        nodes = client.get(f'/api/network-data?countries=Malta&subtree={subtree}').get_json()['nodes']
+        assert {node['id'] for node in nodes if node['id'].startswith('dp_')} == expected, subtree
+
+    for subtree in ('Data/no_such_category', 'L1_Data'):
+        assert client.post('/api/filter-resources', json={'subtree': subtree}).status_code == 400
+        assert client.get(f'/api/network-data?subtree={subtree}').status_code == 400
@@ -0,0 +1,39 @@
+import database
+
+
+def find(nodes, *names):
+    """Node reached by following names down a /api/tree tree"""
+    for name in names:
+        nodes = [node for node in nodes if node['name'] == name]
+        assert nodes, names
+        node = nodes[0]
+        nodes = node['children']
+    return node
+
+
+def test_tree_counts_agree_with_facet_counts(client, add_resource):
+    add_resource('Sami reindeer isolates', ['Sweden', 'Norway'], ['Animal', 'Human'])
+    add_resource('Uncategorised Swedish system', ['Sweden'], ['Animal'], path=('Systems', None, None, None, None))
+    trees = client.get('/api/tree').get_json()
+    stored = database.get_facet_counts()
+
+    for country, count in stored['country'].items():
+        assert find(trees['country'], country)['count'] == count
+    for domain, count in stored['domain'].items():
+        assert find(trees['domain'], domain)['count'] == count
+    for facet in database.HIERARCHY_FACETS:
+        for path, count in stored[facet].items():
+            assert find(trees['hierarchy'], *path.split(database.FACET_PATH_SEPARATOR))['count'] == count
+
+    conn = database.get_db()
+    expected = conn.execute('''SELECT COUNT(*) FROM data_points d
+                               WHERE resource_type = 'Data'
+                                 AND id IN (SELECT data_point_id FROM data_point_countries WHERE country = 'Sweden')
+                                 AND id IN (SELECT data_point_id FROM data_point_domains WHERE domain = 'Animal')''').fetchone()[0]
+    uncategorized = conn.execute('''SELECT COUNT(*) FROM data_points
+                                    WHERE resource_type = 'Systems' AND category IS NULL
+                                      AND id IN (SELECT data_point_id FROM data_point_domains WHERE domain = 'Animal')''').fetchone()[0]
+    conn.close()
+    assert find(trees['country'], 'Sweden', 'Animal', 'Data')['count'] == expected
+    uncategorized_node = find(trees['domain'], 'Animal', 'Systems', 'uncategorized')
+    assert uncategorized_node['count'] == len(uncategorized_node['resources']) == uncategorized
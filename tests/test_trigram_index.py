@@ -0,0 +1,39 @@
+import database
+from resource_cache import ResourceCache
+from trigram_index import TrigramIndex
+
+
+def index_state(index):
+    return index._postings, index._term_trigrams, index._term_ids, index._terms_by_id
+
+
+def test_patch_matches_rebuild(add_resource, patch_checker):
+    first = add_resource('Wastewater metagenomes', ['Sweden'], ['Environment'], keywords='sewage,resistome')
+    second = add_resource('Clinical isolates', ['Norway'], ['Human'], keywords='hospital')
+    index, check = patch_checker(TrigramIndex, index_state)
+
+    add_resource('Pig farm surveillance', ['Denmark'], ['Animal'], keywords='livestock')
+    check()
+
+    database.update_data_point(first, {'keywords': 'influent', 'countries': '["Finland"]'})
+    check()
+    assert 'sewage' not in index._term_ids # Last resource with the word: pruned
+    assert not any('sewage' in terms for terms in index._postings.values())
+
+    database.delete_data_point(second)
+    check()
+    assert 'hospital' not in index._term_ids
+
+
+def test_search_tolerates_typos(add_resource):
+    wanted = add_resource('Swedish wastewater metagenomes', ['Sweden'], ['Environment'])
+    index = TrigramIndex(ResourceCache())
+    for query in ('Sweeden', 'metagenom', 'wastewatr metagenoms'):
+        assert wanted in [data_id for data_id, _ in index.search(query, limit=50)], query
+    assert index.search('zzzz') == []
+
+
+def test_search_resources_falls_back_to_fuzzy_matches(client, add_resource):
+    add_resource('Icelandic fisheries resistome', ['Iceland'], ['Animal'])
+    texts = [item['text'] for item in client.get('/api/search-resources?q=fisherys+resistom').get_json()]
+    assert any(text.startswith('Icelandic fisheries resistome') for text in texts)
@@ -0,0 +1,54 @@
+import pytest
+
+import database
+
+CASES = {
+    (2011, 2011): {'closed', 'undated'},
+    (2017, 2018): {'open_end', 'undated', 'reversed'},
+    (2016, 2016): {'open_end', 'undated', 'reversed'}, # Reversed 2020-2016 counts as 2016-2020
+    (2000, 2000): {'open_start', 'undated'},
+    (None, 2009): {'open_start', 'undated'},
+    (2021, None): {'open_end', 'undated'},
+}
+
+
+@pytest.fixture
+def dated_resources(add_resource):
+    years = {
+        'closed': (2010, 2012),
+        'open_end': (2015, None),
+        'open_start': (None, 2005),
+        'undated': (None, None),
+        'reversed': (2020, 2016),
+    }
+    return {add_resource(f'Portuguese {name} survey', ['Portugal'], ['Human'], year_start=start, year_end=end): name
+            for name, (start, end) in years.items()}
+
+
+@pytest.mark.parametrize('rtree', [True, False])
+def test_year_overlap(monkeypatch, client, dated_resources, rtree):
+    if not rtree:
+        monkeypatch.setattr(database, 'YEAR_INDEX_ENABLED', False) # Composite index fallback
+    for (year_from, year_to), expected in CASES.items():
+        filters = {'countries': ['Portugal'], 'yearFrom': year_from, 'yearTo': year_to}
+        items = client.post('/api/filter-resources', json=filters).get_json()
+        found = {dated_resources[item['id']] for item in items if item['id'] in dated_resources}
+        assert found == expected, (year_from, year_to)
+
+
+@pytest.mark.parametrize('rtree', [True, False])
+def test_year_coverage_counts_single_year_filters(monkeypatch, client, dated_resources, rtree):
+    if not rtree:
+        monkeypatch.setattr(database, 'YEAR_INDEX_ENABLED', False)
+    coverage = client.get('/api/year-coverage?yearFrom=2003&yearTo=2022').get_json()
+    assert (coverage['year_from'], coverage['year_to']) == (2003, 2022)
+    assert coverage['counts'] == [len(database.get_year_overlap_ids(year, year)) for year in range(2003, 2023)]
+    assert coverage['undated'] >= 1
+
+
+def test_invalid_years_are_rejected(client):
+    for query in ('yearFrom=2010&yearTo=2000', 'yearFrom=20x0', 'yearFrom=1000&yearTo=1600'):
+        assert client.get(f'/api/year-coverage?{query}').status_code == 400, query
+    for year in (2000.5, True, '20x0', [2000]):
+        assert client.post('/api/filter-resources', json={'yearFrom': year}).status_code == 400, year
+    assert client.get('/api/network-data?yearTo=soon').status_code == 400
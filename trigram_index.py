@@ -0,0 +1,181 @@
+"""
+Per-worker trigram index for typo-tolerant resource autocomplete.
+
+Titles, keywords, data_source_ids and countries are split into lowercase
+words ("terms"). Each term is broken into trigrams, padded like pg_trgm
+('  s', ' sw', 'swe', ..., 'en '), and every trigram has a posting list of
+the terms that contain it. A query word is compared with the terms that
+share at least one trigram with it (Jaccard similarity of the trigram
+sets, raised for terms that start with the query word, so a half-typed word
+ranks its completions first). A resource scores the average, over the query
+words, of its best matching term. "Sweeden" still finds "sweden" and
+"metagenom" finds "metagenomic".
+
+Work per query is bounded by the vocabulary, not by the number of resources.
+Only the TRIGRAM_MAX_TERMS best terms per query word are expanded to resources.
+
+Like the facet index, the trigram index follows the resource cache. When the
+catalog version moves it is patched from database.get_catalog_changes, and
+rebuilt from scratch only when the change log does not reach back far enough.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+from database import get_catalog_changes
+
+TRIGRAM_INDEX_PATCH_MAX = 5000 # Above this many changed ids a full rebuild is cheaper
+TRIGRAM_MIN_SIMILARITY = 0.3   # Below this a term (or a resource's score) does not match
+TRIGRAM_PREFIX_BOOST = 0.4     # Added to the similarity of terms that start with the query word
+TRIGRAM_MAX_TERMS = 40         # Best matching terms kept per query word
+TRIGRAM_MAX_QUERY_WORDS = 8    # Further words in a query are ignored
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def words(text):
+    """Lowercase words of a text (IDs such as 'OMIC-UNKN-2020' give 'omic', 'unkn', '2020')"""
+    return _WORD_RE.findall((text or '').lower())
+
+
+def trigrams(word):
+    """Trigrams of one word, padded with two spaces in front and one behind (as pg_trgm does)"""
+    padded = f"  {word} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def record_terms(record):
+    """Set of searchable words of one ResourceRecord: title, keywords, data_source_id, countries"""
+    terms = set(words(record.title))
+    terms.update(words(record.keywords))
+    terms.update(words(record.data_source_id))
+    for country in record.countries_list:
+        terms.update(words(country))
+    return terms
+
+
+def similarity(query_word, query_trigrams, term, term_trigrams, shared):
+    """Jaccard similarity of the trigram sets, plus TRIGRAM_PREFIX_BOOST if term starts with query_word (at most 1)"""
+    score = shared / (len(query_trigrams) + len(term_trigrams) - shared)
+    if term != query_word and term.startswith(query_word):
+        score += TRIGRAM_PREFIX_BOOST
+    return min(score, 1.0)
+
+
+class TrigramIndex:
+    """Trigram posting lists over the resource cache's searchable words, kept at its catalog version."""
+
+    def __init__(self, resource_cache):
+        self._resource_cache = resource_cache
+        self._lock = threading.Lock()
+        self._version = None
+        self._postings = {}      # trigram -> set of terms
+        self._term_trigrams = {} # term -> trigrams()
+        self._term_ids = {}      # term -> set of data point ids
+        self._terms_by_id = {}   # id -> record_terms(), to un-index on change
+
+    def _add(self, data_id, terms):
+        self._terms_by_id[data_id] = terms
+        for term in terms:
+            ids = self._term_ids.get(term)
+            if ids is None:
+                ids = self._term_ids[term] = set()
+                term_trigrams = self._term_trigrams[term] = trigrams(term)
+                for trigram in term_trigrams:
+                    self._postings.setdefault(trigram, set()).add(term)
+            ids.add(data_id)
+
+    def _remove(self, data_id):
+        for term in self._terms_by_id.pop(data_id, ()):
+            ids = self._term_ids[term]
+            ids.discard(data_id)
+            if ids:
+                continue
+            # Last resource with this word: drop the term from the vocabulary
+            del self._term_ids[term]
+            for trigram in self._term_trigrams.pop(term):
+                terms = self._postings[trigram]
+                terms.discard(term)
+                if not terms:
+                    del self._postings[trigram]
+
+    def _rebuild(self, state):
+        self._postings = {}
+        self._term_trigrams = {}
+        self._term_ids = {}
+        self._terms_by_id = {}
+        for record in state.records:
+            self._add(record.id, record_terms(record))
+
+    def _patch(self, state, changed_ids):
+        for data_id in changed_ids:
+            self._remove(data_id)
+            record = state.by_id.get(data_id)
+            if record is not None: # Otherwise deleted
+                self._add(data_id, record_terms(record))
+
+    def refresh(self):
+        """Bring the index to the resource cache's catalog version"""
+        state = self._resource_cache.snapshot()
+        if state.version == self._version:
+            return
+        with self._lock:
+            if state.version == self._version:
+                return
+            started = time.perf_counter()
+            changes = None
+            if self._version is not None:
+                complete, rows = get_catalog_changes(self._version, state.version)
+                if complete:
+                    changes = {data_id for _, data_id, _ in rows}
+            if changes is not None and len(changes) <= TRIGRAM_INDEX_PATCH_MAX:
+                self._patch(state, changes)
+                how = f"patched {len(changes)} ids"
+            else:
+                self._rebuild(state)
+                how = f"rebuilt {len(self._terms_by_id)} ids, {len(self._term_ids)} terms"
+            self._version = state.version
+            logging.info(f"Trigram index {how} for catalog version {state.version} in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    def _similar_terms(self, query_word):
+        """[(term, similarity)] of the TRIGRAM_MAX_TERMS terms most like query_word (lock held)"""
+        query_trigrams = trigrams(query_word)
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(self._postings.get(trigram, ()))
+        matches = []
+        for term, count in shared.items():
+            score = similarity(query_word, query_trigrams, term, self._term_trigrams[term], count)
+            if score >= TRIGRAM_MIN_SIMILARITY:
+                matches.append((score, term))
+        matches.sort(key=lambda match: (-match[0], match[1]))
+        return [(term, score) for score, term in matches[:TRIGRAM_MAX_TERMS]]
+
+    def search(self, query, limit=15, allowed_ids=None):
+        """
+        Resources matching query despite typos, best first, as [(id, score)]
+        with score in (0, 1]. allowed_ids (a set) restricts the results.
+        """
+        query_words = list(dict.fromkeys(words(query)))[:TRIGRAM_MAX_QUERY_WORDS]
+        if not query_words:
+            return []
+        self.refresh()
+        totals = Counter()
+        with self._lock: # Patches mutate the posting lists in place
+            for query_word in query_words:
+                best = {}
+                for term, score in self._similar_terms(query_word):
+                    for data_id in self._term_ids[term]:
+                        if score > best.get(data_id, 0.0):
+                            best[data_id] = score
+                totals.update(best)
+
+        results = []
+        for data_id, total in totals.items():
+            score = total / len(query_words)
+            if score >= TRIGRAM_MIN_SIMILARITY and (allowed_ids is None or data_id in allowed_ids):
+                results.append((data_id, round(score, 3)))
+        results.sort(key=lambda result: (-result[1], result[0]))
+        return results[:limit]